@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Compare two `benchmarks/handler.py` result files, flagging regressions.
+
+Usage:
+    benchmarks/compare.py baseline.json candidate.json [--threshold 0.1]
+
+Exits with status 1 if any metric regressed by more than the threshold.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+
+# (path, higher is better)
+METRICS = [
+    (("latency", "p50_ms"), False),
+    (("latency", "p99_ms"), False),
+    (("latency", "mean_ms"), False),
+    (("throughput_per_second",), True),
+    (("memory", "retained_gc_objects"), False),
+    (("import", "median_ms"), False)
+]
+
+def lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+def compare(baseline, candidate, threshold):
+    """
+    Return a list of (name, baseline, candidate, change, regressed) tuples.
+    `change` is the fractional change, positive meaning worse - or None if
+    the baseline is zero, when any change for the worse is a regression.
+    """
+
+    rows = []
+    for path, higher_is_better in METRICS:
+        before = lookup(baseline, path)
+        after = lookup(candidate, path)
+        if before is None or after is None:
+            continue
+        worse_by = before - after if higher_is_better else after - before
+        if before:
+            change = worse_by / float(abs(before))
+            regressed = change > threshold
+        else:
+            change = None
+            regressed = worse_by > 0
+        rows.append((".".join(path), before, after, change, regressed))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="fractional regression allowed")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline, open(args.candidate) as candidate:
+        rows = compare(json.load(baseline), json.load(candidate), args.threshold)
+
+    for name, before, after, change, regressed in rows:
+        print("{:<30} {:>12.2f} {:>12.2f} {:>8}{}".format(
+            name, before, after, "n/a" if change is None else "{:+.1%}".format(change),
+            "  REGRESSION" if regressed else ""
+        ))
+    sys.exit(1 if any(row[4] for row in rows) else 0)
+
+if __name__ == "__main__":
+    main()
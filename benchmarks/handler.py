@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of `BaseHandler` against a local ResponseURL stand-in.
+
+Drives synthetic Create, Update and Delete events through a handler, which
+uploads its responses to a local HTTP server imitating the presigned S3
+endpoint. Reports latency percentiles, throughput, memory and import time.
+
+Usage:
+    benchmarks/handler.py [--requests 1000] [--concurrency 1]
+        [--latency 0] [--error-rate 0] [--throttle-rate 0]
+        [--data-size 10] [--schema] [--transport requests|urllib]
+        [--output results.json]
+
+Compare two result files with `benchmarks/compare.py`.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os.path
+import platform
+import resource
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import import_time
+from custom_resource import BaseHandler
+from custom_resource.retry import RetryPolicy
+from custom_resource.testing import ResponseServer, summarize_latencies
+from custom_resource.transport import RequestsTransport, UrllibTransport
+
+TRANSPORTS = {
+    "requests": RequestsTransport,
+    "urllib": UrllibTransport
+}
+
+SCHEMA = {
+    "type": "object",
+    "required": ["Name"],
+    "properties": {
+        "ServiceToken": {"type": "string"},
+        "Name": {"type": "string", "minLength": 1},
+        "Count": {"type": "string", "pattern": "^[0-9]+$"}
+    }
+}
+
+REQUEST_TYPES = ["Create", "Update", "Delete"]
+
+class Context(object):
+    def get_remaining_time_in_millis(self):
+        return 60000
+
+def make_handler(args):
+    data = {"Attribute{}".format(index): "value-{}".format(index) for index in range(args.data_size)}
+
+    class Handler(BaseHandler):
+        RESOURCE_PROPERTIES_SCHEMA = SCHEMA if args.schema else None
+        COMPILE_RESOURCE_PROPERTIES_SCHEMA = args.compiled_schema
+        TRANSPORT = TRANSPORTS[args.transport]()
+        RETRY_POLICY = RetryPolicy(base_delay=0.01, max_delay=0.1)
+
+        def create(self, event, context):
+            return event["LogicalResourceId"], data
+
+        def update(self, event, context):
+            return event["PhysicalResourceId"], data
+
+        def delete(self, event, context):
+            return event["PhysicalResourceId"]
+
+    return Handler()
+
+def make_event(index, response_url):
+    request_type = REQUEST_TYPES[index % len(REQUEST_TYPES)]
+    event = {
+        "RequestType": request_type,
+        "ResponseURL": response_url,
+        "StackId": "arn:aws:cloudformation:us-east-1:123456789012:stack/benchmark/1",
+        "RequestId": "request-{}".format(index),
+        "ResourceType": "Custom::Benchmark",
+        "LogicalResourceId": "Resource{}".format(index // len(REQUEST_TYPES)),
+        "ResourceProperties": {"ServiceToken": "arn", "Name": "resource", "Count": str(index)}
+    }
+    if request_type != "Create":
+        event["PhysicalResourceId"] = event["LogicalResourceId"]
+    if request_type == "Update":
+        event["OldResourceProperties"] = {"ServiceToken": "arn", "Name": "resource", "Count": "0"}
+    return event
+
+def run(args):
+    server = ResponseServer(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=0
+    )
+    handler = make_handler(args)
+    context = Context()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def invoke(index):
+        event = make_event(index, server.url)
+        started = time.time()
+        try:
+            handler(event, context)
+        except Exception as exc:
+            with lock:
+                errors.append(repr(exc))
+        duration = time.time() - started
+        with lock:
+            latencies.append(duration)
+
+    with server:
+        # Warm up connections and lazy imports.
+        invoke(-1)
+        del latencies[:], errors[:]
+
+        gc.collect()
+        objects_before = len(gc.get_objects())
+        started = time.time()
+        pool = ThreadPool(args.concurrency)
+        try:
+            pool.map(invoke, range(args.requests))
+        finally:
+            pool.close()
+            pool.join()
+        elapsed = time.time() - started
+        gc.collect()
+        objects_after = len(gc.get_objects())
+
+    return {
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "latency": summarize_latencies(latencies),
+        "throughput_per_second": args.requests / elapsed,
+        "errors": len(errors),
+        "server_statuses": {str(status): count for status, count in server.statuses.items()},
+        "server_connections": server.connections,
+        "memory": {
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "retained_gc_objects": objects_after - objects_before
+        },
+        "import": import_time.measure("custom_resource", args.import_runs) if args.import_runs else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0, help="server latency per request, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of HTTP 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="fraction of HTTP 429 responses")
+    parser.add_argument("--data-size", type=int, default=10, help="number of Data attributes per response")
+    parser.add_argument("--schema", action="store_true", help="validate properties with a JSON schema")
+    parser.add_argument("--compiled-schema", action="store_true", help="compile the JSON schema")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="requests")
+    parser.add_argument("--import-runs", type=int, default=5, help="fresh interpreters for import timing, 0 to skip")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2, sort_keys=True)
+
+    latency = result["latency"]
+    print("{} requests, concurrency {}: {:.1f} requests/s".format(
+        args.requests, args.concurrency, result["throughput_per_second"]
+    ))
+    print("latency: mean {mean_ms:.2f}ms, p50 {p50_ms:.2f}ms, p99 {p99_ms:.2f}ms, max {max_ms:.2f}ms".format(**latency))
+    print("errors: {}, server statuses: {}, connections: {}".format(
+        result["errors"], result["server_statuses"], result["server_connections"]
+    ))
+    print("memory: max RSS {max_rss_kb}KB, retained GC objects {retained_gc_objects}".format(**result["memory"]))
+    if result["import"]:
+        print("import: median {median_ms:.2f}ms".format(**result["import"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Measure how long `import custom_resource` takes in a fresh interpreter, and
+which heavy dependencies it pulls in.
+
+Usage:
+    benchmarks/import_time.py [--runs 20] [--json]
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import os.path
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+HEAVY_MODULES = ["jsonschema", "requests", "sqlite3", "uuid"]
+
+MEASURE = """
+import json, sys, time
+started = time.time()
+import {module}
+duration = time.time() - started
+print(json.dumps({{
+    "seconds": duration,
+    "loaded": [name for name in {heavy_modules!r} if name in sys.modules]
+}}))
+"""
+
+def measure(module, runs):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_DIR, env.get("PYTHONPATH")]))
+    code = MEASURE.format(module=module, heavy_modules=HEAVY_MODULES)
+
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", code], env=env)
+        samples.append(json.loads(output.decode("utf-8")))
+
+    seconds = sorted(sample["seconds"] for sample in samples)
+    return {
+        "module": module,
+        "runs": runs,
+        "min_ms": seconds[0] * 1000,
+        "median_ms": seconds[len(seconds) // 2] * 1000,
+        "max_ms": seconds[-1] * 1000,
+        "loaded_heavy_modules": samples[-1]["loaded"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--module", default="custom_resource")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = measure(args.module, args.runs)
+    if args.json:
+        print(json.dumps(result, sort_keys=True))
+    else:
+        print("import {module}: min {min_ms:.2f}ms, median {median_ms:.2f}ms, max {max_ms:.2f}ms over {runs} runs".format(**result))
+        print("heavy modules loaded: {}".format(", ".join(result["loaded_heavy_modules"]) or "none"))
+
+if __name__ == "__main__":
+    main()
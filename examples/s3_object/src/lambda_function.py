@@ -1,5 +1,10 @@
 from custom_resource import BaseHandler
-import boto3
+
+def create_s3_client():
+    # Imported here so requests that don't need S3 - e.g. rollback Deletes
+    # answered straight away - don't pay for it at cold start.
+    import boto3
+    return boto3.client("s3")
 
 class Handler(BaseHandler):
     """
@@ -20,9 +25,10 @@ class Handler(BaseHandler):
         }
     }
 
-    def __init__(self):
-        super(Handler, self).__init__()
-        self.client = boto3.client("s3")
+    # Created on first use, then reused by warm invocations.
+    RESOURCES = {
+        "S3": create_s3_client
+    }
 
     def create(self, event, context):
         bucket = event["ResourceProperties"]["Bucket"]
@@ -30,7 +36,7 @@ class Handler(BaseHandler):
         body = event["ResourceProperties"]["Body"]
         content_type = event["ResourceProperties"]["ContentType"]
 
-        self.client.put_object(
+        self.resources["S3"].put_object(
             ACL="public-read",
             Body=body,
             Bucket=bucket,
@@ -48,7 +54,7 @@ class Handler(BaseHandler):
         bucket = event["ResourceProperties"]["Bucket"]
         key = event["ResourceProperties"]["Key"]
 
-        self.client.delete_object(
+        self.resources["S3"].delete_object(
             Bucket=bucket,
             Key=key
         )
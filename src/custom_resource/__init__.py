@@ -9,9 +9,26 @@ AWS docs:
 
 import abc
 import json
-
-import jsonschema
-import requests
+import logging
+import sys
+import threading
+import time
+
+from .blobstore import OFFLOADED_DATA_ATTRIBUTE
+from .cache import LRUCache
+from .concurrency import map_concurrently
+from .continuation import CONTINUATION_KEY, LambdaContinuation
+from .coroutines import Return, is_coroutine, run_coroutine, submit
+from .diff import diff_properties
+from .event import PROPERTIES_KEYS, CustomResourceEvent, build_converters, convert_properties
+from .instrumentation import Instrumentation
+from .ratelimit import is_throttling_error
+from .registry import Registry
+from .resultcache import cached_physical_resource_id, result_cache_key
+from .retry import Attempt, RetryPolicy
+from .schema import SchemaValidator
+from .statestore import STATE_KEY, StoredState
+from .transport import TransportError, get_default_transport
 
 SUCCESS = "SUCCESS"
 FAILED = "FAILED"
@@ -23,6 +40,19 @@ DELETE = "Delete"
 MAX_PHYSICAL_RESOURCE_ID_LENGTH = 1024
 DEFAULT_PHYSICAL_RESOURCE_ID = "n/a"
 
+# CloudFormation rejects larger responses.
+MAX_RESPONSE_BYTES = 4096
+
+# What to do with responses over MAX_RESPONSE_BYTES, which are always
+# serialized compactly.
+OVERSIZE_FAIL = "fail"
+OVERSIZE_OFFLOAD = "offload"
+
+# Serializes JSON without whitespace.
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+logger = logging.getLogger(__name__)
+
 class BaseHandler(object):
     """
     Lambda handler for custom CFN resources.
@@ -36,12 +66,170 @@ class BaseHandler(object):
     # root properties, as this is always sent by CloudFormation.
     RESOURCE_PROPERTIES_SCHEMA = None
 
+    # Translate RESOURCE_PROPERTIES_SCHEMA into a specialised Python function.
+    # Valid properties are then checked in microseconds; invalid properties
+    # are re-checked by jsonschema for a detailed failure reason.
+    COMPILE_RESOURCE_PROPERTIES_SCHEMA = False
+
+    # Pass create, update and delete a `custom_resource.event.CustomResourceEvent`
+    # instead of the event dict, with properties converted to the types
+    # allowed by RESOURCE_PROPERTIES_SCHEMA before they're validated.
+    TYPED_EVENTS = False
+
+    # Transport used to upload responses, e.g
+    # `custom_resource.transport.RequestsTransport(pool_size=2, read_timeout=5)`.
+    # Defaults to the process-wide shared transport.
+    TRANSPORT = None
+
+    # `custom_resource.retry.RetryPolicy` for uploading responses. Defaults to
+    # retrying throttling, server and connection errors until shortly before
+    # the Lambda deadline.
+    RETRY_POLICY = None
+
+    # Watchdog: respond before Lambda times out. When set, create, update and
+    # delete run in a separate thread. If they're still running this many
+    # milliseconds before the Lambda deadline, `timeout` is called to produce
+    # the response instead. Leave enough time to upload the response.
+    TIMEOUT_SAFETY_MARGIN_MILLIS = None
+
+    # Polling, for resources that take longer than a Lambda invocation. When
+    # create, update or delete return `Poll`, the handler is invoked again via
+    # CONTINUATION and `is_complete` is called until it returns a result.
+    # Polls are POLL_INTERVAL_SECONDS apart, growing by POLL_BACKOFF_RATE each
+    # time up to POLL_MAX_INTERVAL_SECONDS. After POLL_TIMEOUT_SECONDS the
+    # request fails - keep it under CloudFormation's one hour timeout.
+    # Defaults to `LambdaContinuation`, which is billed while waiting - use
+    # `SQSContinuation` or `SchedulerContinuation` to avoid that.
+    CONTINUATION = None
+    POLL_INTERVAL_SECONDS = 15
+    POLL_BACKOFF_RATE = 1.5
+    POLL_MAX_INTERVAL_SECONDS = 120
+    POLL_TIMEOUT_SECONDS = 55 * 60
+
+    # Optional store deduplicating repeated deliveries of the same request,
+    # e.g. `custom_resource.idempotency.MemoryIdempotencyStore()`. Duplicates
+    # of completed requests have the original response re-sent without
+    # calling create, update or delete.
+    IDEMPOTENCY_STORE = None
+
+    # Answer Update requests that don't change any properties without calling
+    # `update`, re-sending the existing PhysicalResourceId and Data. Data is
+    # remembered from earlier responses - see `get_previous_data`. Top-level
+    # properties in VOLATILE_PROPERTIES are ignored when comparing.
+    SKIP_UNCHANGED_UPDATES = False
+    VOLATILE_PROPERTIES = ()
+    PREVIOUS_DATA_CACHE_SIZE = 1000
+
+    # Cache for lookup-only resources, e.g
+    # `custom_resource.resultcache.MemoryResultCache(ttl=300)`. The Data of
+    # successful Create and Update responses is cached by resource type and
+    # properties, and re-sent for matching requests without calling create
+    # or update.
+    RESULT_CACHE = None
+
+    # Store of each resource's last Data and private state, e.g
+    # `custom_resource.statestore.SQLiteStateStore(path)`. `update` and
+    # `delete` find it under `custom_resource.statestore.STATE_KEY` in their
+    # event. Return `Success(physical_resource_id, data, state=...)` to store
+    # private state.
+    STATE_STORE = None
+
+    # Call `update(event, context, diff)` with a
+    # `custom_resource.diff.PropertiesDiff` of the old and new properties.
+    PASS_PROPERTIES_DIFF = False
+
+    # Delete requests for these physical resource IDs succeed immediately,
+    # without validation or calling `delete`. CloudFormation sends them when
+    # rolling back a failed Create, which reports DEFAULT_PHYSICAL_RESOURCE_ID
+    # unless told otherwise - so there's nothing to delete. Add any IDs your
+    # own `Failed` responses use for resources that were never created.
+    SENTINEL_PHYSICAL_RESOURCE_IDS = frozenset([DEFAULT_PHYSICAL_RESOURCE_ID])
+
+    # What to do when a response is over CloudFormation's 4096 byte limit -
+    # see `Responder`. OVERSIZE_OFFLOAD needs a BLOB_STORE, e.g
+    # `custom_resource.blobstore.S3BlobStore("my-bucket")`.
+    OVERSIZE_STRATEGY = OVERSIZE_FAIL
+    BLOB_STORE = None
+
+    # Dependencies created on first use and reused by warm invocations -
+    # dict of name -> factory function or `custom_resource.registry.Resource`.
+    # Use them via `self.resources[name]`.
+    RESOURCES = {}
+
+    # Observers receiving per-phase timings and counts, e.g
+    # `custom_resource.instrumentation.EmbeddedMetricsObserver()`.
+    OBSERVERS = ()
+
+    # Records each request's event, response and timings, e.g
+    # `custom_resource.recording.JSONLinesRecorder("/tmp/requests.jsonl")`.
+    # Replay recordings with `python -m custom_resource.replay`.
+    RECORDER = None
+
+    # Profiles a sample of invocations, keeping slow ones, e.g
+    # `custom_resource.profiling.Profiler(sample_rate=0.01, latency_threshold=5)`.
+    PROFILER = None
+
+    # Maximum number of requests from one SNS event handled at once.
+    SNS_MAX_WORKERS = 8
+
+    # Maximum number of requests from one SQS batch handled at once.
+    QUEUE_MAX_WORKERS = 8
+
+    # Protection for downstream APIs called via `guarded_call`: a
+    # `custom_resource.ratelimit.TokenBucket` and `CircuitBreaker`.
+    # Throttling errors are retried with THROTTLE_RETRY_POLICY's backoff until
+    # shortly before the Lambda deadline.
+    RATE_LIMITER = None
+    CIRCUIT_BREAKER = None
+    THROTTLE_RETRY_POLICY = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=20.0, deadline_margin=5.0)
+
     def __init__(self):
         self._event_type_handlers = {
             "Create": self.create,
             "Update": self.update,
             "Delete": self.delete
         }
+        self._resource_properties_validator = self.get_resource_properties_validator()
+        self._event_converters = self.get_event_converters() if self.TYPED_EVENTS else None
+        self._previous_data = LRUCache(self.PREVIOUS_DATA_CACHE_SIZE)
+        self._observers = tuple(self.OBSERVERS) + ((self.RECORDER,) if self.RECORDER is not None else ())
+        self._instrumentation = Instrumentation(self._observers)
+        self.resources = Registry(self.RESOURCES)
+
+    @classmethod
+    def get_resource_properties_validator(cls):
+        """
+        Return a `SchemaValidator` for `RESOURCE_PROPERTIES_SCHEMA`, or None
+        if there's no schema.
+
+        The validator is built once per class and shared by all instances, so
+        warm Lambda invocations don't re-process the schema.
+        """
+
+        schema = cls.RESOURCE_PROPERTIES_SCHEMA
+        if schema is None:
+            return None
+
+        compiled = cls.COMPILE_RESOURCE_PROPERTIES_SCHEMA
+        cached = cls.__dict__.get("_cached_resource_properties_validator")
+        if cached is None or cached[0] is not schema or cached[1] != compiled:
+            cached = (schema, compiled, SchemaValidator(schema, compiled=compiled))
+            cls._cached_resource_properties_validator = cached
+        return cached[2]
+
+    @classmethod
+    def get_event_converters(cls):
+        """
+        Return the property converters for `CustomResourceEvent`s, built from
+        `RESOURCE_PROPERTIES_SCHEMA` once per class.
+        """
+
+        schema = cls.RESOURCE_PROPERTIES_SCHEMA
+        cached = cls.__dict__.get("_cached_event_converters")
+        if cached is None or cached[0] is not schema:
+            cached = (schema, build_converters(schema))
+            cls._cached_event_converters = cached
+        return cached[1]
 
     @abc.abstractmethod
     def create(self, event, context):
@@ -82,6 +270,130 @@ class BaseHandler(object):
         more info.
         """
 
+    def properties_diff(self, event):
+        """
+        Return a `custom_resource.diff.PropertiesDiff` of the event's
+        "OldResourceProperties" and "ResourceProperties", ignoring
+        "ServiceToken" and `VOLATILE_PROPERTIES`.
+        """
+
+        return diff_properties(
+            event.get("OldResourceProperties"),
+            event.get("ResourceProperties"),
+            ignore=self.VOLATILE_PROPERTIES
+        )
+
+    def get_previous_data(self, event):
+        """
+        Return the Data last sent for the event's physical resource, or None
+        if unknown. Used by `SKIP_UNCHANGED_UPDATES`.
+
+        Remembers responses sent by this container, falling back to
+        `STATE_STORE`. Override to fetch Data from elsewhere.
+        """
+
+        key = _resource_key(event, event["PhysicalResourceId"])
+        data = self._previous_data.get(key)
+        if data is None and self.STATE_STORE is not None:
+            record = self.STATE_STORE.get(key)
+            if record is not None:
+                data = record.data
+        return data
+
+    def is_complete(self, event, context, state):
+        """
+        Poll for completion of work started by create, update or delete
+        returning `Poll(state)`. Required if you use `Poll` - otherwise
+        returning `Poll` raises NotImplementedError, failing the request.
+
+        Return None (or `Poll` with new state) if the work is still in
+        progress, otherwise any result accepted from create/update/delete.
+        """
+
+        raise NotImplementedError("{} returned Poll but doesn't implement is_complete".format(
+            self.__class__.__name__
+        ))
+
+    def get_poll_delay(self, polls):
+        """
+        Seconds to wait before the next poll, given the number of polls made
+        so far.
+        """
+
+        return min(
+            self.POLL_MAX_INTERVAL_SECONDS,
+            self.POLL_INTERVAL_SECONDS * self.POLL_BACKOFF_RATE ** polls
+        )
+
+    def timeout(self, event, context):
+        """
+        Called by the watchdog when create, update or delete haven't finished
+        by the `TIMEOUT_SAFETY_MARGIN_MILLIS` deadline.
+
+        Returns a `Failed` response by default. Override to e.g. hand the work
+        over to another invocation and return `Defer`.
+        """
+
+        physical_resource_id = event.get("PhysicalResourceId", DEFAULT_PHYSICAL_RESOURCE_ID)
+        return Failed(physical_resource_id, reason="{} timed out".format(event["RequestType"]))
+
+    def guarded_call(self, context, function, *args, **kwargs):
+        """
+        Call `function(*args, **kwargs)` - typically a downstream API - once
+        RATE_LIMITER and CIRCUIT_BREAKER allow, retrying throttling errors.
+        Raises `custom_resource.ratelimit.RateLimitTimeout` if the call
+        can't be made before the Lambda deadline, or the last throttling
+        error if retries run out.
+        """
+
+        policy = self.THROTTLE_RETRY_POLICY
+        breaker = self.CIRCUIT_BREAKER
+        deadline = policy.get_deadline(context)
+        attempt = 0
+        while True:
+            attempt += 1
+            # Rate limit first, so a half-open circuit's trial call isn't
+            # held up - or abandoned - waiting for a token.
+            if self.RATE_LIMITER is not None:
+                self.RATE_LIMITER.acquire(deadline)
+            trial = breaker.acquire(deadline) if breaker is not None else False
+
+            try:
+                result = function(*args, **kwargs)
+            except Exception as exc:
+                exc_info = sys.exc_info()
+                if not self.is_throttling_error(exc):
+                    # The API answered, so it isn't overloaded.
+                    if breaker is not None:
+                        breaker.record_success()
+                    raise exc_info[0], exc_info[1], exc_info[2]
+
+                if breaker is not None:
+                    breaker.record_failure()
+                delay = policy.get_delay(attempt)
+                if attempt >= policy.max_attempts or (deadline is not None and time.time() + delay > deadline):
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                logger.info("Throttled by downstream call, retrying in %.2fs: %s", delay, exc)
+                policy.sleep(delay)
+            except BaseException:
+                # e.g KeyboardInterrupt - there's no outcome to record.
+                if trial:
+                    breaker.release()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+    def is_throttling_error(self, exc):
+        """
+        True if `exc`, raised by a call made with `guarded_call`, reports
+        throttling. Recognises `custom_resource.ratelimit.ThrottledError` and
+        AWS throttling error codes.
+        """
+
+        return is_throttling_error(exc)
+
     def dispatch(self, event, context):
         """
         Dispatch the given event to create, update or delete, depending on the
@@ -94,28 +406,422 @@ class BaseHandler(object):
             * A Success, Failed or Defer object.
         """
 
-        if self.RESOURCE_PROPERTIES_SCHEMA is not None:
-            validator = jsonschema.Draft4Validator(self.RESOURCE_PROPERTIES_SCHEMA)
+        if event["RequestType"] == DELETE:
+            physical_resource_id = event.get("PhysicalResourceId")
+            if physical_resource_id in self.SENTINEL_PHYSICAL_RESOURCE_IDS:
+                return Success(physical_resource_id)
+
+        converted = None
+        if self._event_converters is not None:
+            # Converted before validating, so schemas see the typed values.
             try:
-                for key in "ResourceProperties", "OldResourceProperties":
-                    if key in event:
-                        validator.validate(event[key])
-            except jsonschema.ValidationError as exc:
+                converted = {
+                    key: convert_properties(event[key], self._event_converters)
+                    for key in PROPERTIES_KEYS if key in event
+                }
+            except ValueError as exc:
                 physical_resource_id = event.get("PhysicalResourceId", DEFAULT_PHYSICAL_RESOURCE_ID)
                 return Failed(physical_resource_id, reason=unicode(exc))
 
+        validator = self._resource_properties_validator
+        if validator is not None:
+            # Imported on first use to keep cold starts fast.
+            import jsonschema
+            with self._instrumentation.timer("Validation", event):
+                try:
+                    for key in PROPERTIES_KEYS:
+                        if key in event:
+                            validator.validate(converted[key] if converted is not None else event[key])
+                except jsonschema.ValidationError as exc:
+                    physical_resource_id = event.get("PhysicalResourceId", DEFAULT_PHYSICAL_RESOURCE_ID)
+                    return Failed(physical_resource_id, reason=unicode(exc))
+
         event_type_handler = self._event_type_handlers[event["RequestType"]]
-        return event_type_handler(event, context)
+        handler_event = event
+        if self.STATE_STORE is not None and event["RequestType"] != CREATE:
+            key = _resource_key(event, event["PhysicalResourceId"])
+            handler_event = dict(event, **{STATE_KEY: StoredState(self.STATE_STORE, key)})
+        if self._event_converters is not None:
+            handler_event = CustomResourceEvent(handler_event, self._event_converters, converted)
+        args = (handler_event, context)
+
+        if event["RequestType"] == UPDATE and (self.SKIP_UNCHANGED_UPDATES or self.PASS_PROPERTIES_DIFF):
+            diff = self.properties_diff(event)
+            if self.SKIP_UNCHANGED_UPDATES and not diff:
+                data = self.get_previous_data(event)
+                if data is not None:
+                    return Success(event["PhysicalResourceId"], data)
+            if self.PASS_PROPERTIES_DIFF:
+                args += (diff,)
+
+        cache_key = None
+        if self.RESULT_CACHE is not None and event["RequestType"] != DELETE:
+            cache_key = result_cache_key(event)
+            cached = self.RESULT_CACHE.get(cache_key)
+            if self._instrumentation:
+                self._instrumentation.count("ResultCacheHits", int(cached is not None), event)
+            if cached is not None:
+                return Success(cached_physical_resource_id(event), cached["Data"])
+
+        with self._instrumentation.timer("Dispatch", event):
+            value = self._resolve_result(event_type_handler(*args))
+
+        if cache_key is not None:
+            response = self._coerce_to_response(value)
+            if isinstance(response, Success):
+                self.RESULT_CACHE.set(cache_key, {"Data": response._data})
+            return response
+        return value
 
     def __call__(self, event, context):
         """
         Lambda handler. Calls create, update or delete, sends the result back
         to CloudFormation if not deferred.
+
+        Accepts requests sent directly by CloudFormation, via SNS, or from an
+        SQS queue - see `handle_queue_event`.
+        """
+
+        if _is_event_from(event, "EventSource", "aws:sns"):
+            self._handle_sns_event(event, context)
+        elif _is_event_from(event, "eventSource", "aws:sqs"):
+            return self.handle_queue_event(event, context)
+        else:
+            self.handle_request(event, context)
+
+    def handle_queue_event(self, event, context):
+        """
+        Handle a batch of SQS messages, each containing a custom resource
+        request, up to `QUEUE_MAX_WORKERS` at a time. Messages may also be SNS
+        notifications wrapping a request.
+
+        Returns a partial batch response listing messages to redeliver: those
+        that couldn't be decoded, or whose response couldn't be uploaded.
+        Requests that failed but were reported to CloudFormation aren't
+        redelivered. Enable `ReportBatchItemFailures` on the event source
+        mapping to make use of this.
+        """
+
+        def handle_record(record):
+            request = json.loads(record["body"])
+            if request.get("Type") == "Notification" and "Message" in request:
+                request = json.loads(request["Message"])
+            try:
+                self.handle_request(request, context)
+            except ResponseUploadError:
+                raise
+            except Exception:
+                logger.exception("Request %s for %s failed", request.get("RequestId"), request.get("LogicalResourceId"))
+
+        records = event["Records"]
+        results = map_concurrently(handle_record, records, self.QUEUE_MAX_WORKERS, pool_name="requests")
+
+        failures = []
+        for record, (_, exc_info) in zip(records, results):
+            if exc_info is not None:
+                logger.error("Couldn't process message %s", record.get("messageId"), exc_info=exc_info)
+                failures.append({"itemIdentifier": record["messageId"]})
+        return {"batchItemFailures": failures}
+
+    def handle_request(self, event, context):
+        """
+        Handle a single custom resource request.
+        """
+
+        store = self.IDEMPOTENCY_STORE
+        if store is None or CONTINUATION_KEY in event:
+            self._handle(event, context, self._create_responder(event, context))
+            return
+
+        key = (event["StackId"], event["LogicalResourceId"], event["RequestId"])
+        record = store.begin(key)
+        if record is not None:
+            self._replay(event, context, record)
+            return
+
+        responder = self._create_responder(event, context)
+        try:
+            self._handle(event, context, responder)
+        finally:
+            response = responder.response
+            if isinstance(response, Defer):
+                store.complete(key, None)
+            elif responder.uploaded:
+                store.complete(key, response.as_dict())
+            else:
+                # Nothing reached CloudFormation, so let a retry run again.
+                store.release(key)
+
+    def _handle_sns_event(self, event, context):
+        """
+        Handle custom resource requests delivered by SNS, concurrently.
+
+        Each request gets its own response. Exceptions are logged rather than
+        raised, so a failure doesn't cause SNS to redeliver the other
+        requests.
+        """
+
+        requests = []
+        for record in event["Records"]:
+            try:
+                requests.append(json.loads(record["Sns"]["Message"]))
+            except (KeyError, TypeError, ValueError):
+                logger.exception("Couldn't decode SNS message %s", record.get("Sns", {}).get("MessageId"))
+
+        results = map_concurrently(
+            lambda request: self.handle_request(request, context),
+            requests, self.SNS_MAX_WORKERS, pool_name="requests"
+        )
+        for request, (_, exc_info) in zip(requests, results):
+            if exc_info is not None:
+                logger.error(
+                    "Request %s for %s failed", request.get("RequestId"), request.get("LogicalResourceId"),
+                    exc_info=exc_info
+                )
+
+    def _resolve_result(self, value):
+        """
+        Turn the value returned by a user method into a result. Lets
+        subclasses support other kinds of return value.
+        """
+
+        return value
+
+    def _create_responder(self, event, context):
+        return Responder(
+            event, context,
+            transport=self.TRANSPORT,
+            retry_policy=self.RETRY_POLICY,
+            observers=self._observers,
+            oversize_strategy=self.OVERSIZE_STRATEGY,
+            blob_store=self.BLOB_STORE
+        )
+
+    def _handle(self, event, context, responder):
+        """
+        Respond to a single request.
+        """
+
+        instrumentation = self._instrumentation
+        started = time.time()
+        capture = self._start_profile(event)
+        try:
+            with responder:
+                continuation = event.get(CONTINUATION_KEY)
+                function = self.dispatch if continuation is None else self._poll
+                respond = responder.respond
+                if capture is not None:
+                    function = capture.wrap(function)
+                    respond = capture.wrap(respond)
+                value = self._call_with_deadline(function, event, context)
+                with instrumentation.timer("Coercion", event):
+                    response = self._coerce_to_response(value)
+                if isinstance(response, Poll):
+                    self._schedule_poll(event, context, response, continuation)
+                before_upload = None
+                if self.STATE_STORE is not None:
+                    # Stored before CloudFormation hears of the result, as it
+                    # may send the resource's next request to another
+                    # container straight away. Write-behind stores write
+                    # while the response is serialized.
+                    self._store_state(event, response, response)
+                    before_upload = lambda sent: self._finish_storing_state(event, response, sent)
+                respond(response, before_upload=before_upload)
+                if self.SKIP_UNCHANGED_UPDATES:
+                    self._remember_data(event, response)
+        finally:
+            if self.STATE_STORE is not None:
+                # Finish any write-behind left by a response that wasn't
+                # uploaded, before Lambda freezes the container.
+                try:
+                    self.STATE_STORE.flush()
+                except Exception:
+                    logger.exception("Couldn't store state for %s", event.get("LogicalResourceId"))
+            if self.RECORDER is not None:
+                self.RECORDER.record_response(event, responder.response)
+            if capture is not None:
+                try:
+                    if capture.finish():
+                        instrumentation.count("ProfilesKept", 1, event)
+                except Exception:
+                    logger.exception("Couldn't write profile for %s", event.get("LogicalResourceId"))
+            if instrumentation:
+                for name, seconds in self.resources.pop_init_timings():
+                    instrumentation.timing("Init" + name, seconds, event)
+                instrumentation.timing("Request", time.time() - started, event)
+                instrumentation.request_finished(event)
+
+    def _start_profile(self, event):
+        """
+        Return the PROFILER's capture for `event`, or None. Profiling is
+        skipped rather than failing the request if it can't start.
+        """
+
+        if self.PROFILER is None:
+            return None
+        try:
+            return self.PROFILER.start(event)
+        except Exception:
+            logger.exception("Couldn't start profiling %s", event.get("LogicalResourceId"))
+            return None
+
+    def _remember_data(self, event, response):
+        """
+        Record Data sent for a physical resource, for `get_previous_data`.
+        """
+
+        if not isinstance(response, Success):
+            return
+        if event["RequestType"] == DELETE:
+            self._previous_data.pop(_resource_key(event, response._physical_resource_id))
+        else:
+            self._previous_data.set(_resource_key(event, response._physical_resource_id), response._data)
+
+    def _store_state(self, event, response, sent):
+        """
+        Persist the Data and private state of a successful response to
+        `STATE_STORE`. `sent` is the response actually sent, which may differ
+        from `response` - e.g if its Data was offloaded.
+        """
+
+        if not isinstance(sent, Success):
+            return
+        key = _resource_key(event, sent._physical_resource_id)
+        if event["RequestType"] == DELETE:
+            self.STATE_STORE.delete(key)
+        else:
+            state = response._state if isinstance(response, Success) else None
+            if state is None and event["RequestType"] != CREATE:
+                # Keep the stored state unless the handler gave new state -
+                # e.g for unchanged updates, or updates returning an ID.
+                record = self.STATE_STORE.get(key)
+                state = record.state if record is not None else None
+            self.STATE_STORE.put(key, sent._data, state)
+
+    def _finish_storing_state(self, event, response, sent):
+        """
+        Called once `sent`, the response for `response`, is serialized: wait
+        for `STATE_STORE` to finish writing before it's uploaded.
+
+        State stays stored if the response became a failure - e.g for being
+        oversized - as the handler still made the resource, and CloudFormation
+        will roll it back.
+        """
+
+        if sent is not response and isinstance(sent, Success):
+            # e.g its Data was offloaded - store what CloudFormation sees.
+            self._store_state(event, response, sent)
+        try:
+            self.STATE_STORE.flush()
+        except Exception:
+            logger.exception("Couldn't store state for %s", event.get("LogicalResourceId"))
+
+    def _replay(self, event, context, record):
+        """
+        Handle a duplicate request, given its idempotency store record.
+        """
+
+        if record.response is None:
+            logger.info("Ignoring duplicate request %s (%s)", event["RequestId"], record.status)
+            return
+
+        logger.info("Replaying response to duplicate request %s", event["RequestId"])
+        try:
+            self._create_responder(event, context).respond(_response_from_dict(record.response))
+        finally:
+            if self._instrumentation:
+                self._instrumentation.request_finished(event)
+
+    def _poll(self, event, context):
+        """
+        Handle a continuation event: call `is_complete` with the saved state.
         """
 
-        with Responder(event) as responder:
-            response = self._coerce_to_response(self.dispatch(event, context))
-            responder.respond(response)
+        ready = getattr(self._get_continuation(), "ready", None)
+        if ready is not None and not ready(event, context):
+            # Rescheduled by the backend.
+            return Defer()
+
+        event = dict(event)
+        continuation = event.pop(CONTINUATION_KEY)
+
+        if time.time() - continuation["StartedAt"] > self.POLL_TIMEOUT_SECONDS:
+            physical_resource_id = event.get("PhysicalResourceId", DEFAULT_PHYSICAL_RESOURCE_ID)
+            return Failed(physical_resource_id, reason="Timed out waiting for {} to complete".format(
+                event["RequestType"]
+            ))
+
+        state = continuation["State"]
+        value = self._resolve_result(self.is_complete(event, context, state))
+        if value is None or value is False:
+            return Poll(state)
+        return value
+
+    def _schedule_poll(self, event, context, response, continuation):
+        """
+        Ask CONTINUATION to invoke the handler again to poll for completion.
+        """
+
+        if "is_complete" not in vars(self) and type(self).is_complete.im_func is BaseHandler.is_complete.im_func:
+            # Fail now, rather than at the first poll.
+            raise NotImplementedError("{} returned Poll but doesn't implement is_complete".format(
+                self.__class__.__name__
+            ))
+
+        if continuation is None:
+            polls = 0
+            started_at = time.time()
+        else:
+            polls = continuation["Polls"] + 1
+            started_at = continuation["StartedAt"]
+
+        event = dict(event)
+        event[CONTINUATION_KEY] = {
+            "State": response.state,
+            "Polls": polls,
+            "StartedAt": started_at
+        }
+        self._get_continuation().schedule(event, self.get_poll_delay(polls), context)
+
+    def _get_continuation(self):
+        return self.CONTINUATION if self.CONTINUATION is not None else LambdaContinuation()
+
+    def _call_with_deadline(self, function, event, context):
+        """
+        Call `function(event, context)`, or `timeout` if it doesn't return
+        before `TIMEOUT_SAFETY_MARGIN_MILLIS` is reached.
+
+        A timed out function keeps running in its thread, but its result is
+        ignored.
+        """
+
+        margin = self.TIMEOUT_SAFETY_MARGIN_MILLIS
+        get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+        if margin is None or get_remaining_time_in_millis is None:
+            return function(event, context)
+
+        available_millis = get_remaining_time_in_millis() - margin
+        if available_millis <= 0:
+            return self.timeout(event, context)
+
+        result = {}
+        def run():
+            try:
+                result["value"] = function(event, context)
+            except BaseException:
+                result["exc_info"] = sys.exc_info()
+
+        thread = threading.Thread(target=run, name="custom_resource-dispatch")
+        thread.daemon = True
+        thread.start()
+        thread.join(available_millis / 1000.0)
+
+        if thread.is_alive():
+            return self.timeout(event, context)
+        if "exc_info" in result:
+            exc_type, exc, tb = result["exc_info"]
+            raise exc_type, exc, tb
+        return result["value"]
 
     def _coerce_to_response(self, value):
         if isinstance(value, basestring):
@@ -134,22 +840,106 @@ class BaseHandler(object):
 
         raise TypeError("Unexpected response {!r}".format(value))
 
+class AsyncBaseHandler(BaseHandler):
+    """
+    Lambda handler whose create, update and delete methods may be coroutines,
+    for resources that wait on many downstream calls. See
+    `custom_resource.coroutines`.
+
+        class Handler(AsyncBaseHandler):
+            def create(self, event, context):
+                names = event["ResourceProperties"]["Names"]
+                records = yield [self.submit(create_record, name) for name in names]
+                raise Return(("records", {"Count": str(len(records))}))
+
+    Work submitted with `submit` runs on a thread pool shared by every
+    invocation in the container, up to `COROUTINE_MAX_WORKERS` at once.
+    `is_complete` may also be a coroutine. Plain (non-generator) methods work
+    as they do in `BaseHandler`.
+    """
+
+    COROUTINE_MAX_WORKERS = 16
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Call `function(*args, **kwargs)` in the background, returning a
+        future to yield.
+        """
+
+        return submit(function, args, kwargs, max_workers=self.COROUTINE_MAX_WORKERS)
+
+    def _resolve_result(self, value):
+        if is_coroutine(value):
+            return run_coroutine(value)
+        return value
+
+def _is_event_from(event, source_key, source):
+    records = event.get("Records")
+    return bool(records) and all(record.get(source_key) == source for record in records)
+
+def _resource_key(event, physical_resource_id):
+    return (event["StackId"], event["LogicalResourceId"], physical_resource_id)
+
+class ResponseUploadError(Exception):
+    """
+    The response couldn't be uploaded to CloudFormation.
+    """
+
 class Responder(object):
     """
     Respond to a custom resource request. Takes the Lambda event object.
 
     Can be used as a context manager to catch exceptions and send a failure
     response.
+
+    Responses over CloudFormation's `MAX_RESPONSE_BYTES` limit are handled
+    according to `oversize_strategy`:
+        * `OVERSIZE_FAIL`: send a failure response explaining why.
+        * `OVERSIZE_OFFLOAD`: put the full Data in `blob_store` and respond
+          with a pointer to it instead - see `custom_resource.blobstore`.
+    Long failure reasons are truncated to fit.
     """
 
-    def __init__(self, event):
+    def __init__(self, event, context=None, transport=None, retry_policy=None, observers=(),
+                 oversize_strategy=OVERSIZE_FAIL, blob_store=None):
         """
         Arguments:
             * `event`: a Lambda event object.
+            * `context`: optional Lambda context object. Upload retries stop
+              shortly before its remaining execution time runs out.
+            * `transport`: optional transport for uploading the response. See
+              `custom_resource.transport`. Defaults to a keep-alive transport
+              shared by the whole process.
+            * `retry_policy`: optional `custom_resource.retry.RetryPolicy`.
+            * `observers`: optional list of
+              `custom_resource.instrumentation.Observer` objects, receiving
+              serialization and upload timings, upload attempts and payload
+              size.
+            * `oversize_strategy`: what to do with oversized responses.
+            * `blob_store`: blob store for `OVERSIZE_OFFLOAD`.
         """
 
+        if oversize_strategy not in (OVERSIZE_FAIL, OVERSIZE_OFFLOAD):
+            raise ValueError("Unknown oversize strategy {!r}".format(oversize_strategy))
+        if oversize_strategy == OVERSIZE_OFFLOAD and blob_store is None:
+            raise ValueError("OVERSIZE_OFFLOAD needs a blob store")
+
         self.event = event
+        self.context = context
+        self.transport = transport if transport is not None else get_default_transport()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
         self.responded = False
+        # The most recent response passed to `respond`.
+        self.response = None
+        # Whether a response has been uploaded successfully.
+        self.uploaded = False
+        # `custom_resource.retry.Attempt` objects, one per upload attempt.
+        self.upload_attempts = []
+        self.oversize_strategy = oversize_strategy
+        self.blob_store = blob_store
+        self._instrumentation = Instrumentation(observers)
+        # JSON for the event fields included in every response.
+        self._event_fields_json = None
 
     def success(self, *args, **kwargs):
         """
@@ -172,18 +962,37 @@ class Responder(object):
 
         self.respond(Defer())
 
-    def respond(self, response):
+    def respond(self, response, before_upload=None):
         """
         Respond to CloudFormation by uploading JSON data to the given S3 URL.
+
+        `before_upload` is optionally called with the response being sent -
+        see `self.response` - once it's serialized, before it's uploaded.
         """
 
         self.responded = True
+        self.response = response
 
         if isinstance(response, Defer):
             return
 
-        response_dict = self._get_response_as_dict(response)
-        self._upload_response_data(self.event["ResponseURL"], json.dumps(response_dict))
+        instrumentation = self._instrumentation
+        with instrumentation.timer("Serialization", self.event):
+            data = self._serialize(response)
+        if before_upload is not None:
+            before_upload(self.response)
+
+        attempts_before = len(self.upload_attempts)
+        try:
+            with instrumentation.timer("Upload", self.event):
+                self._upload_response_data(self.event["ResponseURL"], data)
+            self.uploaded = True
+        finally:
+            if instrumentation:
+                attempts = len(self.upload_attempts) - attempts_before
+                instrumentation.count("PayloadBytes", len(data), self.event)
+                instrumentation.count("UploadAttempts", attempts, self.event)
+                instrumentation.count("UploadRetries", max(0, attempts - 1), self.event)
 
     def __enter__(self):
         """
@@ -204,35 +1013,132 @@ class Responder(object):
             if not self.responded:
                 self.respond(Failed(physical_resource_id, reason="No response sent"))
 
-    def _get_response_as_dict(self, response):
+    def _serialize(self, response):
         """
-        Given a response, return a dict that can be sent to CloudFormation.
-        Includes the source event's StackId, RequestId and LogicalResourceId.
+        Return the JSON to upload for `response`, applying the oversize
+        strategy if needed. Updates `self.response` if a different response
+        is sent.
         """
 
-        response_dict = response.as_dict()
-        response_dict.update({
-            key: self.event[key]
-            for key in ("StackId", "RequestId", "LogicalResourceId")
-        })
-        return response_dict
+        data = self._serialize_response(response)
+        size = len(data)
+        if size <= MAX_RESPONSE_BYTES:
+            return data
+
+        if isinstance(response, Failed):
+            return self._serialize_truncated(response)
+
+        if self.oversize_strategy == OVERSIZE_OFFLOAD:
+            key = "{}/{}.json".format(self.event["LogicalResourceId"], self.event["RequestId"])
+            pointer = self.blob_store.put(key, _encode_json(response._data))
+            offloaded = Success(response._physical_resource_id, {OFFLOADED_DATA_ATTRIBUTE: pointer})
+            data = self._serialize_response(offloaded)
+            if len(data) <= MAX_RESPONSE_BYTES:
+                self.response = offloaded
+                return data
+
+        failed = Failed(response._physical_resource_id, "Response is {} bytes, over CloudFormation's {} byte limit".format(
+            size, MAX_RESPONSE_BYTES
+        ))
+        self.response = failed
+        return self._serialize(failed)
+
+    def _serialize_truncated(self, response):
+        # Escaping can make the serialized reason longer than the reason
+        # itself, so search for the longest prefix that fits.
+        reason = response._reason
+        shortest, longest = 0, len(reason)
+        while shortest < longest:
+            length = (shortest + longest + 1) // 2
+            candidate = Failed(response._physical_resource_id, reason[:length] + "...")
+            if len(self._serialize_response(candidate)) <= MAX_RESPONSE_BYTES:
+                shortest = length
+            else:
+                longest = length - 1
+
+        truncated = Failed(response._physical_resource_id, reason[:shortest] + "...")
+        self.response = truncated
+        return self._serialize_response(truncated)
+
+    def _serialize_response(self, response):
+        """
+        Serialize a response to the JSON sent to CloudFormation, including the
+        source event's StackId, RequestId and LogicalResourceId.
+        """
+
+        if self._event_fields_json is None:
+            self._event_fields_json = "".join(
+                ',"{}":{}'.format(key, _encode_json(self.event[key]))
+                for key in ("StackId", "RequestId", "LogicalResourceId")
+            )
+        return response._serialize(self._event_fields_json)
 
     def _upload_response_data(self, url, data):
-        response = requests.put(url, data=data)
-        if response.status_code != 200:
-            raise Exception("Expected HTTP 200, but received {} from {}".format(
-                response.status_code, response.url
-            ))
+        """
+        PUT data to the response URL, retrying throttling, server and
+        connection errors with jittered exponential backoff. Attempts are
+        given timeouts that end them before the Lambda deadline.
+        """
+
+        policy = self.retry_policy
+        deadline = policy.get_deadline(self.context)
+        number = 0
+        while True:
+            number += 1
+            timeout = policy.get_attempt_timeout(deadline)
+            if timeout is not None and timeout <= 0:
+                raise ResponseUploadError("No time left to upload response to {}".format(url))
+            started = time.time()
+            status_code = error = None
+            try:
+                if timeout is None:
+                    status_code = self.transport.put(url, data)
+                else:
+                    status_code = self.transport.put(url, data, timeout=timeout)
+            except TransportError as exc:
+                error = exc
+            self.upload_attempts.append(Attempt(number, started, time.time() - started, status_code, error))
+
+            if status_code == 200:
+                return
+
+            if error is not None:
+                message = "Couldn't upload response to {}: {}".format(url, error)
+            else:
+                message = "Expected HTTP 200, but received {} from {}".format(status_code, url)
+
+            if number >= policy.max_attempts or (error is None and not policy.is_retryable_status(status_code)):
+                raise ResponseUploadError(message)
+
+            delay = policy.get_delay(number)
+            if deadline is not None and time.time() + delay >= deadline:
+                raise ResponseUploadError(message)
+            policy.sleep(delay)
+
+def _response_from_dict(response_dict):
+    """
+    Inverse of `Success.as_dict` and `Failed.as_dict`.
+    """
+
+    if response_dict["Status"] == SUCCESS:
+        return Success(response_dict["PhysicalResourceId"], response_dict["Data"])
+    return Failed(response_dict["PhysicalResourceId"], response_dict["Reason"])
 
 class Success(object):
     """
     Successful response. Takes a physical resource ID, and an optional data
     dict.
 
+    `state` is optional private, JSON serializable state, kept by
+    `BaseHandler.STATE_STORE` but not sent to CloudFormation. Without it,
+    the resource's stored state is kept.
+
     See <http://docs.aws.amazon.com/AWSCloudFormation/latest/UserGuide/crpg-ref-responses.html>
     """
 
-    def __init__(self, physical_resource_id, data={}):
+    __slots__ = ("_physical_resource_id", "_data", "_state")
+
+    def __init__(self, physical_resource_id, data={}, state=None):
         if not isinstance(physical_resource_id, basestring) or not 1 <= len(physical_resource_id) <= MAX_PHYSICAL_RESOURCE_ID_LENGTH:
             raise TypeError("physical_resource_id must be a string between 1 and {} characters".format(
                 MAX_PHYSICAL_RESOURCE_ID_LENGTH
@@ -247,6 +1153,7 @@ class Success(object):
 
         self._physical_resource_id = unicode(physical_resource_id)
         self._data = {unicode(key): unicode(value) for key, value in data.iteritems()}
+        self._state = state
 
     def as_dict(self):
         return {
@@ -255,6 +1162,11 @@ class Success(object):
             "Data": self._data
         }
 
+    def _serialize(self, event_fields_json):
+        return '{"Status":"SUCCESS","PhysicalResourceId":%s,"Data":%s%s}' % (
+            _encode_json(self._physical_resource_id), _encode_json(self._data), event_fields_json
+        )
+
     def __repr__(self):
         return "Success({!r}, {!r})".format(self._physical_resource_id, self._data)
 
@@ -272,6 +1184,8 @@ class Failed(object):
     See <http://docs.aws.amazon.com/AWSCloudFormation/latest/UserGuide/crpg-ref-responses.html>
     """
 
+    __slots__ = ("_physical_resource_id", "_reason")
+
     def __init__(self, physical_resource_id, reason):
         if not isinstance(physical_resource_id, basestring) or not 1 <= len(physical_resource_id) <= MAX_PHYSICAL_RESOURCE_ID_LENGTH:
             raise TypeError("physical_resource_id must be a string between 1 and {} characters".format(
@@ -291,6 +1205,11 @@ class Failed(object):
             "Reason": self._reason
         }
 
+    def _serialize(self, event_fields_json):
+        return '{"Status":"FAILED","PhysicalResourceId":%s,"Reason":%s%s}' % (
+            _encode_json(self._physical_resource_id), _encode_json(self._reason), event_fields_json
+        )
+
     def __repr__(self):
         return "Failed({!r}, {!r})".format(self._physical_resource_id, self._reason)
 
@@ -306,5 +1225,24 @@ class Defer(object):
         Responder(event).failed(physical_resource_id="n/a", reason="Oh no")
     """
 
+    __slots__ = ()
+
     def __repr__(self):
         return "Defer()"
+
+class Poll(Defer):
+    """
+    A deferred response, completed by polling. `BaseHandler` will call
+    `is_complete(event, context, state)` in later invocations until the work
+    is done, then respond to CloudFormation.
+
+    `state` is passed to `is_complete`, and must be JSON serializable.
+    """
+
+    __slots__ = ("state",)
+
+    def __init__(self, state=None):
+        self.state = state
+
+    def __repr__(self):
+        return "Poll({!r})".format(self.state)
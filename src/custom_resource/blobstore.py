@@ -0,0 +1,77 @@
+"""
+Blob stores, holding response Data too large to send to CloudFormation.
+
+CloudFormation rejects responses over 4096 bytes. With the "offload"
+oversize strategy, the `Responder` stores the full Data as JSON in a blob
+store and responds with a single attribute, `OFFLOADED_DATA_ATTRIBUTE`,
+holding a pointer to it. Consumers fetch the Data with the store's `get`.
+
+Stores implement `put(key, body)`, returning a pointer string, and
+`get(pointer)`, returning the body.
+"""
+
+import errno
+import os
+
+# Data attribute holding the pointer to offloaded Data.
+OFFLOADED_DATA_ATTRIBUTE = "DataPointer"
+
+class FileBlobStore(object):
+    """
+    Stores blobs as files under a local directory, e.g for tests or a
+    mounted EFS file system. Pointers are file paths.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def put(self, key, body):
+        path = os.path.join(self.directory, key)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        # Write then rename, so readers never see a partial file.
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(body)
+        os.rename(temporary_path, path)
+        return path
+
+    def get(self, pointer):
+        with open(pointer, "rb") as f:
+            return f.read()
+
+class S3BlobStore(object):
+    """
+    Stores blobs as objects in an S3 bucket. Pointers are "s3://bucket/key"
+    URLs.
+    """
+
+    def __init__(self, bucket, prefix="", client=None):
+        """
+        Arguments:
+            * `bucket`: bucket name.
+            * `prefix`: prefix for object keys.
+            * `client`: optional boto3 S3 client. Created on first use.
+        """
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client
+
+    def put(self, key, body):
+        key = self.prefix + key
+        self._get_client().put_object(Bucket=self.bucket, Key=key, Body=body, ContentType="application/json")
+        return "s3://{}/{}".format(self.bucket, key)
+
+    def get(self, pointer):
+        bucket, _, key = pointer[len("s3://"):].partition("/")
+        return self._get_client().get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def _get_client(self):
+        if self.client is None:
+            import boto3
+            self.client = boto3.client("s3")
+        return self.client
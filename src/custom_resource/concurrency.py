@@ -0,0 +1,51 @@
+"""
+Thread pools shared by the whole process, so warm invocations don't pay to
+start threads.
+
+Pools are named by purpose. Work running on one pool must not wait for more
+work on the same pool, or it may deadlock once the pool is full - use a
+differently named pool for nested work.
+"""
+
+import sys
+import threading
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_thread_pool(name, size):
+    """
+    Return the process-wide `ThreadPool` with the given name and size,
+    creating it on first use.
+    """
+
+    key = (name, size)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                # Imported on first use to keep cold starts fast.
+                from multiprocessing.pool import ThreadPool
+                pool = _pools[key] = ThreadPool(size)
+    return pool
+
+def map_concurrently(function, items, max_workers, pool_name="default"):
+    """
+    Call `function` with each item on a bounded thread pool. Returns a list
+    of (result, exc_info) pairs in item order - `exc_info` is None unless the
+    call raised an exception, in which case `result` is None.
+
+    Runs in the calling thread if there's only one item or worker.
+    """
+
+    def call(item):
+        try:
+            return function(item), None
+        except Exception:
+            return None, sys.exc_info()
+
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+    return get_thread_pool(pool_name, max_workers).map(call, items)
@@ -0,0 +1,212 @@
+"""
+Continuation backends for long-running resources.
+
+When `create`, `update` or `delete` return `Poll`, the handler asks its
+continuation backend to invoke it again later with a copy of the event. The
+copy carries the poll state under the `CONTINUATION_KEY` key, and the handler
+calls `is_complete` instead of dispatching the event again.
+
+`SQSContinuation` and `SchedulerContinuation` deliver the event after the
+poll delay, so nothing is billed while waiting. `LambdaContinuation` needs
+no setup, but each poll waits out the delay in a running invocation.
+"""
+
+import collections
+import datetime
+import json
+import os
+import time
+
+# Event key holding the continuation: {"State": ..., "Polls": ..., "StartedAt": ...}
+CONTINUATION_KEY = "CustomResourceContinuation"
+
+# SQS's maximum DelaySeconds.
+SQS_MAX_DELAY_SECONDS = 900
+
+# Continuations delivered this early are rescheduled rather than polled.
+EARLY_DELIVERY_TOLERANCE_SECONDS = 1
+
+def _not_before(event, delay):
+    event = dict(event)
+    event[CONTINUATION_KEY] = dict(event[CONTINUATION_KEY], NotBefore=time.time() + delay)
+    return event
+
+class LambdaContinuation(object):
+    """
+    Re-invoke the Lambda function asynchronously.
+
+    Lambda can't delay an invocation, so the new invocation waits out the
+    poll delay itself (bounded by its remaining time) before calling
+    `is_complete` - and is billed for the wait. Prefer `SQSContinuation` or
+    `SchedulerContinuation` outside of quick experiments.
+    """
+
+    def __init__(self, function_name=None, client=None):
+        """
+        Arguments:
+            * `function_name`: function to invoke. Defaults to the current
+              function, from `context.invoked_function_arn`.
+            * `client`: optional boto3 Lambda client. Created on first use.
+        """
+
+        self.function_name = function_name
+        self.client = client
+
+    def schedule(self, event, delay, context):
+        """
+        Invoke the function with `event`, to be processed after `delay`
+        seconds.
+        """
+
+        if self.client is None:
+            import boto3
+            self.client = boto3.client("lambda")
+
+        self.client.invoke(
+            FunctionName=self.function_name or context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps(_not_before(event, delay))
+        )
+
+    def ready(self, event, context):
+        """
+        Called before polling a continuation event. Waits until its
+        NotBefore time, leaving at least half the remaining time for
+        `is_complete`.
+        """
+
+        not_before = event[CONTINUATION_KEY].get("NotBefore")
+        if not_before is None:
+            return True
+        wait = not_before - time.time()
+        get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+        if get_remaining_time_in_millis is not None:
+            wait = min(wait, get_remaining_time_in_millis() / 1000.0 / 2)
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+class _DelayedContinuation(object):
+    def ready(self, event, context):
+        """
+        Called before polling a continuation event. Events delivered early -
+        e.g delays longer than the backend supports - are rescheduled for
+        the remaining time, returning False.
+        """
+
+        not_before = event[CONTINUATION_KEY].get("NotBefore")
+        if not_before is None:
+            return True
+        remaining = not_before - time.time()
+        if remaining <= EARLY_DELIVERY_TOLERANCE_SECONDS:
+            return True
+        self.schedule(event, remaining, context)
+        return False
+
+class SQSContinuation(_DelayedContinuation):
+    """
+    Send the event to an SQS queue with a delivery delay. The queue must
+    trigger the function - see `BaseHandler.handle_queue_event`. Delays over
+    15 minutes take several hops.
+    """
+
+    def __init__(self, queue_url, client=None):
+        """
+        Arguments:
+            * `queue_url`: URL of the queue triggering the function.
+            * `client`: optional boto3 SQS client. Created on first use.
+        """
+
+        self.queue_url = queue_url
+        self.client = client
+
+    def schedule(self, event, delay, context):
+        if self.client is None:
+            import boto3
+            self.client = boto3.client("sqs")
+
+        self.client.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(_not_before(event, delay)),
+            DelaySeconds=int(min(max(delay, 0), SQS_MAX_DELAY_SECONDS))
+        )
+
+class SchedulerContinuation(_DelayedContinuation):
+    """
+    Create a one-time EventBridge Scheduler schedule invoking the function,
+    deleted once it has run.
+    """
+
+    def __init__(self, role_arn, function_arn=None, group_name="default", client=None):
+        """
+        Arguments:
+            * `role_arn`: role EventBridge Scheduler assumes to invoke the
+              function. Needs `lambda:InvokeFunction`.
+            * `function_arn`: function to invoke. Defaults to the current
+              function, from `context.invoked_function_arn`.
+            * `group_name`: schedule group to create schedules in.
+            * `client`: optional boto3 Scheduler client. Created on first
+              use.
+        """
+
+        self.role_arn = role_arn
+        self.function_arn = function_arn
+        self.group_name = group_name
+        self.client = client
+
+    def schedule(self, event, delay, context):
+        if self.client is None:
+            import boto3
+            self.client = boto3.client("scheduler")
+
+        event = _not_before(event, delay)
+        at = datetime.datetime.utcfromtimestamp(int(event[CONTINUATION_KEY]["NotBefore"]) + 1)
+        self.client.create_schedule(
+            Name="custom-resource-" + os.urandom(16).encode("hex"),
+            GroupName=self.group_name,
+            ScheduleExpression="at({})".format(at.strftime("%Y-%m-%dT%H:%M:%S")),
+            ScheduleExpressionTimezone="UTC",
+            FlexibleTimeWindow={"Mode": "OFF"},
+            ActionAfterCompletion="DELETE",
+            Target={
+                "Arn": self.function_arn or context.invoked_function_arn,
+                "RoleArn": self.role_arn,
+                "Input": json.dumps(event)
+            }
+        )
+
+class LocalContinuation(object):
+    """
+    In-process continuation queue, for tests. Delays are recorded but not
+    waited for.
+
+        continuation = LocalContinuation()
+        handler.CONTINUATION = continuation
+        handler(event, context)
+        continuation.run(handler, context)
+    """
+
+    def __init__(self):
+        self.queue = collections.deque()
+        self.delays = []
+
+    def schedule(self, event, delay, context):
+        self.queue.append(json.loads(json.dumps(event)))
+        self.delays.append(delay)
+
+    def ready(self, event, context):
+        return True
+
+    def run(self, handler, context=None, max_invocations=1000):
+        """
+        Invoke `handler` with queued events until the queue is empty. Returns
+        the number of invocations.
+        """
+
+        invocations = 0
+        while self.queue:
+            if invocations >= max_invocations:
+                raise RuntimeError("Still polling after {} invocations".format(invocations))
+            handler(self.queue.popleft(), context)
+            invocations += 1
+        return invocations
@@ -0,0 +1,122 @@
+"""
+Generator-based coroutines, for handlers waiting on many network calls.
+
+A coroutine is a generator function. It yields futures - or lists or dicts of
+futures, or other coroutines - and receives their results. Exceptions raised
+by the work behind a future are raised at the `yield`. Finish with
+`raise Return(value)`:
+
+    def create(self, event, context):
+        bucket, table = yield [
+            self.submit(create_bucket, name),
+            self.submit(create_table, name)
+        ]
+        raise Return((name, {"Bucket": bucket, "Table": table}))
+
+Futures are run on a process-wide thread pool, reused by warm invocations.
+Coroutines yielded in a list or dict run one after another - yield futures
+for concurrency.
+"""
+
+import sys
+import threading
+import types
+
+from .concurrency import get_thread_pool
+
+class Return(Exception):
+    """
+    Raised by a coroutine to finish with a value.
+    """
+
+    def __init__(self, value=None):
+        super(Return, self).__init__(value)
+        self.value = value
+
+class Future(object):
+    """
+    The result of work running in another thread.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._exc_info = None
+
+    def set_result(self, value):
+        self._value = value
+        self._done.set()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self):
+        """
+        Wait for the work to finish. Returns its result, or raises its
+        exception.
+        """
+
+        self._done.wait()
+        if self._exc_info is not None:
+            exc_type, exc, tb = self._exc_info
+            raise exc_type, exc, tb
+        return self._value
+
+def submit(function, args=(), kwargs=None, max_workers=16):
+    """
+    Call `function(*args, **kwargs)` on the shared coroutine thread pool.
+    Returns a `Future`.
+    """
+
+    future = Future()
+    def run():
+        try:
+            future.set_result(function(*args, **(kwargs or {})))
+        except Exception:
+            future.set_exc_info(sys.exc_info())
+    get_thread_pool("coroutines", max_workers).apply_async(run)
+    return future
+
+def is_coroutine(value):
+    return isinstance(value, types.GeneratorType)
+
+def run_coroutine(coroutine):
+    """
+    Drive `coroutine` to completion in the calling thread, returning the
+    value it passes to `Return` - or None if it doesn't.
+    """
+
+    value = None
+    exc_info = None
+    while True:
+        try:
+            if exc_info is not None:
+                yielded = coroutine.throw(*exc_info)
+            else:
+                yielded = coroutine.send(value)
+        except Return as result:
+            return result.value
+        except StopIteration:
+            return None
+
+        try:
+            value = _resolve(yielded)
+            exc_info = None
+        except Exception:
+            value = None
+            exc_info = sys.exc_info()
+
+def _resolve(yielded):
+    if isinstance(yielded, Future):
+        return yielded.result()
+    if is_coroutine(yielded):
+        return run_coroutine(yielded)
+    if isinstance(yielded, (list, tuple)):
+        return [_resolve(item) for item in yielded]
+    if isinstance(yielded, dict):
+        return {key: _resolve(item) for key, item in yielded.iteritems()}
+    raise TypeError("Coroutines must yield futures, coroutines, or lists or dicts of them, not {!r}".format(yielded))
@@ -0,0 +1,87 @@
+"""
+Structured diffs between `OldResourceProperties` and `ResourceProperties`.
+"""
+
+SERVICE_TOKEN = "ServiceToken"
+
+class PropertiesDiff(object):
+    """
+    Differences between two property dicts. Nested dicts are compared key by
+    key; other values, including lists, are compared as a whole.
+
+    Paths are tuples of keys, e.g ("Tags", "Environment").
+
+    Attributes:
+        * `added`: dict of path -> new value.
+        * `removed`: dict of path -> old value.
+        * `changed`: dict of path -> (old value, new value).
+    """
+
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    @property
+    def paths(self):
+        """
+        Set of all paths that differ.
+        """
+
+        return set(self.added) | set(self.removed) | set(self.changed)
+
+    def touches(self, *path):
+        """
+        True if anything at or beneath `path` differs, e.g.
+        `diff.touches("Tags")`.
+        """
+
+        return any(changed_path[:len(path)] == path for changed_path in self.paths)
+
+    def __nonzero__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PropertiesDiff)
+            and (self.added, self.removed, self.changed) == (other.added, other.removed, other.changed)
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "PropertiesDiff(added={!r}, removed={!r}, changed={!r})".format(
+            self.added, self.removed, self.changed
+        )
+
+def diff_properties(old, new, ignore=()):
+    """
+    Compare two property dicts, returning a `PropertiesDiff`. `ServiceToken`
+    and top-level keys in `ignore` are skipped.
+    """
+
+    ignore = frozenset(ignore) | frozenset([SERVICE_TOKEN])
+    diff = PropertiesDiff({}, {}, {})
+    _diff_dicts(
+        {key: value for key, value in (old or {}).iteritems() if key not in ignore},
+        {key: value for key, value in (new or {}).iteritems() if key not in ignore},
+        (), diff
+    )
+    return diff
+
+def _diff_dicts(old, new, path, diff):
+    for key, old_value in old.iteritems():
+        key_path = path + (key,)
+        if key not in new:
+            diff.removed[key_path] = old_value
+            continue
+        new_value = new[key]
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            _diff_dicts(old_value, new_value, key_path, diff)
+        elif old_value != new_value:
+            diff.changed[key_path] = (old_value, new_value)
+
+    for key, new_value in new.iteritems():
+        if key not in old:
+            diff.added[path + (key,)] = new_value
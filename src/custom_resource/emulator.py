@@ -0,0 +1,237 @@
+"""
+Local Lambda runtime emulator, for load-testing handlers without deploying
+them.
+
+Runs a handler in a pool of worker processes, each imitating a Lambda
+container: the handler's module is imported on a worker's first invocation
+(a cold start), and reused for later ones (warm starts). Workers are
+replaced after `--invocations-per-container` invocations, forcing more cold
+starts. Each invocation gets a context whose `get_remaining_time_in_millis`
+counts down from `--timeout`.
+
+Events are read from a file - a JSON list, or one JSON event per line - or
+generated. Their ResponseURL is pointed at a local `ResponseServer`, which
+collects the responses.
+
+Usage:
+    python -m custom_resource.emulator lambda_function.lambda_handler
+        [--path src] [--events events.json] [--requests 100]
+        [--workers 4] [--invocations-per-container 0] [--timeout 300]
+        [--output report.json]
+
+`custom_resource` itself is imported before workers start, so its import
+time isn't included in cold starts - see `benchmarks/import_time.py`.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+import uuid
+
+from .testing import ResponseServer, summarize_latencies
+
+REQUEST_TYPES = ["Create", "Update", "Delete"]
+
+class FakeContext(object):
+    """
+    Imitates the Lambda context object, with a real countdown.
+    """
+
+    def __init__(self, timeout=300, function_name="emulated-function", memory_limit_in_mb=128):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:" + function_name
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = "/aws/lambda/" + function_name
+        self.log_stream_name = "emulated"
+        self._deadline = time.time() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.time()) * 1000))
+
+def load_handler(path):
+    """
+    Import a handler from a dotted path, e.g "lambda_function.lambda_handler".
+    """
+
+    module_name, _, attribute = path.rpartition(".")
+    if not module_name:
+        raise ValueError("Handler path must be module.attribute, not {!r}".format(path))
+    return getattr(importlib.import_module(module_name), attribute)
+
+def generate_events(count, resource_type="Custom::Emulated", properties=None):
+    """
+    Generate `count` events, cycling through Create, Update and Delete of
+    one resource per cycle.
+    """
+
+    properties = dict(properties or {}, ServiceToken="arn:aws:lambda:us-east-1:123456789012:function:emulated")
+    for index in range(count):
+        request_type = REQUEST_TYPES[index % len(REQUEST_TYPES)]
+        logical_resource_id = "Resource{}".format(index // len(REQUEST_TYPES))
+        event = {
+            "RequestType": request_type,
+            "StackId": "arn:aws:cloudformation:us-east-1:123456789012:stack/emulated/1",
+            "RequestId": str(uuid.uuid4()),
+            "ResourceType": resource_type,
+            "LogicalResourceId": logical_resource_id,
+            "ResourceProperties": properties
+        }
+        if request_type != "Create":
+            event["PhysicalResourceId"] = logical_resource_id
+        if request_type == "Update":
+            event["OldResourceProperties"] = properties
+        yield event
+
+def read_events(path):
+    """
+    Read events from a JSON list, or a file of one JSON event per line.
+    """
+
+    with open(path) as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+# State of the emulated container in a worker process.
+_container = {}
+
+def _init_container(handler_path, timeout):
+    _container.clear()
+    _container.update(handler_path=handler_path, timeout=timeout, handler=None, invocations=0)
+
+def _invoke(event):
+    """
+    Run one invocation in a worker process. Returns a dict describing it.
+    """
+
+    result = {"pid": os.getpid(), "cold": _container["handler"] is None, "init": 0, "error": None}
+    started = time.time()
+    try:
+        if result["cold"]:
+            _container["handler"] = load_handler(_container["handler_path"])
+            result["init"] = time.time() - started
+        context = FakeContext(_container["timeout"])
+        _container["handler"](event, context)
+        result["timed_out"] = context.get_remaining_time_in_millis() == 0
+    except Exception:
+        result["error"] = traceback.format_exc()
+    result["duration"] = time.time() - started
+    result["request_id"] = event.get("RequestId")
+    _container["invocations"] += 1
+    return result
+
+def run(handler_path, events, workers=4, invocations_per_container=None, timeout=300, server=None):
+    """
+    Invoke the handler with each event, returning a report dict.
+
+    Arguments:
+        * `handler_path`: dotted path to the handler.
+        * `events`: iterable of events. Their ResponseURL is replaced.
+        * `workers`: number of worker processes (containers) at once.
+        * `invocations_per_container`: replace workers after this many
+          invocations. None to keep them for the whole run.
+        * `timeout`: emulated function timeout, in seconds.
+        * `server`: optional `ResponseServer` to collect responses. Defaults
+          to a new one.
+    """
+
+    # Imported on first use, as it's slow and only needed here.
+    import multiprocessing
+
+    server = server if server is not None else ResponseServer()
+    events = [dict(event, ResponseURL=server.url) for event in events]
+
+    with server:
+        pool = multiprocessing.Pool(
+            workers,
+            initializer=_init_container,
+            initargs=(handler_path, timeout),
+            maxtasksperchild=invocations_per_container
+        )
+        try:
+            started = time.time()
+            results = list(pool.imap_unordered(_invoke, events, chunksize=1))
+            elapsed = time.time() - started
+        finally:
+            pool.close()
+            pool.join()
+        bodies = list(server.bodies)
+
+    responses = [json.loads(body) for body in bodies]
+    cold = [result for result in results if result["cold"]]
+    warm = [result for result in results if not result["cold"]]
+    return {
+        "invocations": len(results),
+        "elapsed_seconds": elapsed,
+        "throughput_per_second": len(results) / elapsed if elapsed else None,
+        "containers": len(set(result["pid"] for result in results)),
+        "cold_starts": len(cold),
+        "cold_latency": summarize_latencies([result["duration"] for result in cold]),
+        "cold_init": summarize_latencies([result["init"] for result in cold]),
+        "warm_latency": summarize_latencies([result["duration"] for result in warm]),
+        "errors": [result["error"] for result in results if result["error"]],
+        "timeouts": sum(1 for result in results if result.get("timed_out")),
+        "response_statuses": dict(collections.Counter(response.get("Status") for response in responses)),
+        "missing_responses": len(events) - len(responses),
+        "server_statuses": {str(status): count for status, count in server.statuses.items()},
+        "responses": responses
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a custom resource handler in emulated Lambda containers.")
+    parser.add_argument("handler", help="dotted path to the handler, e.g lambda_function.lambda_handler")
+    parser.add_argument("--path", default=".", help="directory to import the handler from")
+    parser.add_argument("--events", help="file of events - a JSON list or JSON lines")
+    parser.add_argument("--requests", type=int, default=100, help="number of events to generate without --events")
+    parser.add_argument("--properties", type=json.loads, default={}, help="ResourceProperties for generated events, as JSON")
+    parser.add_argument("--resource-type", default="Custom::Emulated")
+    parser.add_argument("--workers", type=int, default=4, help="number of containers at once")
+    parser.add_argument("--invocations-per-container", type=int, default=0, help="replace containers after this many invocations, 0 for never")
+    parser.add_argument("--timeout", type=float, default=300, help="function timeout, in seconds")
+    parser.add_argument("--latency", type=float, default=0, help="ResponseURL latency per request, in seconds")
+    parser.add_argument("--output", help="write the JSON report, including responses, to this file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.abspath(args.path))
+    if args.events:
+        events = read_events(args.events)
+    else:
+        events = generate_events(args.requests, args.resource_type, args.properties)
+
+    report = run(
+        args.handler, events,
+        workers=args.workers,
+        invocations_per_container=args.invocations_per_container or None,
+        timeout=args.timeout,
+        server=ResponseServer(latency=args.latency)
+    )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    print("{invocations} invocations in {containers} containers: {throughput_per_second:.1f}/s".format(**report))
+    for name in "cold_latency", "cold_init", "warm_latency":
+        latency = report[name]
+        if latency["count"]:
+            print("{}: {} invocations, mean {mean_ms:.2f}ms, p50 {p50_ms:.2f}ms, p99 {p99_ms:.2f}ms, max {max_ms:.2f}ms".format(
+                name.replace("_", " "), latency["count"], **latency
+            ))
+    print("responses: {}, missing: {}, timeouts: {}, errors: {}".format(
+        report["response_statuses"], report["missing_responses"], report["timeouts"], len(report["errors"])
+    ))
+    for error in report["errors"][:5]:
+        print(error, file=sys.stderr)
+    return 1 if report["errors"] or report["missing_responses"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Typed view of custom resource request events.
+
+CloudFormation sends every scalar resource property as a string. With
+`BaseHandler.TYPED_EVENTS`, properties are converted to the types allowed by
+`RESOURCE_PROPERTIES_SCHEMA` before being validated, and handlers receive a
+`CustomResourceEvent` of the converted values:
+
+    class Handler(BaseHandler):
+        TYPED_EVENTS = True
+        RESOURCE_PROPERTIES_SCHEMA = {
+            "properties": {
+                "Count": {"type": "integer", "minimum": 1},
+                "Enabled": {"type": "boolean"}
+            }
+        }
+
+        def create(self, event, context):
+            event.properties["Count"]  # 3, not "3"
+
+Values that don't convert fail validation - unless the schema also allows
+strings, in which case they're kept as strings and validated as such.
+Converters are built from the schema once per handler class.
+"""
+
+# Event keys holding resource properties.
+PROPERTIES_KEYS = ("ResourceProperties", "OldResourceProperties")
+
+def _event_field(key):
+    return property(lambda self: self.raw.get(key), doc="The event's {!r}, or None.".format(key))
+
+class CustomResourceEvent(object):
+    """
+    A request event, with typed accessors. Also supports `event[key]`,
+    `event.get(key)` and `key in event` on the raw event, so code written for
+    dict events keeps working.
+    """
+
+    __slots__ = ("raw", "_converters", "_converted", "_properties", "_old_properties")
+
+    def __init__(self, raw, converters=None, converted=None):
+        """
+        Arguments:
+            * `raw`: the event dict.
+            * `converters`: dict of property name -> converter, from
+              `build_converters`.
+            * `converted`: optional dict of event key -> properties already
+              converted with `convert_properties`.
+        """
+
+        self.raw = raw
+        self._converters = converters or {}
+        self._converted = converted or {}
+        self._properties = None
+        self._old_properties = None
+
+    request_type = _event_field("RequestType")
+    stack_id = _event_field("StackId")
+    request_id = _event_field("RequestId")
+    logical_resource_id = _event_field("LogicalResourceId")
+    physical_resource_id = _event_field("PhysicalResourceId")
+    resource_type = _event_field("ResourceType")
+    response_url = _event_field("ResponseURL")
+    service_token = _event_field("ServiceToken")
+
+    @property
+    def properties(self):
+        """
+        Converted "ResourceProperties".
+        """
+
+        if self._properties is None:
+            self._properties = Properties(
+                self.raw.get("ResourceProperties", {}), self._converters, self._converted.get("ResourceProperties")
+            )
+        return self._properties
+
+    @property
+    def old_properties(self):
+        """
+        Converted "OldResourceProperties", or None except for updates.
+        """
+
+        if self._old_properties is None and "OldResourceProperties" in self.raw:
+            self._old_properties = Properties(
+                self.raw["OldResourceProperties"], self._converters, self._converted.get("OldResourceProperties")
+            )
+        return self._old_properties
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def get(self, key, default=None):
+        return self.raw.get(key, default)
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def __repr__(self):
+        return "CustomResourceEvent({!r})".format(self.raw)
+
+class Properties(object):
+    """
+    Read-only mapping of resource properties, converting each value when
+    it's first read - unless `converted` already holds the converted values.
+    """
+
+    __slots__ = ("raw", "_converters", "_converted")
+
+    def __init__(self, raw, converters, converted=None):
+        self.raw = raw
+        self._converters = converters
+        self._converted = dict(converted) if converted is not None else {}
+
+    def __getitem__(self, key):
+        try:
+            return self._converted[key]
+        except KeyError:
+            pass
+
+        value = _convert(key, self.raw[key], self._converters)
+        self._converted[key] = value
+        return value
+
+    def get(self, key, default=None):
+        if key in self.raw:
+            return self[key]
+        return default
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def keys(self):
+        return self.raw.keys()
+
+    def items(self):
+        return [(key, self[key]) for key in self.raw]
+
+    def __repr__(self):
+        return "Properties({!r})".format(self.raw)
+
+def convert_properties(properties, converters):
+    """
+    Return a copy of `properties` with every value converted. Raises
+    ValueError, naming the property, if a value can't be converted.
+    """
+
+    return {key: _convert(key, value, converters) for key, value in properties.iteritems()}
+
+def _convert(key, value, converters):
+    converter = converters.get(key)
+    if converter is None:
+        return value
+    try:
+        return converter(value)
+    except ValueError as exc:
+        raise ValueError("Property {}: {}".format(key, exc))
+
+def build_converters(schema):
+    """
+    Return a dict of top-level property name -> converter for a resource
+    properties schema. Properties that never need converting are left out.
+    """
+
+    converters = {}
+    for name, subschema in (schema or {}).get("properties", {}).iteritems():
+        converter = _build_converter(subschema)
+        if converter is not None:
+            converters[name] = converter
+    return converters
+
+def _build_converter(schema):
+    """
+    Return a function converting string values to the non-string type allowed
+    by `schema`, recursing into arrays and objects - or None if no conversion
+    is needed.
+    """
+
+    if not isinstance(schema, dict):
+        return None
+
+    types = schema.get("type")
+    if isinstance(types, basestring):
+        types = [types]
+    types = set(types or ())
+
+    if "array" in types:
+        convert_item = _build_converter(schema.get("items"))
+        if convert_item is None:
+            return None
+        return lambda value: [convert_item(item) for item in value] if isinstance(value, list) else value
+
+    if "object" in types:
+        converters = build_converters(schema)
+        if not converters:
+            return None
+        def convert_object(value):
+            if not isinstance(value, dict):
+                return value
+            return {
+                key: converters[key](item) if key in converters else item
+                for key, item in value.iteritems()
+            }
+        return convert_object
+
+    for name, parse in _SCALAR_PARSERS:
+        if name in types:
+            if "string" in types:
+                # Strings are valid too, so keep those that don't parse.
+                return lambda value: _parse_or_keep(parse, value) if isinstance(value, basestring) else value
+            return lambda value: parse(value) if isinstance(value, basestring) else value
+    return None
+
+def _parse_or_keep(parse, value):
+    try:
+        return parse(value)
+    except ValueError:
+        return value
+
+def _parse_boolean(value):
+    lowered = value.lower()
+    if lowered == "true":
+        return True
+    if lowered == "false":
+        return False
+    raise ValueError("{!r} is not a boolean".format(value))
+
+def _parse_integer(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("{!r} is not an integer".format(value))
+
+def _parse_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError("{!r} is not a number".format(value))
+
+# Checked in order - "integer" wins over "number" if both are allowed.
+_SCALAR_PARSERS = (
+    ("boolean", _parse_boolean),
+    ("integer", _parse_integer),
+    ("number", _parse_number)
+)
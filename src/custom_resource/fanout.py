@@ -0,0 +1,250 @@
+"""
+Concurrent create, update and delete of a resource's sub-items - e.g. the
+DNS records or objects in a collection managed by one custom resource.
+
+Items are dicts of item key -> item properties. `FanOut` diffs the old and
+new items, runs only the operations needed on a bounded thread pool, and
+aggregates the outcome into one response:
+
+    records = FanOut(create_record, delete_record, update_record, max_workers=8)
+
+    def update(self, event, context):
+        old = index_items(event["OldResourceProperties"]["Records"], "Name")
+        new = index_items(event["ResourceProperties"]["Records"], "Name")
+        return records.run(event["PhysicalResourceId"], old, new, context)
+
+If any operation fails, the rest are skipped, those already done are rolled
+back, and `Failed` is returned. Operations aren't started shortly before the
+Lambda deadline, so there's time to roll back and respond.
+"""
+
+import sys
+import time
+
+from . import Failed, Success
+from .concurrency import map_concurrently
+from .diff import diff_properties
+
+CREATE = "Create"
+UPDATE = "Update"
+DELETE = "Delete"
+
+class Operation(object):
+    """
+    A planned change to one item. `old` is None for creates, `new` is None
+    for deletes.
+    """
+
+    __slots__ = ("action", "key", "old", "new")
+
+    def __init__(self, action, key, old=None, new=None):
+        self.action = action
+        self.key = key
+        self.old = old
+        self.new = new
+
+    def reversed(self):
+        """
+        The operation undoing this one.
+        """
+
+        action = {CREATE: DELETE, DELETE: CREATE, UPDATE: UPDATE}[self.action]
+        return Operation(action, self.key, old=self.new, new=self.old)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Operation)
+            and (self.action, self.key, self.old, self.new) == (other.action, other.key, other.old, other.new)
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "Operation({!r}, {!r}, old={!r}, new={!r})".format(self.action, self.key, self.old, self.new)
+
+def index_items(items, key):
+    """
+    Turn a list of item dicts into a dict keyed by each item's `key`
+    property. Raises ValueError on duplicate keys.
+    """
+
+    indexed = {}
+    for item in items or ():
+        item_key = item[key]
+        if item_key in indexed:
+            raise ValueError("Duplicate {} {!r}".format(key, item_key))
+        indexed[item_key] = item
+    return indexed
+
+def plan(old_items, new_items):
+    """
+    Return the `Operation`s turning `old_items` into `new_items`, sorted by
+    key. Unchanged items are left out.
+    """
+
+    old_items = old_items or {}
+    new_items = new_items or {}
+    diff = diff_properties(old_items, new_items)
+    operations = []
+    for key in sorted(set(path[0] for path in diff.paths)):
+        if key not in new_items:
+            operations.append(Operation(DELETE, key, old=old_items[key]))
+        elif key not in old_items:
+            operations.append(Operation(CREATE, key, new=new_items[key]))
+        else:
+            operations.append(Operation(UPDATE, key, old=old_items[key], new=new_items[key]))
+    return operations
+
+class FanOut(object):
+    """
+    Applies per-item operations concurrently.
+    """
+
+    def __init__(self, create, delete, update=None, max_workers=8, deadline_margin=10.0):
+        """
+        Arguments:
+            * `create`: function taking (key, new item), returning an
+              optional string to include in the response Data under `key`.
+            * `delete`: function taking (key, old item).
+            * `update`: function taking (key, old item, new item), returning
+              as `create`. Defaults to deleting then creating, re-creating
+              the old item if creating the new one fails.
+            * `max_workers`: maximum number of operations run at once.
+            * `deadline_margin`: seconds before the Lambda deadline after
+              which no more operations are started. Rollbacks may use the
+              first half of it, leaving the rest to respond.
+        """
+
+        self.create = create
+        self.delete = delete
+        self.update = update
+        self.max_workers = max_workers
+        self.deadline_margin = deadline_margin
+
+    def run(self, physical_resource_id, old_items, new_items, context=None, data=None):
+        """
+        Apply the changes from `old_items` to `new_items`, returning
+        `Success` or `Failed` for `physical_resource_id`.
+
+        Arguments:
+            * `context`: optional Lambda context, to stop before the deadline.
+            * `data`: optional Data for unchanged items, e.g from
+              `BaseHandler.get_previous_data`. Entries for deleted items are
+              dropped.
+        """
+
+        deadline = self._get_deadline(context)
+        operations = plan(old_items, new_items)
+        results = self._apply(operations, deadline, stop_on_failure=True)
+
+        failures = [
+            (operation, exc_info) for operation, (result, exc_info) in zip(operations, results)
+            if exc_info is not None
+        ]
+        if not failures:
+            response_data = dict(data or {})
+            for operation, (result, exc_info) in zip(operations, results):
+                response_data.pop(operation.key, None)
+                if result is not None:
+                    response_data[operation.key] = unicode(result)
+            return Success(physical_resource_id, response_data)
+
+        reasons = [
+            "{} {} failed: {}".format(operation.action, operation.key, exc_info[1])
+            for operation, exc_info in failures
+            if not isinstance(exc_info[1], _Skipped)
+        ]
+        if any(isinstance(exc_info[1], _DeadlineReached) for operation, exc_info in failures):
+            reasons.append("Stopped before the Lambda deadline")
+
+        done = [operation for operation, (result, exc_info) in zip(operations, results) if exc_info is None]
+        if done:
+            rollbacks = [operation.reversed() for operation in done]
+            rollback_deadline = deadline + self.deadline_margin / 2.0 if deadline is not None else None
+            rollback_results = self._apply(rollbacks, rollback_deadline, stop_on_failure=False)
+            rollback_failures = [
+                "{} {} {}".format(
+                    operation.action, operation.key,
+                    "not started before the Lambda deadline" if isinstance(exc_info[1], _Skipped)
+                    else "failed: {}".format(exc_info[1])
+                )
+                for operation, (result, exc_info) in zip(rollbacks, rollback_results)
+                if exc_info is not None
+            ]
+            if rollback_failures:
+                reasons.append("Rollback incomplete: " + "; ".join(rollback_failures))
+            else:
+                reasons.append("Rolled back {} item{}".format(len(done), "" if len(done) == 1 else "s"))
+
+        return Failed(physical_resource_id, "; ".join(reasons))
+
+    def _apply(self, operations, deadline, stop_on_failure):
+        """
+        Run `operations` concurrently, returning (result, exc_info) pairs.
+        Operations not started are reported as `_Skipped` exceptions.
+        """
+
+        state = {"failed": False}
+
+        def apply(operation):
+            if stop_on_failure and state["failed"]:
+                raise _Skipped()
+            if deadline is not None and time.time() >= deadline:
+                state["failed"] = True
+                raise _DeadlineReached()
+            try:
+                return self._call(operation)
+            except Exception:
+                state["failed"] = True
+                raise
+
+        return map_concurrently(apply, operations, self.max_workers, pool_name="fanout")
+
+    def _call(self, operation):
+        if operation.action == CREATE:
+            return self.create(operation.key, operation.new)
+        if operation.action == DELETE:
+            return self.delete(operation.key, operation.old)
+        if self.update is not None:
+            return self.update(operation.key, operation.old, operation.new)
+        return self._replace(operation.key, operation.old, operation.new)
+
+    def _replace(self, key, old, new):
+        """
+        Update by deleting then creating. If creating fails, the old item is
+        re-created, so a failed update leaves it as it was.
+        """
+
+        self.delete(key, old)
+        try:
+            return self.create(key, new)
+        except Exception:
+            exc_info = sys.exc_info()
+            try:
+                self.create(key, old)
+            except Exception as exc:
+                raise _RestoreFailed("{}; re-creating the old item failed: {}".format(exc_info[1], exc))
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _get_deadline(self, context):
+        get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+        if get_remaining_time_in_millis is None:
+            return None
+        return time.time() + get_remaining_time_in_millis() / 1000.0 - self.deadline_margin
+
+class _Skipped(Exception):
+    """
+    An operation wasn't started because another failed.
+    """
+
+class _DeadlineReached(_Skipped):
+    """
+    An operation wasn't started because the deadline was close.
+    """
+
+class _RestoreFailed(Exception):
+    """
+    Creating an item's replacement failed, and so did re-creating the
+    deleted original.
+    """
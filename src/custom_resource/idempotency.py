@@ -0,0 +1,173 @@
+"""
+Idempotency stores, deduplicating repeated deliveries of the same request.
+
+CloudFormation and Lambda retries can deliver a request more than once. A
+store records each request - keyed on (StackId, LogicalResourceId,
+RequestId) - as in progress, then as completed along with the response sent.
+`BaseHandler` replays a completed response to duplicates instead of calling
+your code again, and ignores duplicates of requests still in progress.
+
+In-progress records expire after `in_progress_timeout` seconds, so a request
+whose invocation crashed can be retried. Requests whose response couldn't be
+uploaded are released straight away.
+"""
+
+import collections
+import json
+import threading
+import time
+
+from .cache import LRUCache
+
+IN_PROGRESS = "IN_PROGRESS"
+COMPLETED = "COMPLETED"
+
+# Lambda's maximum execution time.
+DEFAULT_IN_PROGRESS_TIMEOUT = 15 * 60
+
+# `response` is the response dict sent to CloudFormation, or None if the
+# response was deferred.
+IdempotencyRecord = collections.namedtuple("IdempotencyRecord", ["status", "response", "updated"])
+
+class MemoryIdempotencyStore(object):
+    """
+    Per-container store, keeping the `max_size` most recent requests.
+    """
+
+    def __init__(self, max_size=1000, in_progress_timeout=DEFAULT_IN_PROGRESS_TIMEOUT):
+        self.in_progress_timeout = in_progress_timeout
+        self._records = LRUCache(max_size)
+
+    def begin(self, key):
+        """
+        Mark `key` as in progress and return None, or return the existing
+        record if `key` has been seen before.
+        """
+
+        with self._records.lock:
+            record = self._records.get(key)
+            if record is not None and not _expired(record, self.in_progress_timeout):
+                return record
+            self._records.set(key, IdempotencyRecord(IN_PROGRESS, None, time.time()))
+            return None
+
+    def complete(self, key, response):
+        """
+        Mark `key` as completed, with the response sent.
+        """
+
+        self._records.set(key, IdempotencyRecord(COMPLETED, response, time.time()))
+
+    def release(self, key):
+        """
+        Forget an in-progress `key`, so the request can be retried.
+        """
+
+        with self._records.lock:
+            record = self._records.get(key)
+            if record is not None and record.status == IN_PROGRESS:
+                self._records.pop(key)
+
+    def get(self, key):
+        return self._records.get(key)
+
+class SQLiteIdempotencyStore(object):
+    """
+    Store backed by an SQLite database file. Can be shared by several
+    processes on one machine, e.g. for local testing.
+    """
+
+    def __init__(self, path, in_progress_timeout=DEFAULT_IN_PROGRESS_TIMEOUT):
+        self.path = path
+        self.in_progress_timeout = in_progress_timeout
+        self._local = threading.local()
+        with self._transaction() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency ("
+                "key TEXT PRIMARY KEY, status TEXT NOT NULL, response TEXT, updated REAL NOT NULL)"
+            )
+
+    def begin(self, key):
+        """
+        Mark `key` as in progress and return None, or return the existing
+        record if `key` has been seen before.
+        """
+
+        with self._transaction() as cursor:
+            record = self._get(cursor, key)
+            if record is not None and not _expired(record, self.in_progress_timeout):
+                return record
+            cursor.execute(
+                "INSERT OR REPLACE INTO idempotency (key, status, response, updated) VALUES (?, ?, NULL, ?)",
+                (_serialize_key(key), IN_PROGRESS, time.time())
+            )
+            return None
+
+    def complete(self, key, response):
+        """
+        Mark `key` as completed, with the response sent.
+        """
+
+        with self._transaction() as cursor:
+            cursor.execute(
+                "INSERT OR REPLACE INTO idempotency (key, status, response, updated) VALUES (?, ?, ?, ?)",
+                (_serialize_key(key), COMPLETED, json.dumps(response), time.time())
+            )
+
+    def release(self, key):
+        """
+        Forget an in-progress `key`, so the request can be retried.
+        """
+
+        with self._transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM idempotency WHERE key = ? AND status = ?", (_serialize_key(key), IN_PROGRESS)
+            )
+
+    def get(self, key):
+        with self._transaction() as cursor:
+            return self._get(cursor, key)
+
+    def _get(self, cursor, key):
+        cursor.execute(
+            "SELECT status, response, updated FROM idempotency WHERE key = ?",
+            (_serialize_key(key),)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        status, response, updated = row
+        return IdempotencyRecord(status, json.loads(response) if response is not None else None, updated)
+
+    def _transaction(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Imported here, so only SQLite users pay for it at cold start.
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.connection = connection
+        return _Transaction(connection)
+
+class _Transaction(object):
+    """
+    Exclusive-write transaction, so concurrent `begin` calls can't both
+    claim the same key.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        return self.cursor
+
+    def __exit__(self, type, exc, tb):
+        self.cursor.execute("ROLLBACK" if exc else "COMMIT")
+        self.cursor.close()
+
+def _expired(record, in_progress_timeout):
+    return record.status == IN_PROGRESS and time.time() - record.updated > in_progress_timeout
+
+def _serialize_key(key):
+    return json.dumps(list(key))
@@ -0,0 +1,203 @@
+"""
+Timing and metric hooks for handlers and responders.
+
+Register observers on a handler to see where an invocation's time goes:
+
+    class Handler(BaseHandler):
+        OBSERVERS = [EmbeddedMetricsObserver(namespace="MyResources")]
+
+Observers receive:
+    * Timings, in seconds: "Validation", "Dispatch", "Coercion",
+      "Serialization", "Upload" and "Request" (the whole request), plus
+      "Init<Name>" when a `BaseHandler.RESOURCES` dependency is created.
+    * Counts: "UploadAttempts", "UploadRetries" and "PayloadBytes", plus
+      "ResultCacheHits" (1 or 0) when `BaseHandler.RESULT_CACHE` is set,
+      and "ProfilesKept" when `BaseHandler.PROFILER` keeps a profile.
+    * `request_finished` once the handler has finished with a request.
+
+Every call includes the request's event, so observers can tell concurrent
+requests apart - see `request_key`. With no observers registered,
+instrumentation costs a truth test per hook.
+"""
+
+import collections
+import json
+import sys
+import threading
+import time
+
+def request_key(event):
+    """
+    Key identifying the request an event belongs to, for observers keeping
+    per-request state. Stable across copies of the event.
+    """
+
+    return (event.get("StackId"), event.get("LogicalResourceId"), event.get("RequestId"))
+
+class Observer(object):
+    """
+    Base class for observers. Override the methods you're interested in.
+    """
+
+    def timing(self, name, seconds, event):
+        pass
+
+    def count(self, name, value, event):
+        pass
+
+    def request_finished(self, event):
+        pass
+
+class Instrumentation(object):
+    """
+    Forwards timings and counts to a list of observers.
+    """
+
+    def __init__(self, observers=()):
+        self.observers = tuple(observers)
+
+    def __nonzero__(self):
+        return bool(self.observers)
+
+    def timer(self, name, event):
+        """
+        Context manager timing its body.
+        """
+
+        if not self.observers:
+            return _NULL_TIMER
+        return _Timer(self, name, event)
+
+    def timing(self, name, seconds, event):
+        for observer in self.observers:
+            observer.timing(name, seconds, event)
+
+    def count(self, name, value, event):
+        for observer in self.observers:
+            observer.count(name, value, event)
+
+    def request_finished(self, event):
+        for observer in self.observers:
+            observer.request_finished(event)
+
+class _Timer(object):
+    def __init__(self, instrumentation, name, event):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.event = event
+
+    def __enter__(self):
+        self.started = time.time()
+
+    def __exit__(self, type, exc, tb):
+        self.instrumentation.timing(self.name, time.time() - self.started, self.event)
+
+class _NullTimer(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, exc, tb):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+class InMemoryCollector(Observer):
+    """
+    Collects timings and counts in memory, for tests.
+
+    Attributes:
+        * `timings`: dict of name -> list of seconds.
+        * `counts`: dict of name -> list of values.
+        * `finished`: list of finished events.
+    """
+
+    def __init__(self):
+        self.timings = collections.defaultdict(list)
+        self.counts = collections.defaultdict(list)
+        self.finished = []
+        self._lock = threading.Lock()
+
+    def timing(self, name, seconds, event):
+        with self._lock:
+            self.timings[name].append(seconds)
+
+    def count(self, name, value, event):
+        with self._lock:
+            self.counts[name].append(value)
+
+    def request_finished(self, event):
+        with self._lock:
+            self.finished.append(event)
+
+class EmbeddedMetricsObserver(Observer):
+    """
+    Writes one CloudWatch Embedded Metric Format log line per request.
+    CloudWatch Logs turns these into metrics without any API calls.
+
+    Timings are reported in milliseconds as "<Name>Time", e.g "UploadTime".
+
+    See <https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html>
+    """
+
+    UNITS = {
+        "UploadAttempts": "Count",
+        "UploadRetries": "Count",
+        "PayloadBytes": "Bytes"
+    }
+
+    def __init__(self, namespace="CustomResource", dimensions=("ResourceType", "RequestType"), stream=None):
+        """
+        Arguments:
+            * `namespace`: CloudWatch metric namespace.
+            * `dimensions`: event keys to use as metric dimensions.
+            * `stream`: file to write to. Defaults to stdout, which Lambda
+              sends to CloudWatch Logs.
+        """
+
+        self.namespace = namespace
+        self.dimensions = tuple(dimensions)
+        self.stream = stream
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def timing(self, name, seconds, event):
+        self._add(event, name + "Time", seconds * 1000, "Milliseconds")
+
+    def count(self, name, value, event):
+        self._add(event, name, value, self.UNITS.get(name, "None"))
+
+    def request_finished(self, event):
+        with self._lock:
+            metrics = self._metrics.pop(request_key(event), None)
+        if not metrics:
+            return
+
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [list(self.dimensions)],
+                    "Metrics": [
+                        {"Name": name, "Unit": unit}
+                        for name, (value, unit) in sorted(metrics.iteritems())
+                    ]
+                }]
+            },
+            "RequestId": event.get("RequestId"),
+            "LogicalResourceId": event.get("LogicalResourceId")
+        }
+        for dimension in self.dimensions:
+            document[dimension] = event.get(dimension, "Unknown")
+        for name, (value, unit) in metrics.iteritems():
+            document[name] = value
+
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(json.dumps(document, sort_keys=True) + "\n")
+
+    def _add(self, event, name, value, unit):
+        with self._lock:
+            metrics = self._metrics.setdefault(request_key(event), {})
+            if name in metrics:
+                value += metrics[name][0]
+            metrics[name] = (value, unit)
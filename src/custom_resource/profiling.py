@@ -0,0 +1,248 @@
+"""
+Sampled profiling of slow or memory-hungry invocations.
+
+With `BaseHandler.PROFILER` set, a `sample_rate` fraction of invocations run
+`dispatch` and the response upload under `cProfile`. Profiles are kept only
+when the invocation took at least `latency_threshold` seconds, or grew memory
+by at least `memory_threshold` bytes - the rest are discarded. Invocations
+that aren't sampled only pay for a `random.random()` call.
+
+Kept profiles are written as a JSON line, which Lambda sends to CloudWatch
+Logs:
+
+    {"Profile": {"RequestId": "...", "LogicalResourceId": "...",
+     "DurationMs": 1234.5, "MemoryBytes": 2097152, "Stats": "...",
+     "TopAllocations": [...]}}
+
+`Stats` is the `pstats` report of the `top` functions by cumulative time.
+Give a `directory` to also save each profile as a `.pstats` file, for
+`python -m pstats` or other viewers.
+
+Memory is measured with `tracemalloc` where it's importable - on Python 3,
+or with the pytracemalloc backport - which also gives `TopAllocations`.
+Otherwise it's the growth in the process's peak resident set size, and
+`TopAllocations` is empty. Both are process-wide, so concurrent invocations
+(e.g several records of an SNS batch) share their memory measurements.
+"""
+
+import cProfile
+import errno
+import json
+import os
+import pstats
+import random
+import StringIO
+import sys
+import threading
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class Profiler(object):
+    """
+    Decides which invocations to profile, and which profiles to keep.
+    """
+
+    def __init__(self, sample_rate=0.01, latency_threshold=None, memory_threshold=None, top=25, stream=None, directory=None):
+        """
+        Arguments:
+            * `sample_rate`: fraction of invocations profiled, from 0 to 1.
+            * `latency_threshold`: keep profiles of invocations taking at
+              least this many seconds.
+            * `memory_threshold`: keep profiles of invocations growing
+              memory by at least this many bytes.
+            * `top`: number of functions and allocations reported.
+            * `stream`: file object profiles are written to. Defaults to
+              stdout.
+            * `directory`: optional directory to also save `.pstats` files
+              in.
+
+        With neither threshold set, every sampled profile is kept.
+        """
+
+        self.sample_rate = sample_rate
+        self.latency_threshold = latency_threshold
+        self.memory_threshold = memory_threshold
+        self.top = top
+        self.stream = stream
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Number of captures using tracemalloc, which is process-wide.
+        self._tracing = 0
+        self._owns_tracing = False
+
+    def start(self, event):
+        """
+        Return a `Capture` for `event` if it's sampled, else None.
+        """
+
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        return Capture(self, event)
+
+    def should_keep(self, seconds, memory_bytes):
+        """
+        Whether a profile is kept, given the invocation's duration and
+        memory growth.
+        """
+
+        if self.latency_threshold is None and self.memory_threshold is None:
+            return True
+        if self.latency_threshold is not None and seconds >= self.latency_threshold:
+            return True
+        return self.memory_threshold is not None and memory_bytes is not None and memory_bytes >= self.memory_threshold
+
+    def emit(self, report, stats):
+        """
+        Write a kept profile. `report` is the JSON-serializable summary, and
+        `stats` the `pstats.Stats`.
+        """
+
+        if self.directory is not None:
+            try:
+                os.makedirs(self.directory)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+            path = os.path.join(self.directory, "{}.pstats".format(report["RequestId"]))
+            stats.dump_stats(path)
+            report["Path"] = path
+
+        line = json.dumps({"Profile": report}, sort_keys=True) + "\n"
+        with self._lock:
+            stream = self.stream if self.stream is not None else sys.stdout
+            stream.write(line)
+            stream.flush()
+
+    def _start_tracing(self):
+        if tracemalloc is None:
+            return
+        with self._lock:
+            if self._tracing == 0:
+                # Leave tracing alone if something else started it.
+                self._owns_tracing = not tracemalloc.is_tracing()
+                if self._owns_tracing:
+                    tracemalloc.start()
+            self._tracing += 1
+
+    def _stop_tracing(self):
+        if tracemalloc is None:
+            return
+        with self._lock:
+            self._tracing -= 1
+            if self._tracing == 0 and self._owns_tracing:
+                tracemalloc.stop()
+
+class Capture(object):
+    """
+    Profile of a single sampled invocation. Functions run through `call` are
+    profiled, in whichever thread calls them; `finish` decides whether to
+    keep the profile.
+    """
+
+    def __init__(self, profiler, event):
+        self.profiler = profiler
+        self.event = event
+        self._profiles = []
+        self._lock = threading.Lock()
+        profiler._start_tracing()
+        self._memory_before = _current_memory()
+        self._started = time.time()
+
+    def wrap(self, function):
+        """
+        Return `function` wrapped to run under `call`.
+        """
+
+        def profiled(*args, **kwargs):
+            return self.call(function, *args, **kwargs)
+        return profiled
+
+    def call(self, function, *args, **kwargs):
+        """
+        Call `function` under cProfile.
+        """
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._profiles.append(profile)
+
+    def finish(self):
+        """
+        Emit the profile if the invocation crossed a threshold. Returns True
+        if it was emitted.
+        """
+
+        seconds = time.time() - self._started
+        memory_bytes = _memory_growth(self._memory_before)
+        try:
+            if not self.profiler.should_keep(seconds, memory_bytes):
+                return False
+            with self._lock:
+                profiles = list(self._profiles)
+            if not profiles:
+                return False
+
+            stats = pstats.Stats(profiles[0], stream=StringIO.StringIO())
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats("cumulative").print_stats(self.profiler.top)
+
+            report = {
+                "RequestId": self.event.get("RequestId"),
+                "LogicalResourceId": self.event.get("LogicalResourceId"),
+                "RequestType": self.event.get("RequestType"),
+                "DurationMs": seconds * 1000,
+                "MemoryBytes": memory_bytes,
+                "Stats": stats.stream.getvalue(),
+                "TopAllocations": _top_allocations(self.profiler.top)
+            }
+            self.profiler.emit(report, stats)
+            return True
+        finally:
+            self.profiler._stop_tracing()
+
+def _current_memory():
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+    if resource is not None:
+        return _peak_rss()
+    return None
+
+def _memory_growth(before):
+    """
+    Bytes of memory growth since `before`, or None if unknown.
+    """
+
+    if before is None:
+        return None
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return max(0, tracemalloc.get_traced_memory()[1] - before)
+    return max(0, _peak_rss() - before)
+
+def _peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _top_allocations(limit):
+    if tracemalloc is None or not tracemalloc.is_tracing():
+        return []
+    statistics = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+    return [
+        {"Location": str(statistic.traceback), "Bytes": statistic.size, "Count": statistic.count}
+        for statistic in statistics
+    ]
@@ -0,0 +1,297 @@
+"""
+Rate limiting and circuit breaking for calls to downstream APIs.
+
+A stack creating hundreds of resources of one type invokes many handlers at
+once, which can overwhelm the API behind them. Rather than failing - and
+rolling back the stack - on throttling errors, call the API through
+`BaseHandler.guarded_call`:
+
+    class Handler(BaseHandler):
+        RATE_LIMITER = TokenBucket("records-api", rate=10, burst=20)
+        CIRCUIT_BREAKER = CircuitBreaker("records-api")
+
+        def create(self, event, context):
+            record = self.guarded_call(context, api.create_record, name)
+
+`TokenBucket` smooths calls to `rate` per second. `CircuitBreaker` pauses
+calls for `reset_timeout` seconds after `failure_threshold` throttling errors
+in a row, then lets a single trial call through.
+
+State lives in a backend. `MemoryBackend` (the default) is per container;
+`SQLiteBackend` shares state between processes using one database file.
+Other backends implement `transact`.
+"""
+
+import json
+import threading
+import time
+
+class ThrottledError(Exception):
+    """
+    Raise from a downstream call to report throttling, if the API's own
+    exceptions aren't recognised by `is_throttling_error`.
+    """
+
+class RateLimitTimeout(Exception):
+    """
+    No call could be made before the deadline.
+    """
+
+class CircuitOpenError(RateLimitTimeout):
+    """
+    The circuit breaker stayed open until the deadline.
+    """
+
+# Error codes used by AWS services for throttling.
+THROTTLING_ERROR_CODES = frozenset([
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "ProvisionedThroughputExceededException",
+    "SlowDown"
+])
+
+def is_throttling_error(exc):
+    """
+    True for `ThrottledError`, and for botocore `ClientError`s with a
+    throttling error code.
+    """
+
+    if isinstance(exc, ThrottledError):
+        return True
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+    return False
+
+class MemoryBackend(object):
+    """
+    Keeps state in memory, shared by every handler in the process.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def transact(self, key, function):
+        """
+        Atomically replace the state for `key`. `function` is called with the
+        current state (None at first) and returns (new state, result).
+        Returns the result.
+        """
+
+        with self._lock:
+            state, result = function(self._states.get(key))
+            self._states[key] = state
+            return result
+
+class SQLiteBackend(object):
+    """
+    Keeps state in an SQLite database file, shared by every process using
+    the same `path` - e.g. a local stand-in for a shared store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("CREATE TABLE IF NOT EXISTS ratelimit (key TEXT PRIMARY KEY, state TEXT NOT NULL)")
+
+    def transact(self, key, function):
+        """
+        Atomically replace the state for `key`. `function` is called with the
+        current state (None at first) and returns (new state, result).
+        Returns the result.
+        """
+
+        cursor = self._connection().cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT state FROM ratelimit WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            state, result = function(json.loads(row[0]) if row is not None else None)
+            cursor.execute("INSERT OR REPLACE INTO ratelimit (key, state) VALUES (?, ?)", (key, json.dumps(state)))
+        except:
+            cursor.execute("ROLLBACK")
+            raise
+        else:
+            cursor.execute("COMMIT")
+        finally:
+            cursor.close()
+        return result
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Imported here, so only SQLite users pay for it at cold start.
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+_default_backend = MemoryBackend()
+
+class TokenBucket(object):
+    """
+    Allows `rate` calls per second on average, and bursts of up to `burst`.
+    """
+
+    def __init__(self, name, rate, burst=None, backend=None):
+        """
+        Arguments:
+            * `name`: identifies the bucket in the backend. Buckets with the
+              same name share tokens.
+            * `rate`: tokens added per second.
+            * `burst`: maximum number of tokens. Defaults to `rate`.
+            * `backend`: state backend. Defaults to a process-wide
+              `MemoryBackend`.
+        """
+
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.backend = backend if backend is not None else _default_backend
+
+    def try_acquire(self):
+        """
+        Take a token if one is available. Returns the seconds to wait before
+        trying again, or 0 if a token was taken.
+        """
+
+        def take(state):
+            now = time.time()
+            if state is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, state["tokens"] + (now - state["updated"]) * self.rate)
+            if tokens >= 1:
+                return {"tokens": tokens - 1, "updated": now}, 0
+            return {"tokens": tokens, "updated": now}, (1 - tokens) / self.rate
+
+        return self.backend.transact("bucket:" + self.name, take)
+
+    def acquire(self, deadline=None):
+        """
+        Wait for a token. Raises `RateLimitTimeout` if none is available
+        before `deadline` (a `time.time()` value).
+        """
+
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            if deadline is not None and time.time() + wait > deadline:
+                raise RateLimitTimeout("Rate limit {!r} exceeded".format(self.name))
+            time.sleep(wait)
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+class CircuitBreaker(object):
+    """
+    Stops calls for `reset_timeout` seconds after `failure_threshold`
+    consecutive failures. Then lets one trial call through: success closes the
+    circuit, failure opens it again. A trial call that doesn't record an
+    outcome within `reset_timeout` seconds is abandoned, and another caller
+    gets to make one.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=10, backend=None):
+        """
+        Arguments:
+            * `name`: identifies the circuit in the backend.
+            * `failure_threshold`: consecutive failures opening the circuit.
+            * `reset_timeout`: seconds to stay open before a trial call.
+            * `backend`: state backend. Defaults to a process-wide
+              `MemoryBackend`.
+        """
+
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.backend = backend if backend is not None else _default_backend
+
+    @property
+    def state(self):
+        return self._transact(lambda state: (state, state["status"]))
+
+    def try_acquire(self):
+        """
+        Returns the seconds to wait before a call may be made, or 0 if it may
+        be made now.
+        """
+
+        return self._try_acquire()[0]
+
+    def acquire(self, deadline=None):
+        """
+        Wait for the circuit to allow a call. Raises `CircuitOpenError` if it
+        doesn't before `deadline` (a `time.time()` value). Returns True if the
+        call is the trial call of a half-open circuit - record its outcome, or
+        `release` it if it isn't made.
+        """
+
+        while True:
+            wait, trial = self._try_acquire()
+            if not wait:
+                return trial
+            if deadline is not None and time.time() + wait > deadline:
+                raise CircuitOpenError("Circuit {!r} is open".format(self.name))
+            time.sleep(wait)
+
+    def release(self):
+        """
+        Give up a trial call without making it, letting the next caller
+        make it instead.
+        """
+
+        def release(state):
+            if state["status"] != HALF_OPEN:
+                return state, None
+            # Open, with the reset timeout already passed.
+            return dict(state, status=OPEN, opened=time.time() - self.reset_timeout), None
+
+        self._transact(release)
+
+    def _try_acquire(self):
+        """
+        Returns (seconds to wait, whether this is the trial call).
+        """
+
+        def acquire(state):
+            now = time.time()
+            if state["status"] == CLOSED:
+                return state, (0, False)
+            retry_at = state["opened"] + self.reset_timeout
+            if now >= retry_at:
+                # Open long enough, or the last trial call never recorded its
+                # outcome: let this caller make the trial call.
+                return dict(state, status=HALF_OPEN, opened=now), (0, True)
+            # Wait for the trial call to finish, or the circuit to time out.
+            return state, (max(retry_at - now, 0.01), False)
+
+        return self._transact(acquire)
+
+    def record_success(self):
+        self._transact(lambda state: ({"status": CLOSED, "failures": 0, "opened": None}, None))
+
+    def record_failure(self):
+        def fail(state):
+            failures = state["failures"] + 1
+            if state["status"] == HALF_OPEN or failures >= self.failure_threshold:
+                return {"status": OPEN, "failures": failures, "opened": time.time()}, None
+            return dict(state, failures=failures), None
+
+        self._transact(fail)
+
+    def _transact(self, function):
+        def transact(state):
+            if state is None:
+                state = {"status": CLOSED, "failures": 0, "opened": None}
+            return function(state)
+
+        return self.backend.transact("circuit:" + self.name, transact)
@@ -0,0 +1,167 @@
+"""
+Recording of production requests, for replay against new handler versions.
+
+`JSONLinesRecorder` writes one JSON line per request handled:
+
+    {"event": {...}, "response": {...}, "timings_ms": {"Request": 12.3, ...},
+     "counts": {"PayloadBytes": 345, ...}, "recorded_at": 1500000000.0,
+     "redaction": {"keep_data": [...], "keep_reason": false}}
+
+`event` has its ResponseURL - a presigned URL - removed, and resource
+property values redacted. Redaction keeps the properties' structure and
+string lengths, so replays see realistically shaped requests. Top-level
+properties named in `keep_properties` are recorded verbatim - keep those
+needed for replays to behave like the original requests. Masked values fail
+schema checks such as `pattern` or `enum`, so keep properties the schema
+constrains, or expect replays to fail validation.
+
+`response` is the response sent to CloudFormation, or null if it was
+deferred. Its Data values are redacted the same way, except for top-level
+attributes in `keep_data`, as is its Reason unless `keep_reason` is set.
+See `custom_resource.replay` to replay recordings.
+"""
+
+import json
+import sys
+import threading
+import time
+
+from .instrumentation import Observer, request_key
+
+REDACTED_KEYS = ("ResourceProperties", "OldResourceProperties")
+REMOVED_KEYS = ("ResponseURL",)
+
+def redact_event(event, keep_properties=()):
+    """
+    Return a copy of `event` with ResponseURL removed, and property values
+    redacted except for top-level properties in `keep_properties`.
+    """
+
+    redacted = {key: value for key, value in event.iteritems() if key not in REMOVED_KEYS}
+    for key in REDACTED_KEYS:
+        if key in redacted:
+            redacted[key] = _redact_mapping(redacted[key], keep_properties)
+    return redacted
+
+def redact_response(response, keep_data=(), keep_reason=False):
+    """
+    Return a copy of a response dict with Data values redacted except for
+    top-level attributes in `keep_data`, and Reason redacted unless
+    `keep_reason`. None is returned as is.
+    """
+
+    if response is None:
+        return None
+    redacted = dict(response)
+    if "Data" in redacted:
+        redacted["Data"] = _redact_mapping(redacted["Data"], keep_data)
+    if "Reason" in redacted and not keep_reason:
+        redacted["Reason"] = _redact_value(redacted["Reason"])
+    return redacted
+
+def _redact_mapping(mapping, keep):
+    return {name: value if name in keep else _redact_value(value) for name, value in mapping.iteritems()}
+
+def _redact_value(value):
+    if isinstance(value, basestring):
+        return "*" * len(value)
+    if isinstance(value, dict):
+        return {key: _redact_value(item) for key, item in value.iteritems()}
+    if isinstance(value, list):
+        return [_redact_value(item) for item in value]
+    return value
+
+class JSONLinesRecorder(Observer):
+    """
+    Writes each request as a JSON line.
+    """
+
+    def __init__(self, path=None, stream=None, keep_properties=("ServiceToken",), keep_data=(), keep_reason=False):
+        """
+        Arguments:
+            * `path`: file to append to.
+            * `stream`: file object to write to instead of `path`. Defaults
+              to stdout, which Lambda sends to CloudWatch Logs.
+            * `keep_properties`: top-level property names recorded without
+              redaction.
+            * `keep_data`: top-level response Data attributes recorded
+              without redaction.
+            * `keep_reason`: record response Reasons without redaction.
+        """
+
+        self.path = path
+        self.stream = stream
+        self.keep_properties = frozenset(keep_properties)
+        self.keep_data = frozenset(keep_data)
+        self.keep_reason = keep_reason
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def timing(self, name, seconds, event):
+        with self._lock:
+            timings = self._get_record(event)["timings_ms"]
+            timings[name] = timings.get(name, 0) + seconds * 1000
+
+    def count(self, name, value, event):
+        with self._lock:
+            counts = self._get_record(event)["counts"]
+            counts[name] = counts.get(name, 0) + value
+
+    def record_response(self, event, response):
+        """
+        Called by `BaseHandler` with the response sent for `event`, or None if
+        no response was sent.
+        """
+
+        as_dict = getattr(response, "as_dict", None)
+        if as_dict is not None:
+            response = redact_response(as_dict(), self.keep_data, self.keep_reason)
+        else:
+            response = None
+        with self._lock:
+            self._get_record(event)["response"] = response
+
+    def request_finished(self, event):
+        with self._lock:
+            record = self._records.pop(request_key(event), None)
+        if record is None:
+            return
+
+        record["event"] = redact_event(event, self.keep_properties)
+        record["recorded_at"] = time.time()
+        record["redaction"] = {"keep_data": sorted(self.keep_data), "keep_reason": self.keep_reason}
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with self._lock:
+            if self.path is not None:
+                with open(self.path, "a") as f:
+                    f.write(line)
+            else:
+                stream = self.stream if self.stream is not None else sys.stdout
+                stream.write(line)
+                stream.flush()
+
+    def _get_record(self, event):
+        record = self._records.get(request_key(event))
+        if record is None:
+            record = self._records[request_key(event)] = {"timings_ms": {}, "counts": {}, "response": None}
+        return record
+
+def read_recordings(path):
+    """
+    Read the records written by `JSONLinesRecorder`. Lines that aren't
+    recordings - e.g other log output - are skipped.
+    """
+
+    recordings = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("{"):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "event" in record and "timings_ms" in record:
+                recordings.append(record)
+    return recordings
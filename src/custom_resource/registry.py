@@ -0,0 +1,162 @@
+"""
+Per-container registry of expensive dependencies - SDK clients, database
+connections, HTTP sessions.
+
+Creating these at import time or in `__init__` adds to every cold start,
+even for requests that never use them (e.g. Deletes answered straight
+away). Declare them on the handler instead, and each is created the first
+time it's used, then reused by warm invocations:
+
+    def create_s3_client():
+        import boto3
+        return boto3.client("s3")
+
+    class Handler(BaseHandler):
+        RESOURCES = {
+            "S3": create_s3_client,
+            "Database": Resource(connect, health_check=ping, invalidate_on=(DatabaseError,))
+        }
+
+        def create(self, event, context):
+            self.resources["S3"].put_object(...)
+            with self.resources.using("Database") as connection:
+                ...
+
+Each dependency's creation time is reported to the handler's observers as
+an "Init<Name>" timing, e.g "InitS3".
+"""
+
+import threading
+import time
+
+class Resource(object):
+    """
+    Declares how to create, and check the health of, a dependency.
+    """
+
+    def __init__(self, factory, health_check=None, health_check_interval=60, invalidate_on=()):
+        """
+        Arguments:
+            * `factory`: function returning a new instance.
+            * `health_check`: optional function taking the instance, returning
+              False or raising an exception if it's broken. Broken instances
+              are replaced.
+            * `health_check_interval`: minimum seconds between health checks.
+            * `invalidate_on`: exception types which, raised inside
+              `Registry.using`, mean the instance is broken.
+        """
+
+        self.factory = factory
+        self.health_check = health_check
+        self.health_check_interval = health_check_interval
+        self.invalidate_on = tuple(invalidate_on)
+
+class Registry(object):
+    """
+    Lazily creates and caches dependencies declared as `Resource` objects or
+    plain factory functions.
+    """
+
+    def __init__(self, resources=None):
+        self._resources = {}
+        self._instances = {}
+        self._checked = {}
+        self._locks = {}
+        self._init_timings = []
+        self._lock = threading.Lock()
+        for name, resource in (resources or {}).iteritems():
+            self.register(name, resource)
+
+    def register(self, name, resource):
+        """
+        Declare a dependency, replacing any existing one with the same name.
+        """
+
+        if not isinstance(resource, Resource):
+            resource = Resource(resource)
+        with self._lock:
+            self._resources[name] = resource
+            self._locks.setdefault(name, threading.Lock())
+        self.invalidate(name)
+
+    def get(self, name):
+        """
+        Return the instance for `name`, creating it on first use or if its
+        health check fails. Raises KeyError for unknown names.
+        """
+
+        resource = self._resources[name]
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None and not self._is_healthy(name, resource, instance):
+                instance = None
+            if instance is None:
+                instance = self._create(name, resource)
+            return instance
+
+    __getitem__ = get
+
+    def using(self, name):
+        """
+        Context manager yielding the instance for `name`. The instance is
+        invalidated if the body raises one of its `invalidate_on` exceptions.
+        """
+
+        return _Using(self, name)
+
+    def invalidate(self, name):
+        """
+        Discard the instance for `name`, so the next `get` creates a new one.
+        """
+
+        with self._locks[name]:
+            self._instances.pop(name, None)
+            self._checked.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._resources
+
+    def pop_init_timings(self):
+        """
+        Return and forget (name, seconds) pairs for instances created since
+        the last call.
+        """
+
+        with self._lock:
+            timings, self._init_timings = self._init_timings, []
+        return timings
+
+    def _create(self, name, resource):
+        started = time.time()
+        instance = resource.factory()
+        finished = time.time()
+        with self._lock:
+            self._init_timings.append((name, finished - started))
+        self._instances[name] = instance
+        self._checked[name] = finished
+        return instance
+
+    def _is_healthy(self, name, resource, instance):
+        if resource.health_check is None:
+            return True
+        now = time.time()
+        if now - self._checked[name] < resource.health_check_interval:
+            return True
+        try:
+            healthy = resource.health_check(instance) is not False
+        except Exception:
+            healthy = False
+        self._checked[name] = now
+        return healthy
+
+class _Using(object):
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        return self.registry.get(self.name)
+
+    def __exit__(self, type, exc, tb):
+        if exc is not None and isinstance(exc, self.registry._resources[self.name].invalidate_on):
+            self.registry.invalidate(self.name)
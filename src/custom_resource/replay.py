@@ -0,0 +1,162 @@
+"""
+Replay recorded requests against a handler, reporting response differences
+and latency regressions.
+
+Recordings come from `custom_resource.recording.JSONLinesRecorder`. Each
+recorded event is sent to the handler - several at once - with its
+ResponseURL pointed at a local `ResponseServer`. The response is compared
+with the recorded one, and the handler's latency with the recorded
+"Request" timing. Replayed responses are redacted as the recorded ones were
+before comparing.
+
+Usage:
+    python -m custom_resource.replay lambda_function.lambda_handler
+        recordings.jsonl [more.jsonl ...] [--path src] [--workers 4]
+        [--threshold 0.2] [--output report.json]
+
+Exits with status 1 if any response differs, or median latency regressed by
+more than `--threshold`.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from .concurrency import map_concurrently
+from .diff import diff_properties
+from .emulator import FakeContext, load_handler
+from .recording import read_recordings, redact_response
+from .testing import ResponseServer, summarize_latencies
+
+def compare_responses(recorded, replayed):
+    """
+    Return a list of human-readable differences between two response dicts,
+    either of which may be None for no response.
+    """
+
+    if recorded is None or replayed is None:
+        if recorded is replayed:
+            return []
+        return ["Response: recorded {}, replayed {}".format(_describe(recorded), _describe(replayed))]
+
+    differences = []
+    for key in "Status", "PhysicalResourceId", "Reason":
+        if recorded.get(key) != replayed.get(key):
+            differences.append("{}: recorded {!r}, replayed {!r}".format(key, recorded.get(key), replayed.get(key)))
+    diff = diff_properties(recorded.get("Data"), replayed.get("Data"))
+    for path in sorted(diff.paths):
+        differences.append("Data.{} differs".format(".".join(path)))
+    return differences
+
+def _describe(response):
+    return response["Status"] if response is not None else "no response"
+
+def replay(handler, recordings, workers=4, timeout=300, server=None):
+    """
+    Replay `recordings` against `handler`, returning a list of result dicts
+    in recording order, with keys "recorded", "replayed" (response dicts or
+    None), "recorded_ms", "replayed_ms", "differences" and "error".
+    """
+
+    server = server if server is not None else ResponseServer()
+
+    def run(item):
+        index, recording = item
+        event = dict(recording["event"], ResponseURL="{}?replay={}".format(server.url, index))
+        error = None
+        started = time.time()
+        try:
+            handler(event, FakeContext(timeout))
+        except Exception as exc:
+            error = repr(exc)
+        return time.time() - started, error
+
+    with server:
+        outcomes = map_concurrently(run, list(enumerate(recordings)), workers, pool_name="replay")
+        responses = {}
+        for path, body in zip(server.paths, server.bodies):
+            index = int(path.rpartition("?replay=")[2])
+            responses[index] = json.loads(body)
+
+    results = []
+    for index, (recording, (outcome, exc_info)) in enumerate(zip(recordings, outcomes)):
+        duration, error = outcome if outcome is not None else (None, repr(exc_info[1]))
+        recorded = recording.get("response")
+        replayed = responses.get(index)
+        if replayed is not None:
+            replayed = {key: value for key, value in replayed.iteritems() if key in ("Status", "PhysicalResourceId", "Reason", "Data")}
+            redaction = recording.get("redaction")
+            if redaction is not None:
+                replayed = redact_response(replayed, redaction["keep_data"], redaction["keep_reason"])
+        results.append({
+            "request_id": recording["event"].get("RequestId"),
+            "recorded": recorded,
+            "replayed": replayed,
+            "recorded_ms": recording["timings_ms"].get("Request"),
+            "replayed_ms": duration * 1000 if duration is not None else None,
+            "differences": compare_responses(recorded, replayed),
+            "error": error
+        })
+    return results
+
+def summarize(results, threshold=0.2):
+    """
+    Summarize replay results. Latency has regressed if the median replayed
+    latency is more than `threshold` (a fraction) above the recorded one.
+    """
+
+    recorded = summarize_latencies([result["recorded_ms"] / 1000.0 for result in results if result["recorded_ms"] is not None])
+    replayed = summarize_latencies([result["replayed_ms"] / 1000.0 for result in results if result["replayed_ms"] is not None])
+    regressed = bool(
+        recorded["count"] and replayed["count"]
+        and replayed["p50_ms"] > recorded["p50_ms"] * (1 + threshold)
+    )
+    return {
+        "requests": len(results),
+        "differing": sum(1 for result in results if result["differences"]),
+        "recorded_latency": recorded,
+        "replayed_latency": replayed,
+        "latency_regressed": regressed
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded custom resource requests against a handler.")
+    parser.add_argument("handler", help="dotted path to the handler, e.g lambda_function.lambda_handler")
+    parser.add_argument("recordings", nargs="+", help="JSON Lines files written by JSONLinesRecorder")
+    parser.add_argument("--path", default=".", help="directory to import the handler from")
+    parser.add_argument("--workers", type=int, default=4, help="number of requests replayed at once")
+    parser.add_argument("--timeout", type=float, default=300, help="function timeout, in seconds")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed median latency increase, as a fraction")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.abspath(args.path))
+    handler = load_handler(args.handler)
+    recordings = []
+    for path in args.recordings:
+        recordings.extend(read_recordings(path))
+
+    results = replay(handler, recordings, workers=args.workers, timeout=args.timeout)
+    summary = summarize(results, args.threshold)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"summary": summary, "results": results}, output, indent=2, sort_keys=True)
+
+    for result in results:
+        for difference in result["differences"]:
+            print("{}: {}".format(result["request_id"], difference))
+    print("{requests} requests replayed, {differing} with different responses".format(**summary))
+    for name in "recorded_latency", "replayed_latency":
+        latency = summary[name]
+        if latency["count"]:
+            print("{}: p50 {p50_ms:.2f}ms, p90 {p90_ms:.2f}ms, p99 {p99_ms:.2f}ms".format(name.replace("_", " "), **latency))
+    if summary["latency_regressed"]:
+        print("Median latency regressed by more than {:.0%}".format(args.threshold))
+    return 1 if summary["differing"] or summary["latency_regressed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
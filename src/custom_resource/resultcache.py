@@ -0,0 +1,186 @@
+"""
+Caches of successful results, for resources that only look things up - e.g
+"find the latest AMI" or "resolve the VPC by tag".
+
+With `BaseHandler.RESULT_CACHE` set, Create and Update requests whose
+resource type and properties (other than ServiceToken) match an earlier
+successful request get the earlier response's Data, without calling
+`create` or `update`. Only Data is cached: Updates keep their own
+PhysicalResourceId, and Creates get a new unique one, so resources never
+share a physical ID. Entries expire after `ttl` seconds.
+
+`MemoryResultCache` keeps the most recent results in the container. Give it
+a persistent `backend` - `FileResultCache` or `SQLiteResultCache` - to share
+results with other containers on the machine, or keep them across cold
+starts when pointed at a mounted file system. The `MemoryResultCache`'s
+`ttl` then applies to the backend too.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .cache import LRUCache
+from .diff import SERVICE_TOKEN
+
+def result_cache_key(event):
+    """
+    Hash of the event's ResourceType and ResourceProperties, ignoring
+    ServiceToken. Independent of property order.
+    """
+
+    properties = {
+        key: value for key, value in event.get("ResourceProperties", {}).iteritems()
+        if key != SERVICE_TOKEN
+    }
+    normalized = json.dumps([event.get("ResourceType"), properties], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized).hexdigest()
+
+def cached_physical_resource_id(event):
+    """
+    PhysicalResourceId for a response built from cached Data: the event's
+    own, or a new unique ID for Creates.
+    """
+
+    physical_resource_id = event.get("PhysicalResourceId")
+    if physical_resource_id is None:
+        physical_resource_id = "{}-{}".format(event["LogicalResourceId"], os.urandom(6).encode("hex"))
+    return physical_resource_id
+
+class MemoryResultCache(object):
+    """
+    In-memory cache of the `max_size` most recently used results, in front
+    of an optional persistent backend.
+    """
+
+    def __init__(self, ttl=300, max_size=1000, backend=None):
+        """
+        Arguments:
+            * `ttl`: seconds before an entry expires, here and in `backend`.
+            * `max_size`: maximum number of entries kept in memory.
+            * `backend`: optional persistent cache, consulted on misses and
+              updated on `set`.
+        """
+
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = LRUCache(max_size)
+
+    def get(self, key):
+        """
+        Return the cached result dict for `key`, or None.
+        """
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, response = entry
+            if expires > time.time():
+                return response
+            self._entries.pop(key)
+
+        if self.backend is not None:
+            entry = self.backend.get_entry(key)
+            if entry is not None:
+                expires, response = entry
+                self._entries.set(key, (min(expires, time.time() + self.ttl), response))
+                return response
+        return None
+
+    def set(self, key, response):
+        self._entries.set(key, (time.time() + self.ttl, response))
+        if self.backend is not None:
+            self.backend.set(key, response, ttl=self.ttl)
+
+class FileResultCache(object):
+    """
+    Persistent cache storing one JSON file per entry, e.g under /tmp.
+    Entries expire `ttl` seconds after they're written, unless `set` is
+    given another.
+    """
+
+    def __init__(self, directory, ttl=300):
+        self.directory = directory
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[1] if entry is not None else None
+
+    def get_entry(self, key):
+        """
+        Return (expiry time, result dict) for `key`, or None.
+        """
+
+        path = os.path.join(self.directory, key + ".json")
+        try:
+            with open(path) as f:
+                expires, response = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if expires <= time.time():
+            return None
+        return expires, response
+
+    def set(self, key, response, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        try:
+            os.makedirs(self.directory)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        path = os.path.join(self.directory, key + ".json")
+        # Write then rename, so readers never see a partial file.
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary_path, "w") as f:
+            json.dump([time.time() + ttl, response], f)
+        os.rename(temporary_path, path)
+
+class SQLiteResultCache(object):
+    """
+    Persistent cache backed by an SQLite database file. Entries expire `ttl`
+    seconds after they're written, unless `set` is given another.
+    """
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, response TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[1] if entry is not None else None
+
+    def get_entry(self, key):
+        """
+        Return (expiry time, result dict) for `key`, or None.
+        """
+
+        row = self._connection().execute(
+            "SELECT expires, response FROM results WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def set(self, key, response, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO results (key, response, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(response), now + ttl)
+        )
+        connection.execute("DELETE FROM results WHERE expires <= ?", (now,))
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Imported here, so only SQLite users pay for it at cold start.
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.connection = connection
+        return connection
@@ -0,0 +1,93 @@
+"""
+Retry policy for uploading responses to CloudFormation.
+
+Uses capped exponential backoff with "full jitter" - each delay is random
+between zero and the exponential cap, which spreads retries from many
+concurrent invocations.
+
+See <https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/>
+"""
+
+import random
+import time
+
+class RetryPolicy(object):
+    """
+    Decides whether, and when, to retry a failed request.
+    """
+
+    def __init__(self, max_attempts=8, base_delay=0.1, max_delay=5.0, deadline_margin=1.0):
+        """
+        Arguments:
+            * `max_attempts`: total number of attempts, including the first.
+            * `base_delay`: cap on the first retry delay, in seconds. Doubles
+              with every attempt.
+            * `max_delay`: maximum delay between attempts, in seconds.
+            * `deadline_margin`: seconds before the Lambda deadline after
+              which no further attempts are started. Attempts are cut short
+              to end half way through it.
+        """
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline_margin = deadline_margin
+
+    def is_retryable_status(self, status_code):
+        """
+        True for throttling and server errors.
+        """
+
+        return status_code == 429 or 500 <= status_code <= 599
+
+    def get_delay(self, attempt_number):
+        """
+        Seconds to wait after the given (1-based) attempt failed.
+        """
+
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt_number - 1))
+        return random.uniform(0, cap)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def get_deadline(self, context):
+        """
+        Return the time after which no attempt should start, or None if
+        `context` can't tell us the remaining execution time.
+        """
+
+        get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+        if get_remaining_time_in_millis is None:
+            return None
+        return time.time() + get_remaining_time_in_millis() / 1000.0 - self.deadline_margin
+
+    def get_attempt_timeout(self, deadline):
+        """
+        Return the seconds an attempt starting now may take, given the
+        deadline from `get_deadline` - or None if there's no deadline. It
+        ends half way through `deadline_margin`, leaving time to report a
+        failed upload before Lambda stops the invocation.
+        """
+
+        if deadline is None:
+            return None
+        return deadline + self.deadline_margin / 2.0 - time.time()
+
+class Attempt(object):
+    """
+    Record of a single request attempt. `status_code` is None if no response
+    was received, in which case `error` holds the exception.
+    """
+
+    def __init__(self, number, started, duration, status_code=None, error=None):
+        self.number = number
+        self.started = started
+        self.duration = duration
+        self.status_code = status_code
+        self.error = error
+
+    def __repr__(self):
+        return "Attempt({!r}, status_code={!r}, error={!r}, duration={:.3f})".format(
+            self.number, self.status_code, self.error, self.duration
+        )
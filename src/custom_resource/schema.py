@@ -0,0 +1,235 @@
+"""
+JSON Schema validation of resource properties.
+
+`SchemaValidator` checks the schema and builds a `jsonschema` validator once,
+so it can be shared across every invocation in a Lambda container.
+
+With `compiled=True` the schema is additionally translated into a plain Python
+function covering the common Draft 4 keywords. The function only answers "is
+this instance valid?" - when it says no, the full `jsonschema` validator is run
+to produce the usual detailed error. Schemas using keywords the compiler
+doesn't understand (e.g. "$ref") fall back to `jsonschema` entirely.
+
+`jsonschema` is imported when the first validator is built, so handlers
+without a schema don't pay for it at cold start.
+"""
+
+import re
+
+# Keywords with no effect on validation.
+_IGNORED_KEYWORDS = frozenset([
+    "$schema", "id", "title", "description", "default", "definitions", "format"
+])
+
+_TYPE_CHECKS = {
+    "array": lambda value: isinstance(value, list),
+    "boolean": lambda value: isinstance(value, bool),
+    "integer": lambda value: isinstance(value, (int, long)) and not isinstance(value, bool),
+    "null": lambda value: value is None,
+    "number": lambda value: isinstance(value, (int, long, float)) and not isinstance(value, bool),
+    "object": lambda value: isinstance(value, dict),
+    "string": lambda value: isinstance(value, basestring)
+}
+
+class SchemaValidator(object):
+    """
+    Validates instances against a Draft 4 JSON schema.
+    """
+
+    def __init__(self, schema, compiled=False):
+        """
+        Arguments:
+            * `schema`: a JSON schema dict. Checked for validity immediately,
+              raising `jsonschema.SchemaError` if invalid.
+            * `compiled`: translate the schema into a specialised Python
+              function for the common case of valid instances.
+        """
+
+        import jsonschema
+
+        jsonschema.Draft4Validator.check_schema(schema)
+        self.schema = schema
+        self._validator = jsonschema.Draft4Validator(schema)
+        self._is_valid = compile_schema(schema) if compiled else None
+
+    @property
+    def compiled(self):
+        return self._is_valid is not None
+
+    def validate(self, instance):
+        """
+        Raise `jsonschema.ValidationError` if `instance` is invalid.
+        """
+
+        if self._is_valid is not None and self._is_valid(instance):
+            return
+        self._validator.validate(instance)
+
+def compile_schema(schema):
+    """
+    Translate a JSON schema into a function returning True for valid
+    instances. Returns None if the schema uses unsupported keywords.
+    """
+
+    try:
+        return _compile(schema)
+    except _Unsupported:
+        return None
+
+class _Unsupported(Exception):
+    pass
+
+def _compile(schema):
+    if not isinstance(schema, dict):
+        raise _Unsupported()
+
+    checks = []
+    for keyword in schema:
+        if keyword in _IGNORED_KEYWORDS:
+            continue
+        compiler = _KEYWORD_COMPILERS.get(keyword)
+        if compiler is None:
+            raise _Unsupported()
+        check = compiler(schema[keyword], schema)
+        if check is not None:
+            checks.append(check)
+
+    if not checks:
+        return lambda value: True
+    if len(checks) == 1:
+        return checks[0]
+
+    checks = tuple(checks)
+    def is_valid(value):
+        for check in checks:
+            if not check(value):
+                return False
+        return True
+    return is_valid
+
+def _compile_type(types, schema):
+    if isinstance(types, basestring):
+        types = [types]
+    try:
+        type_checks = tuple(_TYPE_CHECKS[name] for name in types)
+    except (KeyError, TypeError):
+        raise _Unsupported()
+
+    if len(type_checks) == 1:
+        return type_checks[0]
+    return lambda value: any(type_check(value) for type_check in type_checks)
+
+def _compile_enum(choices, schema):
+    def matches(value, choice):
+        if isinstance(value, bool) or isinstance(choice, bool):
+            return isinstance(value, bool) and isinstance(choice, bool) and value == choice
+        return value == choice
+    return lambda value: any(matches(value, choice) for choice in choices)
+
+def _compile_required(names, schema):
+    names = tuple(names)
+    return lambda value: not isinstance(value, dict) or all(name in value for name in names)
+
+def _compile_properties(properties, schema):
+    property_checks = tuple(
+        (name, _compile(subschema))
+        for name, subschema in properties.iteritems()
+    )
+    def is_valid(value):
+        if not isinstance(value, dict):
+            return True
+        for name, check in property_checks:
+            if name in value and not check(value[name]):
+                return False
+        return True
+    return is_valid
+
+def _compile_additional_properties(additional, schema):
+    known = frozenset(schema.get("properties", {}))
+    if additional is True:
+        return None
+    if additional is False:
+        return lambda value: not isinstance(value, dict) or all(name in known for name in value)
+
+    check = _compile(additional)
+    def is_valid(value):
+        if not isinstance(value, dict):
+            return True
+        for name, item in value.iteritems():
+            if name not in known and not check(item):
+                return False
+        return True
+    return is_valid
+
+def _compile_items(items, schema):
+    if not isinstance(items, dict):
+        # Tuple validation needs "additionalItems" support.
+        raise _Unsupported()
+    check = _compile(items)
+    return lambda value: not isinstance(value, list) or all(check(item) for item in value)
+
+def _compile_size(type_name, compare):
+    type_check = _TYPE_CHECKS[type_name]
+    def compiler(limit, schema):
+        return lambda value: not type_check(value) or compare(len(value), limit)
+    return compiler
+
+def _compile_pattern(pattern, schema):
+    regex = re.compile(pattern)
+    return lambda value: not isinstance(value, basestring) or regex.search(value) is not None
+
+def _compile_minimum(minimum, schema):
+    is_number = _TYPE_CHECKS["number"]
+    if schema.get("exclusiveMinimum", False):
+        return lambda value: not is_number(value) or value > minimum
+    return lambda value: not is_number(value) or value >= minimum
+
+def _compile_maximum(maximum, schema):
+    is_number = _TYPE_CHECKS["number"]
+    if schema.get("exclusiveMaximum", False):
+        return lambda value: not is_number(value) or value < maximum
+    return lambda value: not is_number(value) or value <= maximum
+
+def _compile_exclusive_bound(exclusive, schema):
+    # Handled by "minimum" and "maximum".
+    return None
+
+def _compile_all_of(subschemas, schema):
+    checks = tuple(_compile(subschema) for subschema in subschemas)
+    return lambda value: all(check(value) for check in checks)
+
+def _compile_any_of(subschemas, schema):
+    checks = tuple(_compile(subschema) for subschema in subschemas)
+    return lambda value: any(check(value) for check in checks)
+
+def _compile_one_of(subschemas, schema):
+    checks = tuple(_compile(subschema) for subschema in subschemas)
+    return lambda value: sum(1 for check in checks if check(value)) == 1
+
+def _compile_not(subschema, schema):
+    check = _compile(subschema)
+    return lambda value: not check(value)
+
+_KEYWORD_COMPILERS = {
+    "type": _compile_type,
+    "enum": _compile_enum,
+    "required": _compile_required,
+    "properties": _compile_properties,
+    "additionalProperties": _compile_additional_properties,
+    "items": _compile_items,
+    "minItems": _compile_size("array", lambda size, limit: size >= limit),
+    "maxItems": _compile_size("array", lambda size, limit: size <= limit),
+    "minLength": _compile_size("string", lambda size, limit: size >= limit),
+    "maxLength": _compile_size("string", lambda size, limit: size <= limit),
+    "minProperties": _compile_size("object", lambda size, limit: size >= limit),
+    "maxProperties": _compile_size("object", lambda size, limit: size <= limit),
+    "pattern": _compile_pattern,
+    "minimum": _compile_minimum,
+    "maximum": _compile_maximum,
+    "exclusiveMinimum": _compile_exclusive_bound,
+    "exclusiveMaximum": _compile_exclusive_bound,
+    "allOf": _compile_all_of,
+    "anyOf": _compile_any_of,
+    "oneOf": _compile_one_of,
+    "not": _compile_not
+}
@@ -0,0 +1,232 @@
+"""
+Per-resource state stores, so `update` and `delete` know what `create` made
+without a describe call.
+
+With `BaseHandler.STATE_STORE` set, every `Success` response for a Create or
+Update is persisted - its Data, plus any private state passed as
+`Success(physical_resource_id, data, state=...)`. State must be JSON
+serializable, and isn't sent to CloudFormation. Records are keyed by
+(StackId, LogicalResourceId, PhysicalResourceId), and removed after a
+successful Delete.
+
+`update` and `delete` find the stored record under `STATE_KEY` in their
+event, loaded from the store when first read:
+
+    def delete(self, event, context):
+        stored = event[STATE_KEY]
+        if stored:
+            delete_volume(stored.state["VolumeId"])
+
+Records are written before the response is uploaded, as CloudFormation may
+send the resource's next request to another container as soon as it has the
+response. Wrap a store in `WriteBehindStateStore` to write in a background
+thread while the response is serialized - and its Data offloaded, with
+`OVERSIZE_OFFLOAD`.
+"""
+
+import collections
+import json
+import sys
+import threading
+import time
+
+from .cache import LRUCache
+
+# Event key holding the `StoredState` passed to update and delete.
+STATE_KEY = "CustomResourceState"
+
+StateRecord = collections.namedtuple("StateRecord", ["data", "state", "updated"])
+
+class StoredState(object):
+    """
+    The stored record for a resource, loaded on first access. False if
+    nothing was stored.
+    """
+
+    __slots__ = ("_store", "_key", "_record", "_loaded")
+
+    def __init__(self, store, key):
+        self._store = store
+        self._key = key
+        self._record = None
+        self._loaded = False
+
+    @property
+    def record(self):
+        """
+        The `StateRecord`, or None.
+        """
+
+        if not self._loaded:
+            self._record = self._store.get(self._key)
+            self._loaded = True
+        return self._record
+
+    @property
+    def data(self):
+        """
+        Data sent with the last successful response, or None.
+        """
+
+        record = self.record
+        return record.data if record is not None else None
+
+    @property
+    def state(self):
+        """
+        Private state from the last successful response, or None.
+        """
+
+        record = self.record
+        return record.state if record is not None else None
+
+    def __nonzero__(self):
+        return self.record is not None
+
+    def __repr__(self):
+        return "StoredState({!r})".format(self._key)
+
+class MemoryStateStore(object):
+    """
+    Per-container store, keeping the `max_size` most recently used records.
+    """
+
+    def __init__(self, max_size=1000):
+        self._records = LRUCache(max_size)
+
+    def get(self, key):
+        return self._records.get(key)
+
+    def put(self, key, data, state):
+        self._records.set(key, StateRecord(data, state, time.time()))
+
+    def delete(self, key):
+        self._records.pop(key)
+
+    def flush(self):
+        pass
+
+class SQLiteStateStore(object):
+    """
+    Store backed by an SQLite database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "key TEXT PRIMARY KEY, data TEXT NOT NULL, state TEXT, updated REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT data, state, updated FROM state WHERE key = ?", (_serialize_key(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        data, state, updated = row
+        return StateRecord(json.loads(data), json.loads(state), updated)
+
+    def put(self, key, data, state):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO state (key, data, state, updated) VALUES (?, ?, ?, ?)",
+            (_serialize_key(key), json.dumps(data), json.dumps(state), time.time())
+        )
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM state WHERE key = ?", (_serialize_key(key),))
+
+    def flush(self):
+        pass
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Imported here, so only SQLite users pay for it at cold start.
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+class WriteBehindStateStore(object):
+    """
+    Wraps a store, making `put` and `delete` in a background thread. Reads
+    see pending writes. `BaseHandler` calls `flush` before uploading the
+    response.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # Key -> pending StateRecord, or None for a pending delete.
+        self._pending = collections.OrderedDict()
+        self._condition = threading.Condition()
+        self._writing = 0
+        self._errors = []
+        self._thread = None
+
+    def get(self, key):
+        with self._condition:
+            if key in self._pending:
+                return self._pending[key]
+        return self.store.get(key)
+
+    def put(self, key, data, state):
+        self._enqueue(key, StateRecord(data, state, time.time()))
+
+    def delete(self, key):
+        self._enqueue(key, None)
+
+    def flush(self, timeout=None):
+        """
+        Wait until pending writes are done. Raises the first error raised by
+        a write since the last flush.
+        """
+
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            while self._pending or self._writing:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            errors, self._errors = self._errors, []
+        if errors:
+            exc_type, exc, tb = errors[0]
+            raise exc_type, exc, tb
+
+    def _enqueue(self, key, record):
+        with self._condition:
+            self._pending.pop(key, None)
+            self._pending[key] = record
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_pending, name="WriteBehindStateStore")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _write_pending(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                # Left pending until written, so `get` sees it meanwhile.
+                key, record = next(self._pending.iteritems())
+                self._writing += 1
+            try:
+                if record is None:
+                    self.store.delete(key)
+                else:
+                    self.store.put(key, record.data, record.state)
+            except Exception:
+                with self._condition:
+                    self._errors.append(sys.exc_info())
+            finally:
+                with self._condition:
+                    if key in self._pending and self._pending[key] is record:
+                        del self._pending[key]
+                    self._writing -= 1
+                    self._condition.notify_all()
+
+def _serialize_key(key):
+    return json.dumps(list(key))
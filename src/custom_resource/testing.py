@@ -0,0 +1,255 @@
+"""
+Local stand-ins for testing and benchmarking handlers without AWS.
+"""
+
+import BaseHTTPServer
+import collections
+import itertools
+import json
+import random
+import SocketServer
+import socket
+import threading
+import time
+
+class ResponseServer(object):
+    """
+    Local HTTP server imitating a presigned S3 ResponseURL. Accepts PUT
+    requests and records their bodies.
+
+    Supports keep-alive, and counts connections so connection reuse can be
+    observed. Can simulate latency, server errors and throttling. Use as a
+    context manager, or call `start` and `stop`:
+
+        with ResponseServer() as server:
+            event["ResponseURL"] = server.url
+            handler(event, context)
+        server.bodies
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, connect_latency=0, latency=0,
+                 error_rate=0, throttle_rate=0, seed=None):
+        """
+        Arguments:
+            * `host`, `port`: address to listen on. Port 0 picks a free port.
+            * `connect_latency`: seconds to stall each new connection,
+              imitating TCP and TLS setup to a remote endpoint.
+            * `latency`: seconds to stall each request.
+            * `error_rate`: fraction of requests answered with HTTP 500.
+            * `throttle_rate`: fraction of requests answered with HTTP 429.
+            * `seed`: random seed for choosing failed requests.
+        """
+
+        self.connect_latency = connect_latency
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        # Bodies of successful (HTTP 200) requests.
+        self.bodies = []
+        # Request paths, including any query string, for each of `bodies`.
+        self.paths = []
+        # Count of responses by HTTP status.
+        self.statuses = collections.Counter()
+        self.connections = 0
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer((host, port), _RequestHandler)
+        self._httpd.response_server = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return "http://{}:{}/response".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        with self._lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, type, exc, tb):
+        self.stop()
+
+    def _connection_opened(self, sock):
+        with self._lock:
+            self.connections += 1
+            self._sockets.add(sock)
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+
+    def _connection_closed(self, sock):
+        with self._lock:
+            self._sockets.discard(sock)
+
+    def _handle_put(self, path, body):
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.error_rate:
+                status = 500
+            elif roll < self.error_rate + self.throttle_rate:
+                status = 429
+            else:
+                status = 200
+                self.bodies.append(body)
+                self.paths.append(path)
+            self.statuses[status] += 1
+        return status
+
+class LocalQueue(object):
+    """
+    In-memory stand-in for an SQS queue feeding a Lambda function, for
+    testing `BaseHandler.handle_queue_event`.
+
+    Messages reported in `batchItemFailures` are redelivered, until they've
+    been received `max_receive_count` times, when they move to
+    `dead_letters`.
+
+        queue = LocalQueue()
+        queue.send(event)
+        queue.drain(handler)
+    """
+
+    def __init__(self, max_receive_count=3):
+        self.max_receive_count = max_receive_count
+        self.messages = collections.deque()
+        self.dead_letters = []
+        self._ids = itertools.count()
+        self._receive_counts = {}
+
+    def send(self, body):
+        """
+        Queue a message. `body` is JSON-encoded unless it's already a string.
+        Returns the message ID.
+        """
+
+        if not isinstance(body, basestring):
+            body = json.dumps(body)
+        message_id = "message-{}".format(next(self._ids))
+        self.messages.append({"messageId": message_id, "body": body})
+        self._receive_counts[message_id] = 0
+        return message_id
+
+    def receive(self, batch_size=10):
+        """
+        Remove up to `batch_size` messages from the queue, returning them as
+        a Lambda SQS event.
+        """
+
+        records = []
+        while self.messages and len(records) < batch_size:
+            message = self.messages.popleft()
+            self._receive_counts[message["messageId"]] += 1
+            records.append({
+                "messageId": message["messageId"],
+                "receiptHandle": message["messageId"],
+                "body": message["body"],
+                "attributes": {
+                    "ApproximateReceiveCount": str(self._receive_counts[message["messageId"]])
+                },
+                "eventSource": "aws:sqs",
+                "eventSourceARN": "arn:aws:sqs:local:000000000000:queue"
+            })
+        return {"Records": records}
+
+    def acknowledge(self, event, result):
+        """
+        Given a received event and the handler's partial batch response,
+        redeliver failed messages.
+        """
+
+        failed_ids = set(failure["itemIdentifier"] for failure in (result or {}).get("batchItemFailures", []))
+        for record in event["Records"]:
+            if record["messageId"] not in failed_ids:
+                continue
+            message = {"messageId": record["messageId"], "body": record["body"]}
+            if self._receive_counts[record["messageId"]] >= self.max_receive_count:
+                self.dead_letters.append(message)
+            else:
+                self.messages.append(message)
+
+    def drain(self, handler, context=None, batch_size=10):
+        """
+        Feed batches to `handler` until the queue is empty. Returns the number
+        of batches.
+        """
+
+        batches = 0
+        while self.messages:
+            event = self.receive(batch_size)
+            self.acknowledge(event, handler(event, context))
+            batches += 1
+        return batches
+
+def summarize_latencies(seconds):
+    """
+    Summarise a list of latencies, in seconds, as a dict of milliseconds:
+    count, mean, p50, p90, p99 and max.
+    """
+
+    if not seconds:
+        return {"count": 0}
+
+    ordered = sorted(seconds)
+    def percentile(fraction):
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000
+    }
+
+class _HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer the response so it's sent in one packet - unbuffered header
+    # writes interact with Nagle's algorithm and delayed ACKs, adding ~40ms
+    # to each keep-alive request.
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.response_server._connection_opened(self.connection)
+
+    def finish(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+        finally:
+            self.server.response_server._connection_closed(self.connection)
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        status = self.server.response_server._handle_put(self.path, body)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,249 @@
+"""
+HTTP transports used to upload responses to CloudFormation.
+
+A transport lives for the lifetime of the Lambda container, so connections to
+the presigned S3 ResponseURL are kept alive and reused by warm invocations.
+
+Two transports are available:
+    * `RequestsTransport`, using the `requests` library.
+    * `UrllibTransport`, using only the standard library. Avoids importing
+      `requests` at all, which shortens cold starts.
+
+`requests` is only imported when `RequestsTransport` sends its first request.
+
+Transports implement `put(url, data, timeout=None)`. `timeout` caps, in
+seconds, how long connecting and reading may each take, so an attempt
+doesn't outlive the Lambda invocation.
+"""
+
+import httplib
+import os
+import socket
+import threading
+import time
+import urlparse
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+
+# Environment variable choosing the default transport - "requests" or
+# "urllib".
+TRANSPORT_ENVIRONMENT_VARIABLE = "CUSTOM_RESOURCE_TRANSPORT"
+
+class TransportError(Exception):
+    """
+    The request could not be completed - e.g. connection refused, timed out
+    or reset.
+    """
+
+class RequestsTransport(object):
+    """
+    Upload using a pooled, keep-alive `requests.Session`.
+
+    The session is created on first use and shared by every thread using this
+    transport.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT):
+        """
+        Arguments:
+            * `pool_size`: maximum number of connections kept open per host.
+            * `connect_timeout`: seconds to wait for a connection.
+            * `read_timeout`: seconds to wait between bytes of the response.
+        """
+
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def put(self, url, data, timeout=None):
+        """
+        PUT `data` to `url`. Returns the HTTP status code, raises
+        `TransportError` if no response was received.
+        """
+
+        import requests
+
+        try:
+            response = self.session.put(
+                url, data=data,
+                timeout=(_cap(self.connect_timeout, timeout), _cap(self.read_timeout, timeout))
+            )
+        except requests.RequestException as exc:
+            raise TransportError(unicode(exc))
+        return response.status_code
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _create_session(self):
+        import requests
+        import requests.adapters
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+class UrllibTransport(object):
+    """
+    Upload using `httplib` from the standard library, keeping idle
+    connections open per host for reuse.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT):
+        """
+        Arguments:
+            * `pool_size`: maximum number of idle connections kept per host.
+            * `connect_timeout`: seconds to wait for a connection.
+            * `read_timeout`: seconds to wait between bytes of the response.
+        """
+
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+
+    def put(self, url, data, timeout=None):
+        """
+        PUT `data` to `url`. Returns the HTTP status code, raises
+        `TransportError` if no response was received.
+        """
+
+        deadline = time.time() + timeout if timeout is not None else None
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise TransportError("Unsupported URL scheme {!r}".format(parts.scheme))
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        connection = self._checkout(key)
+        reused = connection is not None
+        while True:
+            try:
+                if connection is None:
+                    connection = self._connect(key, deadline)
+                # Whatever connecting left of the timeout.
+                connection.sock.settimeout(_cap(self.read_timeout, _remaining(deadline)))
+                connection.request("PUT", path, body=data)
+                response = connection.getresponse()
+                response.read()
+            except (httplib.HTTPException, socket.error) as exc:
+                if connection is not None:
+                    connection.close()
+                if reused:
+                    # The server may have closed an idle keep-alive
+                    # connection. Try once more with a fresh one.
+                    connection = None
+                    reused = False
+                    continue
+                raise TransportError(unicode(exc) or exc.__class__.__name__)
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(key, connection)
+        return response.status
+
+    def close(self):
+        with self._lock:
+            idle_connections, self._idle_connections = self._idle_connections, {}
+        for connections in idle_connections.itervalues():
+            for connection in connections:
+                connection.close()
+
+    def _connect(self, key, deadline):
+        scheme, netloc = key
+        connection_class = httplib.HTTPSConnection if scheme == "https" else httplib.HTTPConnection
+        connection = connection_class(netloc, timeout=_cap(self.connect_timeout, _remaining(deadline)))
+        connection.connect()
+        return connection
+
+    def _checkout(self, key):
+        with self._lock:
+            connections = self._idle_connections.get(key)
+            if connections:
+                return connections.pop()
+        return None
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            connections = self._idle_connections.setdefault(key, [])
+            if len(connections) < self.pool_size:
+                connections.append(connection)
+                return
+        connection.close()
+
+def _remaining(deadline):
+    if deadline is None:
+        return None
+    # A zero timeout would make sockets non-blocking.
+    return max(0.001, deadline - time.time())
+
+def _cap(timeout, limit):
+    return timeout if limit is None else min(timeout, limit)
+
+_TRANSPORT_CLASSES = {
+    "requests": RequestsTransport,
+    "urllib": UrllibTransport
+}
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+def get_default_transport():
+    """
+    Return the transport shared by all `Responder` objects in this process.
+
+    This is a `RequestsTransport` unless the `CUSTOM_RESOURCE_TRANSPORT`
+    environment variable says otherwise.
+    """
+
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                name = os.environ.get(TRANSPORT_ENVIRONMENT_VARIABLE, "requests")
+                try:
+                    transport_class = _TRANSPORT_CLASSES[name]
+                except KeyError:
+                    raise ValueError("{} must be one of {}, not {!r}".format(
+                        TRANSPORT_ENVIRONMENT_VARIABLE, ", ".join(sorted(_TRANSPORT_CLASSES)), name
+                    ))
+                _default_transport = transport_class()
+    return _default_transport
+
+def set_default_transport(transport):
+    """
+    Replace the transport shared by all `Responder` objects in this process.
+    """
+
+    global _default_transport
+    with _default_transport_lock:
+        _default_transport = transport
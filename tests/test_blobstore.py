@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from custom_resource.blobstore import FileBlobStore, S3BlobStore
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_file_blob_store(self):
+        store = FileBlobStore(self.directory)
+        pointer = store.put("Resource/request.json", '{"a": "1"}')
+        self.assertEqual(pointer, os.path.join(self.directory, "Resource", "request.json"))
+        self.assertEqual(store.get(pointer), '{"a": "1"}')
+
+        pointer = store.put("Resource/other.json", "{}")
+        self.assertEqual(store.get(pointer), "{}")
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory, "Resource"))), ["other.json", "request.json"])
+
+    def test_s3_blob_store(self):
+        client = mock.Mock()
+        store = S3BlobStore("bucket", prefix="responses/", client=client)
+        self.assertEqual(store.put("Resource/request.json", "{}"), "s3://bucket/responses/Resource/request.json")
+        client.put_object.assert_called_once_with(
+            Bucket="bucket", Key="responses/Resource/request.json", Body="{}", ContentType="application/json"
+        )
+
+        client.get_object.return_value = {"Body": mock.Mock(read=mock.Mock(return_value="{}"))}
+        self.assertEqual(store.get("s3://bucket/responses/Resource/request.json"), "{}")
+        client.get_object.assert_called_once_with(Bucket="bucket", Key="responses/Resource/request.json")
@@ -0,0 +1,27 @@
+import unittest
+
+from custom_resource.cache import LRUCache
+
+class TestCase(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_get_default_and_pop(self):
+        cache = LRUCache(max_size=2)
+        self.assertEqual(cache.get("a", "default"), "default")
+        cache.set("a", 1)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.pop("a"))
+
+    def test_max_size_validated(self):
+        with self.assertRaisesRegexp(ValueError, "max_size must be at least 1"):
+            LRUCache(max_size=0)
@@ -0,0 +1,25 @@
+import threading
+import unittest
+
+from custom_resource.concurrency import get_thread_pool, map_concurrently
+
+class TestCase(unittest.TestCase):
+    def test_results_in_order_with_exceptions(self):
+        def function(item):
+            if item == 2:
+                raise ValueError("Bad item")
+            return item * 10
+
+        results = map_concurrently(function, [1, 2, 3], max_workers=2)
+
+        self.assertEqual([result for result, exc_info in results], [10, None, 30])
+        self.assertIsNone(results[0][1])
+        self.assertIs(results[1][1][0], ValueError)
+
+    def test_single_worker_runs_inline(self):
+        threads = map_concurrently(lambda item: threading.current_thread(), [1, 2], max_workers=1)
+        self.assertEqual([thread for thread, exc_info in threads], [threading.current_thread()] * 2)
+
+    def test_pools_shared(self):
+        self.assertIs(get_thread_pool("test", 2), get_thread_pool("test", 2))
+        self.assertIsNot(get_thread_pool("test", 2), get_thread_pool("other", 2))
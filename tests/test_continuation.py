@@ -0,0 +1,213 @@
+import json
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Poll, Responder, Success
+from custom_resource.continuation import (
+    CONTINUATION_KEY, LambdaContinuation, LocalContinuation, SchedulerContinuation, SQSContinuation
+)
+
+class Handler(BaseHandler):
+    POLL_INTERVAL_SECONDS = 10
+    POLL_BACKOFF_RATE = 2
+    POLL_MAX_INTERVAL_SECONDS = 30
+
+    def __init__(self, continuation, polls_needed=3):
+        super(Handler, self).__init__()
+        self.CONTINUATION = continuation
+        self.polls_needed = polls_needed
+        self.states = []
+
+    def create(self, event, context):
+        return Poll({"Polled": 0})
+
+    def is_complete(self, event, context, state):
+        self.states.append(state)
+        if state["Polled"] + 1 < self.polls_needed:
+            return Poll({"Polled": state["Polled"] + 1})
+        return Success("PhysicalResourceId", {"Polled": str(state["Polled"] + 1)})
+
+    update = None
+    delete = None
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.upload_response_data_mock = mock.patch.object(Responder, "_upload_response_data")
+        self.upload_response_data_mock.start()
+        self.event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+
+    def tearDown(self):
+        self.upload_response_data_mock.stop()
+
+    def test_polls_until_complete(self):
+        continuation = LocalContinuation()
+        handler = Handler(continuation)
+
+        handler(self.event, None)
+        Responder._upload_response_data.assert_not_called()
+        self.assertEqual(continuation.run(handler), 3)
+
+        self.assertEqual(handler.states, [{"Polled": 0}, {"Polled": 1}, {"Polled": 2}])
+        self.assertEqual(continuation.delays, [10, 20, 30])
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data), {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "Status": "SUCCESS",
+            "PhysicalResourceId": "PhysicalResourceId",
+            "Data": {
+                "Polled": "3"
+            }
+        })
+
+    def test_none_keeps_polling_with_same_state(self):
+        continuation = LocalContinuation()
+        handler = Handler(continuation)
+        handler.is_complete = mock.Mock(side_effect=[None, "PhysicalResourceId"])
+
+        handler(self.event, None)
+        continuation.run(handler)
+
+        self.assertEqual(
+            [call[1][2] for call in handler.is_complete.mock_calls],
+            [{"Polled": 0}, {"Polled": 0}]
+        )
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Status"], "SUCCESS")
+
+    def test_is_complete_exception_fails(self):
+        continuation = LocalContinuation()
+        handler = Handler(continuation)
+        handler.is_complete = mock.Mock(side_effect=Exception("Provisioning failed"))
+
+        handler(self.event, None)
+        with self.assertRaisesRegexp(Exception, "Provisioning failed"):
+            continuation.run(handler)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Status"], "FAILED")
+        self.assertEqual(json.loads(data)["Reason"], "Provisioning failed")
+
+    def test_poll_timeout(self):
+        continuation = LocalContinuation()
+        handler = Handler(continuation)
+        event = dict(self.event)
+        event[CONTINUATION_KEY] = {"State": {"Polled": 0}, "Polls": 40, "StartedAt": time.time() - 60 * 60}
+
+        handler(event, None)
+
+        self.assertEqual(handler.states, [])
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Reason"], "Timed out waiting for Create to complete")
+
+    def test_lambda_continuation_invokes_current_function(self):
+        client = mock.Mock()
+        context = mock.Mock(invoked_function_arn="arn:aws:lambda:function")
+        handler = Handler(LambdaContinuation(client=client))
+
+        with mock.patch("time.time", return_value=1000):
+            handler(self.event, context)
+
+        (_, args, kwargs), = client.invoke.mock_calls
+        self.assertEqual(kwargs["FunctionName"], "arn:aws:lambda:function")
+        self.assertEqual(kwargs["InvocationType"], "Event")
+        self.assertEqual(json.loads(kwargs["Payload"])[CONTINUATION_KEY], {
+            "State": {"Polled": 0},
+            "Polls": 0,
+            "StartedAt": 1000,
+            "NotBefore": 1010
+        })
+
+    def test_lambda_continuation_waits_for_not_before(self):
+        handler = Handler(LambdaContinuation(client=mock.Mock()))
+        context = mock.Mock(get_remaining_time_in_millis=mock.Mock(return_value=60000))
+        event = dict(self.event)
+        event[CONTINUATION_KEY] = {"State": {"Polled": 2}, "Polls": 2, "StartedAt": 1000, "NotBefore": 1020}
+
+        with mock.patch("time.time", return_value=1005), mock.patch("time.sleep") as sleep:
+            handler(event, context)
+
+        sleep.assert_called_once_with(15)
+        self.assertEqual(handler.states, [{"Polled": 2}])
+
+    def test_sqs_continuation_delays_delivery(self):
+        client = mock.Mock()
+        handler = Handler(SQSContinuation("https://queue", client=client))
+
+        with mock.patch("time.time", return_value=1000):
+            handler(self.event, None)
+
+        (_, args, kwargs), = client.send_message.mock_calls
+        self.assertEqual(kwargs["QueueUrl"], "https://queue")
+        self.assertEqual(kwargs["DelaySeconds"], 10)
+        self.assertEqual(json.loads(kwargs["MessageBody"])[CONTINUATION_KEY]["NotBefore"], 1010)
+        Responder._upload_response_data.assert_not_called()
+
+    def test_sqs_continuation_caps_delay(self):
+        client = mock.Mock()
+        SQSContinuation("https://queue", client=client).schedule(
+            dict(self.event, **{CONTINUATION_KEY: {"State": None, "Polls": 0, "StartedAt": 1000}}), 1200, None
+        )
+        (_, args, kwargs), = client.send_message.mock_calls
+        self.assertEqual(kwargs["DelaySeconds"], 900)
+
+    def test_early_delivery_is_rescheduled(self):
+        client = mock.Mock()
+        handler = Handler(SQSContinuation("https://queue", client=client))
+        event = dict(self.event)
+        event[CONTINUATION_KEY] = {"State": {"Polled": 0}, "Polls": 0, "StartedAt": 1000, "NotBefore": 2200}
+
+        with mock.patch("time.time", return_value=1000), mock.patch("time.sleep") as sleep:
+            handler(event, None)
+
+        sleep.assert_not_called()
+        self.assertEqual(handler.states, [])
+        Responder._upload_response_data.assert_not_called()
+        (_, args, kwargs), = client.send_message.mock_calls
+        self.assertEqual(kwargs["DelaySeconds"], 900)
+        self.assertEqual(json.loads(kwargs["MessageBody"])[CONTINUATION_KEY]["NotBefore"], 2200)
+
+    def test_scheduler_continuation_creates_one_time_schedule(self):
+        client = mock.Mock()
+        context = mock.Mock(invoked_function_arn="arn:aws:lambda:function")
+        handler = Handler(SchedulerContinuation("arn:aws:iam::role", client=client))
+
+        with mock.patch("time.time", return_value=1000):
+            handler(self.event, context)
+
+        (_, args, kwargs), = client.create_schedule.mock_calls
+        self.assertEqual(kwargs["ScheduleExpression"], "at(1970-01-01T00:16:51)")
+        self.assertEqual(kwargs["ActionAfterCompletion"], "DELETE")
+        self.assertEqual(kwargs["Target"]["Arn"], "arn:aws:lambda:function")
+        self.assertEqual(kwargs["Target"]["RoleArn"], "arn:aws:iam::role")
+        self.assertEqual(json.loads(kwargs["Target"]["Input"])[CONTINUATION_KEY]["NotBefore"], 1010)
+
+    def test_poll_without_is_complete_fails(self):
+        class NoIsComplete(BaseHandler):
+            CONTINUATION = LocalContinuation()
+
+            def create(self, event, context):
+                return Poll({})
+
+            update = None
+            delete = None
+
+        handler = NoIsComplete()
+        with self.assertRaises(NotImplementedError):
+            handler(self.event, None)
+        # Failed straight away, without scheduling a poll.
+        self.assertEqual(len(handler.CONTINUATION.queue), 0)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Status"], "FAILED")
+        self.assertEqual(json.loads(data)["Reason"], "NoIsComplete returned Poll but doesn't implement is_complete")
@@ -0,0 +1,104 @@
+import json
+import time
+import unittest
+
+import mock
+
+from custom_resource import AsyncBaseHandler, Poll, Responder, Return
+from custom_resource.continuation import LocalContinuation
+from custom_resource.coroutines import run_coroutine, submit
+
+def slow_double(value):
+    time.sleep(0.2)
+    return value * 2
+
+def fail(message):
+    raise ValueError(message)
+
+class Handler(AsyncBaseHandler):
+    def create(self, event, context):
+        doubled = yield [self.submit(slow_double, index) for index in range(10)]
+        total = yield self.add(doubled)
+        raise Return(("PhysicalResourceId", {"Total": str(total)}))
+
+    def add(self, values):
+        result = yield self.submit(sum, values)
+        raise Return(result)
+
+    def update(self, event, context):
+        try:
+            yield self.submit(fail, "Update failed")
+        except ValueError as exc:
+            raise Return(("PhysicalResourceId", {"Error": unicode(exc)}))
+
+    def delete(self, event, context):
+        return "PhysicalResourceId"
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.upload_response_data_mock = mock.patch.object(Responder, "_upload_response_data")
+        self.upload_response_data_mock.start()
+
+    def tearDown(self):
+        self.upload_response_data_mock.stop()
+
+    def test_futures_run_concurrently(self):
+        started = time.time()
+        Handler()(self.event("Create"), None)
+        self.assertLess(time.time() - started, 1)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Data"], {"Total": "90"})
+
+    def test_exceptions_raised_in_coroutine(self):
+        Handler()(self.event("Update"), None)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Data"], {"Error": "Update failed"})
+
+    def test_plain_methods_still_work(self):
+        Handler()(self.event("Delete"), None)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Status"], "SUCCESS")
+
+    def test_is_complete_coroutine(self):
+        continuation = LocalContinuation()
+        class PollingHandler(Handler):
+            CONTINUATION = continuation
+
+            def create(self, event, context):
+                return Poll({"Value": 1})
+
+            def is_complete(self, event, context, state):
+                value = yield self.submit(slow_double, state["Value"])
+                raise Return(("PhysicalResourceId", {"Value": str(value)}))
+
+        handler = PollingHandler()
+        handler(self.event("Create"), None)
+        continuation.run(handler)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Data"], {"Value": "2"})
+
+    def test_run_coroutine(self):
+        def coroutine():
+            values = yield {"a": submit(slow_double, (1,)), "b": submit(slow_double, (2,))}
+            raise Return(values)
+
+        self.assertEqual(run_coroutine(coroutine()), {"a": 2, "b": 4})
+
+        def bad_yield():
+            yield 123
+        with self.assertRaisesRegexp(TypeError, "Coroutines must yield futures"):
+            run_coroutine(bad_yield())
+
+    def event(self, request_type):
+        return {
+            "RequestType": request_type,
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "PhysicalResourceId": "PhysicalResourceId"
+        }
@@ -0,0 +1,33 @@
+import unittest
+
+from custom_resource.diff import PropertiesDiff, diff_properties
+
+class TestCase(unittest.TestCase):
+    def test_no_changes(self):
+        diff = diff_properties(
+            {"ServiceToken": "old", "A": "1", "B": {"C": ["x"]}},
+            {"ServiceToken": "new", "A": "1", "B": {"C": ["x"]}}
+        )
+        self.assertFalse(diff)
+        self.assertEqual(diff, PropertiesDiff({}, {}, {}))
+
+    def test_changes(self):
+        diff = diff_properties(
+            {"A": "1", "B": {"C": "2", "D": "3"}, "E": ["x"], "Removed": "4"},
+            {"A": "1", "B": {"C": "20", "F": "5"}, "E": ["x", "y"], "Added": "6"}
+        )
+        self.assertTrue(diff)
+        self.assertEqual(diff.added, {("B", "F"): "5", ("Added",): "6"})
+        self.assertEqual(diff.removed, {("B", "D"): "3", ("Removed",): "4"})
+        self.assertEqual(diff.changed, {("B", "C"): ("2", "20"), ("E",): (["x"], ["x", "y"])})
+        self.assertTrue(diff.touches("B"))
+        self.assertTrue(diff.touches("B", "C"))
+        self.assertFalse(diff.touches("A"))
+
+    def test_ignored_keys(self):
+        diff = diff_properties({"A": "1", "Nonce": "1"}, {"A": "1", "Nonce": "2"}, ignore=["Nonce"])
+        self.assertFalse(diff)
+
+    def test_missing_properties(self):
+        diff = diff_properties(None, {"A": "1"})
+        self.assertEqual(diff.added, {("A",): "1"})
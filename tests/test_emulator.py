@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler
+from custom_resource.emulator import FakeContext, generate_events, load_handler, main, read_events, run
+
+class Handler(BaseHandler):
+    def create(self, event, context):
+        return event["LogicalResourceId"], {"Remaining": str(context.get_remaining_time_in_millis() > 0)}
+
+    def update(self, event, context):
+        return event["PhysicalResourceId"]
+
+    def delete(self, event, context):
+        raise RuntimeError("Can't delete")
+
+handler = Handler()
+
+class TestCase(unittest.TestCase):
+    def test_fake_context_counts_down(self):
+        context = FakeContext(timeout=1)
+        remaining = context.get_remaining_time_in_millis()
+        self.assertTrue(900 < remaining <= 1000)
+        time.sleep(0.05)
+        self.assertLess(context.get_remaining_time_in_millis(), remaining)
+        self.assertEqual(FakeContext(timeout=0).get_remaining_time_in_millis(), 0)
+
+    def test_load_handler(self):
+        self.assertIs(load_handler("tests.test_emulator.handler"), handler)
+        with self.assertRaisesRegexp(ValueError, "module.attribute"):
+            load_handler("handler")
+
+    def test_generate_events(self):
+        events = list(generate_events(4, properties={"Name": "x"}))
+        self.assertEqual([event["RequestType"] for event in events], ["Create", "Update", "Delete", "Create"])
+        self.assertEqual(events[1]["PhysicalResourceId"], "Resource0")
+        self.assertEqual(events[1]["OldResourceProperties"]["Name"], "x")
+        self.assertEqual(events[3]["LogicalResourceId"], "Resource1")
+
+    def test_run(self):
+        report = run("tests.test_emulator.handler", generate_events(12), workers=2, invocations_per_container=3)
+
+        self.assertEqual(report["invocations"], 12)
+        # Containers are replaced after 3 invocations, though the pool may
+        # hand a new container fewer.
+        self.assertGreaterEqual(report["cold_starts"], 4)
+        self.assertEqual(report["containers"], report["cold_starts"])
+        self.assertEqual(report["cold_latency"]["count"] + report["warm_latency"]["count"], 12)
+        self.assertEqual(report["response_statuses"], {"SUCCESS": 8, "FAILED": 4})
+        self.assertEqual(report["missing_responses"], 0)
+        # The handler re-raises after sending FAILED, as Lambda expects.
+        self.assertEqual(len(report["errors"]), 4)
+        self.assertIn("RuntimeError: Can't delete", report["errors"][0])
+        created = [response for response in report["responses"] if "Data" in response and response["Data"]]
+        self.assertEqual(created[0]["Data"], {"Remaining": "True"})
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        try:
+            events_path = os.path.join(directory, "events.json")
+            with open(events_path, "w") as f:
+                for event in generate_events(2):
+                    f.write(json.dumps(event) + "\n")
+            self.assertEqual(len(read_events(events_path)), 2)
+
+            output_path = os.path.join(directory, "report.json")
+            with mock.patch("sys.stdout", new_callable=StringIO.StringIO) as stdout:
+                self.assertEqual(main([
+                    "tests.test_emulator.handler", "--events", events_path, "--workers", "1", "--output", output_path
+                ]), 0)
+            with open(output_path) as f:
+                self.assertEqual(json.load(f)["response_statuses"], {"SUCCESS": 2})
+            self.assertIn("2 invocations in 1 containers", stdout.getvalue())
+            self.assertIn("responses: {u'SUCCESS': 2}, missing: 0, timeouts: 0, errors: 0", stdout.getvalue())
+        finally:
+            shutil.rmtree(directory)
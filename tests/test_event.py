@@ -0,0 +1,170 @@
+import json
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder
+from custom_resource.event import CustomResourceEvent, build_converters, convert_properties
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ServiceToken": {"type": "string"},
+        "Name": {"type": "string"},
+        "Count": {"type": ["integer", "string"], "pattern": "^[0-9]+$"},
+        "Ratio": {"type": ["number", "string"]},
+        "Enabled": {"type": ["boolean", "string"]},
+        "Ports": {"type": "array", "items": {"type": ["integer", "string"]}},
+        "Options": {
+            "type": "object",
+            "properties": {
+                "Retries": {"type": ["integer", "string"]}
+            }
+        }
+    }
+}
+
+class TestCase(unittest.TestCase):
+    def test_build_converters(self):
+        converters = build_converters(SCHEMA)
+        self.assertEqual(sorted(converters), ["Count", "Enabled", "Options", "Ports", "Ratio"])
+        self.assertEqual(converters["Count"]("12"), 12)
+        self.assertEqual(converters["Count"](12), 12)
+        self.assertEqual(converters["Ratio"]("0.5"), 0.5)
+        self.assertEqual(converters["Ratio"]("2"), 2)
+        self.assertIs(converters["Enabled"]("True"), True)
+        self.assertIs(converters["Enabled"]("false"), False)
+        self.assertEqual(converters["Ports"](["80", "443"]), [80, 443])
+        self.assertEqual(converters["Options"]({"Retries": "3", "Other": "x"}), {"Retries": 3, "Other": "x"})
+        self.assertEqual(build_converters(None), {})
+
+    def test_event_accessors(self):
+        event = CustomResourceEvent({
+            "RequestType": "Update",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "PhysicalResourceId": "4",
+            "ResourceType": "Custom::Thing",
+            "ResourceProperties": {"Count": "5", "Name": "thing"},
+            "OldResourceProperties": {"Count": "4", "Name": "thing"}
+        }, build_converters(SCHEMA))
+
+        self.assertEqual(event.request_type, "Update")
+        self.assertEqual(event.stack_id, "1")
+        self.assertEqual(event.physical_resource_id, "4")
+        self.assertEqual(event.resource_type, "Custom::Thing")
+        self.assertIsNone(event.response_url)
+        self.assertEqual(event["RequestId"], "2")
+        self.assertEqual(event.get("Missing", "default"), "default")
+        self.assertIn("StackId", event)
+
+        self.assertEqual(event.properties["Count"], 5)
+        self.assertEqual(event.properties.get("Name"), "thing")
+        self.assertIsNone(event.properties.get("Enabled"))
+        self.assertEqual(dict(event.properties.items()), {"Count": 5, "Name": "thing"})
+        self.assertEqual(event.old_properties["Count"], 4)
+
+        with self.assertRaises(AttributeError):
+            event.other = 1
+
+    def test_properties_converted_once(self):
+        converter = mock.Mock(return_value=5)
+        event = CustomResourceEvent({"ResourceProperties": {"Count": "5"}}, {"Count": converter})
+        self.assertEqual(event.properties["Count"], 5)
+        self.assertEqual(event.properties["Count"], 5)
+        converter.assert_called_once_with("5")
+        self.assertIsNone(event.old_properties)
+
+    def test_invalid_value(self):
+        converters = build_converters({"properties": {"Count": {"type": "integer"}}})
+        event = CustomResourceEvent({"ResourceProperties": {"Count": "many"}}, converters)
+        with self.assertRaisesRegexp(ValueError, "Property Count: 'many' is not an integer"):
+            event.properties["Count"]
+        with self.assertRaisesRegexp(ValueError, "Property Count: 'many' is not an integer"):
+            convert_properties({"Count": "many"}, converters)
+
+    def test_unparseable_value_kept_if_strings_allowed(self):
+        converters = build_converters({"properties": {"Count": {"type": ["integer", "string"]}}})
+        self.assertEqual(convert_properties({"Count": "many", "Other": "x"}, converters), {"Count": "many", "Other": "x"})
+        self.assertEqual(convert_properties({"Count": "3"}, converters), {"Count": 3})
+
+    def test_handler_validates_converted_properties(self):
+        received = []
+        class Handler(BaseHandler):
+            TYPED_EVENTS = True
+            RESOURCE_PROPERTIES_SCHEMA = {
+                "properties": {
+                    "Count": {"type": "integer", "minimum": 1},
+                    "Size": {"type": ["integer", "string"], "pattern": "^[0-9]+$"},
+                    "Name": {"type": ["integer", "string"]}
+                }
+            }
+
+            def create(self, event, context):
+                received.append(dict(event.properties.items()))
+                return "PhysicalResourceId"
+
+            def update(self, event, context):
+                pass
+
+            def delete(self, event, context):
+                pass
+
+        event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        reasons = []
+        for properties in [
+            {"Count": "abc"},
+            {"Count": "0"},
+            {"Size": "abc"},
+            {"Count": "2", "Size": "10", "Name": "abc"}
+        ]:
+            with mock.patch.object(Responder, "_upload_response_data") as upload_response_data:
+                Handler()(dict(event, ResourceProperties=properties), None)
+            (_, (url, data), kwargs), = upload_response_data.mock_calls
+            reasons.append(json.loads(data).get("Reason"))
+
+        self.assertEqual(reasons[0], "Property Count: 'abc' is not an integer")
+        self.assertIn("0 is less than the minimum of 1", reasons[1])
+        self.assertIn("does not match", reasons[2])
+        self.assertIsNone(reasons[3])
+        self.assertEqual(received, [{"Count": 2, "Size": 10, "Name": "abc"}])
+
+    def test_handler_passes_typed_events(self):
+        received = []
+        class Handler(BaseHandler):
+            TYPED_EVENTS = True
+            RESOURCE_PROPERTIES_SCHEMA = SCHEMA
+
+            def create(self, event, context):
+                received.append(event)
+                return "PhysicalResourceId", {"Double": unicode(event.properties["Count"] * 2)}
+
+            def update(self, event, context):
+                pass
+
+            def delete(self, event, context):
+                pass
+
+        self.assertIs(Handler.get_event_converters(), Handler.get_event_converters())
+
+        with mock.patch.object(Responder, "_upload_response_data") as upload_response_data:
+            Handler()({
+                "RequestType": "Create",
+                "StackId": "1",
+                "RequestId": "2",
+                "LogicalResourceId": "3",
+                "ResponseURL": "http://response",
+                "ResourceProperties": {"ServiceToken": "arn", "Count": "21"}
+            }, None)
+
+        event, = received
+        self.assertIsInstance(event, CustomResourceEvent)
+        (_, (url, data), kwargs), = upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Data"], {"Double": "42"})
@@ -0,0 +1,158 @@
+import threading
+import time
+import unittest
+
+from custom_resource import Failed, Success
+from custom_resource.fanout import CREATE, DELETE, UPDATE, FanOut, Operation, index_items, plan
+
+class Context(object):
+    def __init__(self, remaining_millis):
+        self.remaining_millis = remaining_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis
+
+class Records(object):
+    """
+    Fake downstream API.
+    """
+
+    def __init__(self, records=None, fail_on=(), delay=0):
+        self.records = dict(records or {})
+        self.fail_on = set(fail_on)
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def create(self, key, item):
+        self._call("create", key)
+        with self.lock:
+            self.records[key] = item["Value"]
+        return "id-" + key
+
+    def update(self, key, old, new):
+        self._call("update", key)
+        with self.lock:
+            self.records[key] = new["Value"]
+        return "id-" + key
+
+    def delete(self, key, item):
+        self._call("delete", key)
+        with self.lock:
+            del self.records[key]
+
+    def _call(self, action, key):
+        with self.lock:
+            self.calls.append((action, key))
+        time.sleep(self.delay)
+        if (action, key) in self.fail_on:
+            raise RuntimeError("{} {} broke".format(action, key))
+
+    def fanout(self, **kwargs):
+        return FanOut(self.create, self.delete, self.update, **kwargs)
+
+class TestCase(unittest.TestCase):
+    def test_index_items(self):
+        self.assertEqual(
+            index_items([{"Name": "a", "Value": "1"}, {"Name": "b", "Value": "2"}], "Name"),
+            {"a": {"Name": "a", "Value": "1"}, "b": {"Name": "b", "Value": "2"}}
+        )
+        with self.assertRaisesRegexp(ValueError, "Duplicate Name 'a'"):
+            index_items([{"Name": "a"}, {"Name": "a"}], "Name")
+
+    def test_plan(self):
+        old = {"a": {"Value": "1"}, "b": {"Value": "2"}, "c": {"Value": "3"}}
+        new = {"b": {"Value": "2"}, "c": {"Value": "4"}, "d": {"Value": "5"}}
+        self.assertEqual(plan(old, new), [
+            Operation(DELETE, "a", old={"Value": "1"}),
+            Operation(UPDATE, "c", old={"Value": "3"}, new={"Value": "4"}),
+            Operation(CREATE, "d", new={"Value": "5"})
+        ])
+        self.assertEqual(plan(None, None), [])
+
+    def test_runs_concurrently(self):
+        records = Records(delay=0.1)
+        new = {str(index): {"Value": str(index)} for index in range(8)}
+
+        started = time.time()
+        response = records.fanout(max_workers=8).run("collection", {}, new)
+        self.assertLess(time.time() - started, 0.5)
+
+        self.assertIsInstance(response, Success)
+        self.assertEqual(response.as_dict()["Data"], {key: "id-" + key for key in new})
+        self.assertEqual(records.records, {key: key for key in new})
+
+    def test_only_changes_applied(self):
+        records = Records({"a": "1", "b": "2", "c": "3"})
+        old = {"a": {"Value": "1"}, "b": {"Value": "2"}, "c": {"Value": "3"}}
+        new = {"b": {"Value": "2"}, "c": {"Value": "4"}}
+
+        response = records.fanout().run("collection", old, new, data={"a": "id-a", "b": "id-b", "c": "id-c"})
+        self.assertEqual(sorted(records.calls), [("delete", "a"), ("update", "c")])
+        self.assertEqual(response.as_dict()["Data"], {"b": "id-b", "c": "id-c"})
+        self.assertEqual(records.records, {"b": "2", "c": "4"})
+
+    def test_update_defaults_to_delete_and_create(self):
+        records = Records({"a": "1"})
+        response = FanOut(records.create, records.delete).run("collection", {"a": {"Value": "1"}}, {"a": {"Value": "2"}})
+        self.assertEqual(records.calls, [("delete", "a"), ("create", "a")])
+        self.assertEqual(response.as_dict()["Data"], {"a": "id-a"})
+
+    def test_failure_rolls_back(self):
+        records = Records({"a": "1", "b": "2"}, fail_on=[("create", "c")])
+        old = {"a": {"Value": "1"}, "b": {"Value": "2"}}
+        new = {"b": {"Value": "3"}, "c": {"Value": "4"}}
+
+        response = records.fanout(max_workers=1).run("collection", old, new)
+        self.assertIsInstance(response, Failed)
+        self.assertEqual(response.as_dict()["Reason"], "Create c failed: create c broke; Rolled back 2 items")
+        self.assertEqual(records.records, {"a": "1", "b": "2"})
+
+    def test_failed_rollback_reported(self):
+        records = Records(fail_on=[("create", "b"), ("delete", "a")])
+        new = {"a": {"Value": "1"}, "b": {"Value": "2"}}
+
+        response = records.fanout(max_workers=1).run("collection", {}, new)
+        self.assertEqual(
+            response.as_dict()["Reason"],
+            "Create b failed: create b broke; Rollback incomplete: Delete a failed: delete a broke"
+        )
+
+    def test_stops_before_deadline(self):
+        records = Records()
+        response = records.fanout(deadline_margin=10).run("collection", {}, {"a": {"Value": "1"}}, Context(5000))
+        self.assertEqual(response.as_dict()["Reason"], "Stopped before the Lambda deadline")
+        self.assertEqual(records.calls, [])
+
+    def test_failed_replacement_restores_item(self):
+        records = Records({"a": "1"})
+        def create(key, item):
+            # Creating the replacement fails, re-creating the original works.
+            if item["Value"] == "2":
+                raise RuntimeError("create a broke")
+            return records.create(key, item)
+
+        response = FanOut(create, records.delete).run("collection", {"a": {"Value": "1"}}, {"a": {"Value": "2"}})
+        self.assertEqual(response.as_dict()["Reason"], "Update a failed: create a broke")
+        self.assertEqual(records.records, {"a": "1"})
+
+    def test_failed_restore_reported(self):
+        records = Records({"a": "1"}, fail_on=[("create", "a")])
+        response = FanOut(records.create, records.delete).run("collection", {"a": {"Value": "1"}}, {"a": {"Value": "2"}})
+        self.assertEqual(
+            response.as_dict()["Reason"],
+            "Update a failed: create a broke; re-creating the old item failed: create a broke"
+        )
+        self.assertEqual(records.calls, [("delete", "a"), ("create", "a"), ("create", "a")])
+
+    def test_rollback_stops_before_deadline(self):
+        records = Records(fail_on=[("create", "b")], delay=0.3)
+        new = {"a": {"Value": "1"}, "b": {"Value": "2"}}
+
+        # Operations start until 0.1s from now, and rollbacks until 0.2s.
+        response = records.fanout(max_workers=2, deadline_margin=0.2).run("collection", {}, new, Context(300))
+        self.assertEqual(
+            response.as_dict()["Reason"],
+            "Create b failed: create b broke; Rollback incomplete: Delete a not started before the Lambda deadline"
+        )
+        self.assertEqual(records.records, {"a": "1"})
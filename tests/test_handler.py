@@ -1,10 +1,23 @@
 import json
+import threading
+import time
 import unittest
 
 import mock
 
 from custom_resource import BaseHandler, Defer, Failed, Responder, Success
 
+class Context(object):
+    """
+    Fake Lambda context, counting down from `timeout_millis`.
+    """
+
+    def __init__(self, timeout_millis):
+        self.deadline = time.time() + timeout_millis / 1000.0
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.time()) * 1000)
+
 class TestCase(unittest.TestCase):
     def setUp(self):
         self.upload_response_data_mock = mock.patch.object(Responder, "_upload_response_data")
@@ -392,11 +405,256 @@ class TestCase(unittest.TestCase):
         })
         self.assertEqual(kwargs, {})
 
-    def handler(self, create=None, update=None, delete=None, schema=None):
-        Handler = type("Handler", (BaseHandler,), {
+    def test_schema_validator_built_once_per_class(self):
+        schema = {"required": ["Validating"]}
+        handler = self.handler(schema=schema)
+        Handler = type(handler)
+
+        self.assertIs(Handler().get_resource_properties_validator(), handler.get_resource_properties_validator())
+        self.assertIs(handler.get_resource_properties_validator().schema, schema)
+
+        with mock.patch("custom_resource.SchemaValidator") as SchemaValidator:
+            Handler()
+            SchemaValidator.assert_not_called()
+
+    def test_schema_validation_compiled_fail(self):
+        event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "ResourceProperties": {}
+        }
+        handler = self.handler(
+            create=lambda self, *args: Success("PhysicalResourceId", {"Meta": "Data"}),
+            schema={"required": ["Validating"]},
+            compiled=True
+        )
+        self.assertTrue(handler.get_resource_properties_validator().compiled)
+        handler(event, context=None)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        response = json.loads(data)
+        self.assertEqual(response["Status"], "FAILED")
+        self.assertTrue(response["Reason"].startswith("'Validating' is a required property\n"))
+
+    def test_watchdog_responds_before_lambda_timeout(self):
+        event = {
+            "RequestType": "Update",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "PhysicalResourceId": "PhysicalResourceId"
+        }
+        finished = threading.Event()
+        handler = self.handler(
+            update=lambda self, *args: finished.wait(5) and "PhysicalResourceId",
+            TIMEOUT_SAFETY_MARGIN_MILLIS=1000
+        )
+
+        started = time.time()
+        handler(event, Context(timeout_millis=1100))
+        finished.set()
+        self.assertLess(time.time() - started, 1)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data), {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "Status": "FAILED",
+            "PhysicalResourceId": "PhysicalResourceId",
+            "Reason": "Update timed out"
+        })
+
+    def test_watchdog_returns_result_within_deadline(self):
+        event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        handler = self.handler(
+            create=lambda self, *args: "PhysicalResourceId",
+            TIMEOUT_SAFETY_MARGIN_MILLIS=1000
+        )
+        handler(event, Context(timeout_millis=5000))
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Status"], "SUCCESS")
+
+    def test_watchdog_reraises_exceptions(self):
+        def raise_exc(exc):
+            raise exc
+
+        event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        handler = self.handler(
+            create=lambda self, *args: raise_exc(ValueError("Couldn't create")),
+            TIMEOUT_SAFETY_MARGIN_MILLIS=1000
+        )
+        with self.assertRaisesRegexp(ValueError, "Couldn't create"):
+            handler(event, Context(timeout_millis=5000))
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Reason"], "Couldn't create")
+
+    def test_watchdog_custom_timeout_response(self):
+        event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        create = mock.Mock()
+        handler = self.handler(
+            create=create,
+            timeout=lambda self, event, context: Defer(),
+            TIMEOUT_SAFETY_MARGIN_MILLIS=1000
+        )
+        handler(event, Context(timeout_millis=500))
+
+        create.assert_not_called()
+        Responder._upload_response_data.assert_not_called()
+
+    def test_unchanged_update_skipped(self):
+        create_event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "ResourceProperties": {"ServiceToken": "arn", "Name": "abc", "Nonce": "1"}
+        }
+        update_event = {
+            "RequestType": "Update",
+            "StackId": "1",
+            "RequestId": "4",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "PhysicalResourceId": "PhysicalResourceId",
+            "ResourceProperties": {"ServiceToken": "new-arn", "Name": "abc", "Nonce": "2"},
+            "OldResourceProperties": {"ServiceToken": "arn", "Name": "abc", "Nonce": "1"}
+        }
+        update = mock.Mock()
+        handler = self.handler(
+            create=lambda self, *args: ("PhysicalResourceId", {"Meta": "Data"}),
+            update=update,
+            SKIP_UNCHANGED_UPDATES=True,
+            VOLATILE_PROPERTIES=["Nonce"]
+        )
+        handler(create_event, context=None)
+        handler(update_event, context=None)
+
+        update.assert_not_called()
+        (_, (url, created), kwargs), (_, (url, updated), kwargs) = Responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(updated), {
+            "StackId": "1",
+            "RequestId": "4",
+            "LogicalResourceId": "3",
+            "Status": "SUCCESS",
+            "PhysicalResourceId": "PhysicalResourceId",
+            "Data": {
+                "Meta": "Data"
+            }
+        })
+
+    def test_unchanged_update_without_previous_data_calls_update(self):
+        event = {
+            "RequestType": "Update",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "PhysicalResourceId": "PhysicalResourceId",
+            "ResourceProperties": {"Name": "abc"},
+            "OldResourceProperties": {"Name": "abc"}
+        }
+        update = mock.Mock(return_value="PhysicalResourceId")
+        handler = self.handler(update=update, SKIP_UNCHANGED_UPDATES=True)
+        handler(event, context=None)
+
+        self.assertEqual(update.call_count, 1)
+
+    def test_changed_update_receives_diff(self):
+        event = {
+            "RequestType": "Update",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "PhysicalResourceId": "PhysicalResourceId",
+            "ResourceProperties": {"Name": "new"},
+            "OldResourceProperties": {"Name": "old"}
+        }
+        update = mock.Mock(return_value="PhysicalResourceId")
+        handler = self.handler(update=update, SKIP_UNCHANGED_UPDATES=True, PASS_PROPERTIES_DIFF=True)
+        handler(event, context=None)
+
+        (_, (_, _, diff), _), = update.mock_calls
+        self.assertEqual(diff.changed, {("Name",): ("old", "new")})
+
+    def test_delete_of_sentinel_physical_resource_id_skipped(self):
+        for physical_resource_id in "n/a", "never-created":
+            Responder._upload_response_data.reset_mock()
+            event = {
+                "RequestType": "Delete",
+                "StackId": "1",
+                "RequestId": "2",
+                "LogicalResourceId": "3",
+                "ResponseURL": "http://response",
+                "PhysicalResourceId": physical_resource_id,
+                "ResourceProperties": {"Invalid": True}
+            }
+            delete = mock.Mock()
+            handler = self.handler(
+                delete=delete,
+                schema={"required": ["Valid"]},
+                SENTINEL_PHYSICAL_RESOURCE_IDS=frozenset(["n/a", "never-created"])
+            )
+            handler(event, context=None)
+
+            delete.assert_not_called()
+            (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+            self.assertEqual(json.loads(data), {
+                "StackId": "1",
+                "RequestId": "2",
+                "LogicalResourceId": "3",
+                "Status": "SUCCESS",
+                "PhysicalResourceId": physical_resource_id,
+                "Data": {}
+            })
+
+    def test_delete_of_real_physical_resource_id_calls_delete(self):
+        event = {
+            "RequestType": "Delete",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "PhysicalResourceId": "PhysicalResourceId"
+        }
+        delete = mock.Mock(return_value="PhysicalResourceId")
+        self.handler(delete=delete)(event, context=None)
+
+        self.assertEqual(delete.call_count, 1)
+
+    def handler(self, create=None, update=None, delete=None, schema=None, compiled=False, **attributes):
+        attributes.update({
             "create": create,
             "update": update,
             "delete": delete,
-            "RESOURCE_PROPERTIES_SCHEMA": schema
+            "RESOURCE_PROPERTIES_SCHEMA": schema,
+            "COMPILE_RESOURCE_PROPERTIES_SCHEMA": compiled
         })
+        Handler = type("Handler", (BaseHandler,), attributes)
         return Handler()
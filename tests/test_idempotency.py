@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Defer, Responder, ResponseUploadError
+from custom_resource.idempotency import (
+    COMPLETED, IN_PROGRESS, MemoryIdempotencyStore, SQLiteIdempotencyStore
+)
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.upload_response_data_mock = mock.patch.object(Responder, "_upload_response_data")
+        self.upload_response_data_mock.start()
+        self.tempdir = tempfile.mkdtemp()
+        self.event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+
+    def tearDown(self):
+        self.upload_response_data_mock.stop()
+        shutil.rmtree(self.tempdir)
+
+    def test_duplicate_replays_success(self):
+        for store in self.stores():
+            Responder._upload_response_data.reset_mock()
+            create = mock.Mock(return_value=("PhysicalResourceId", {"Meta": "Data"}))
+            handler = self.handler(store, create)
+
+            handler(self.event, None)
+            handler(dict(self.event), None)
+
+            self.assertEqual(create.call_count, 1)
+            first, second = Responder._upload_response_data.mock_calls
+            self.assertEqual(first, second)
+            self.assertEqual(json.loads(second[1][1])["PhysicalResourceId"], "PhysicalResourceId")
+
+    def test_duplicate_replays_failure(self):
+        for store in self.stores():
+            Responder._upload_response_data.reset_mock()
+            create = mock.Mock(side_effect=Exception("Couldn't create"))
+            handler = self.handler(store, create)
+
+            with self.assertRaisesRegexp(Exception, "Couldn't create"):
+                handler(self.event, None)
+            handler(self.event, None)
+
+            self.assertEqual(create.call_count, 1)
+            first, second = Responder._upload_response_data.mock_calls
+            self.assertEqual(first, second)
+            self.assertEqual(json.loads(second[1][1])["Reason"], "Couldn't create")
+
+    def test_duplicate_of_deferred_request_ignored(self):
+        create = mock.Mock(return_value=Defer())
+        handler = self.handler(MemoryIdempotencyStore(), create)
+
+        handler(self.event, None)
+        handler(self.event, None)
+
+        self.assertEqual(create.call_count, 1)
+        Responder._upload_response_data.assert_not_called()
+
+    def test_duplicate_of_in_progress_request_ignored(self):
+        store = MemoryIdempotencyStore()
+        store.begin(("1", "3", "2"))
+        create = mock.Mock(return_value="PhysicalResourceId")
+
+        self.handler(store, create)(self.event, None)
+
+        create.assert_not_called()
+        Responder._upload_response_data.assert_not_called()
+
+    def test_stale_in_progress_request_retried(self):
+        store = MemoryIdempotencyStore(in_progress_timeout=60)
+        with mock.patch("time.time", return_value=1000):
+            store.begin(("1", "3", "2"))
+        create = mock.Mock(return_value="PhysicalResourceId")
+
+        with mock.patch("time.time", return_value=1061):
+            self.handler(store, create)(self.event, None)
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(store.get(("1", "3", "2")).status, COMPLETED)
+
+    def test_failed_upload_retried(self):
+        for store in self.stores():
+            Responder._upload_response_data.reset_mock()
+            Responder._upload_response_data.side_effect = ResponseUploadError("Upload failed")
+            create = mock.Mock(return_value="PhysicalResourceId")
+            handler = self.handler(store, create)
+
+            with self.assertRaises(ResponseUploadError):
+                handler(self.event, None)
+            self.assertIsNone(store.get(("1", "3", "2")))
+
+            Responder._upload_response_data.reset_mock()
+            Responder._upload_response_data.side_effect = None
+            handler(self.event, None)
+
+            self.assertEqual(create.call_count, 2)
+            (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+            self.assertEqual(json.loads(data)["Status"], "SUCCESS")
+            self.assertEqual(store.get(("1", "3", "2")).status, COMPLETED)
+
+    def test_different_requests_not_deduplicated(self):
+        create = mock.Mock(return_value="PhysicalResourceId")
+        handler = self.handler(MemoryIdempotencyStore(), create)
+
+        handler(self.event, None)
+        handler(dict(self.event, RequestId="other"), None)
+
+        self.assertEqual(create.call_count, 2)
+
+    def test_memory_store_evicts_oldest(self):
+        store = MemoryIdempotencyStore(max_size=2)
+        for key in "abc":
+            store.begin(key)
+
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("c").status, IN_PROGRESS)
+
+    def test_sqlite_store_shared_between_instances(self):
+        path = os.path.join(self.tempdir, "idempotency.db")
+        SQLiteIdempotencyStore(path).complete(("1", "3", "2"), {"Status": "SUCCESS"})
+
+        record = SQLiteIdempotencyStore(path).begin(("1", "3", "2"))
+        self.assertEqual(record.status, COMPLETED)
+        self.assertEqual(record.response, {"Status": "SUCCESS"})
+
+    def stores(self):
+        return [
+            MemoryIdempotencyStore(),
+            SQLiteIdempotencyStore(os.path.join(self.tempdir, "idempotency.db"))
+        ]
+
+    def handler(self, store, create):
+        Handler = type("Handler", (BaseHandler,), {
+            "create": create,
+            "update": None,
+            "delete": None,
+            "IDEMPOTENCY_STORE": store
+        })
+        return Handler()
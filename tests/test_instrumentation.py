@@ -0,0 +1,90 @@
+import json
+import StringIO
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder
+from custom_resource.instrumentation import (
+    EmbeddedMetricsObserver, InMemoryCollector, Instrumentation, _NULL_TIMER
+)
+from custom_resource.idempotency import MemoryIdempotencyStore
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.upload_response_data_mock = mock.patch.object(Responder, "_upload_response_data")
+        self.upload_response_data_mock.start()
+        self.event = {
+            "RequestType": "Create",
+            "ResourceType": "Custom::Thing",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "ResourceProperties": {}
+        }
+
+    def tearDown(self):
+        self.upload_response_data_mock.stop()
+
+    def test_collects_phases(self):
+        collector = InMemoryCollector()
+        self.handler(collector)(self.event, None)
+
+        self.assertEqual(
+            sorted(collector.timings),
+            ["Coercion", "Dispatch", "Request", "Serialization", "Upload", "Validation"]
+        )
+        for name, timings in collector.timings.iteritems():
+            self.assertEqual(len(timings), 1, name)
+
+        (_, (url, data), kwargs), = Responder._upload_response_data.mock_calls
+        self.assertEqual(collector.counts["PayloadBytes"], [len(data)])
+        self.assertEqual(collector.counts["UploadAttempts"], [0])
+        self.assertEqual(collector.finished, [self.event])
+
+    def test_embedded_metrics(self):
+        stream = StringIO.StringIO()
+        observer = EmbeddedMetricsObserver(namespace="Test", stream=stream)
+        self.handler(observer)(self.event, None)
+
+        document = json.loads(stream.getvalue())
+        (metrics_directive,) = document["_aws"]["CloudWatchMetrics"]
+        self.assertEqual(metrics_directive["Namespace"], "Test")
+        self.assertEqual(metrics_directive["Dimensions"], [["ResourceType", "RequestType"]])
+        self.assertIn({"Name": "DispatchTime", "Unit": "Milliseconds"}, metrics_directive["Metrics"])
+        self.assertIn({"Name": "PayloadBytes", "Unit": "Bytes"}, metrics_directive["Metrics"])
+        self.assertEqual(document["ResourceType"], "Custom::Thing")
+        self.assertEqual(document["RequestType"], "Create")
+        self.assertEqual(document["RequestId"], "2")
+        for metric in metrics_directive["Metrics"]:
+            self.assertIn(metric["Name"], document)
+
+    def test_embedded_metrics_for_replayed_duplicate(self):
+        stream = StringIO.StringIO()
+        observer = EmbeddedMetricsObserver(namespace="Test", stream=stream)
+        handler = self.handler(observer, IDEMPOTENCY_STORE=MemoryIdempotencyStore())
+        handler(self.event, None)
+        # A copy, as redelivered requests are new event objects.
+        handler(dict(self.event), None)
+
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertIn("DispatchTime", first)
+        self.assertNotIn("DispatchTime", second)
+        self.assertEqual(second["PayloadBytes"], first["PayloadBytes"])
+        self.assertEqual(observer._metrics, {})
+
+    def test_no_observers(self):
+        instrumentation = Instrumentation()
+        self.assertFalse(instrumentation)
+        self.assertIs(instrumentation.timer("Dispatch", self.event), _NULL_TIMER)
+
+    def handler(self, observer, **attributes):
+        Handler = type("Handler", (BaseHandler,), dict({
+            "create": lambda self, *args: ("PhysicalResourceId", {"Meta": "Data"}),
+            "update": None,
+            "delete": None,
+            "RESOURCE_PROPERTIES_SCHEMA": {},
+            "OBSERVERS": [observer]
+        }, **attributes))
+        return Handler()
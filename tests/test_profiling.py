@@ -0,0 +1,132 @@
+import json
+import os
+import pstats
+import shutil
+import StringIO
+import tempfile
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder
+from custom_resource.instrumentation import Observer
+from custom_resource.profiling import Profiler
+
+def slow_function():
+    time.sleep(0.05)
+
+class CountingObserver(Observer):
+    def __init__(self):
+        self.counts = []
+
+    def count(self, name, value, event):
+        self.counts.append((name, value))
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "ResourceProperties": {}
+        }
+
+    def make_handler(self, profiler, observer=None):
+        class Handler(BaseHandler):
+            PROFILER = profiler
+            OBSERVERS = [observer] if observer is not None else []
+
+            def create(self, event, context):
+                slow_function()
+                return "PhysicalResourceId", {}
+
+            def update(self, event, context):
+                pass
+
+            def delete(self, event, context):
+                pass
+
+        return Handler()
+
+    def test_keeps_slow_invocation(self):
+        stream = StringIO.StringIO()
+        observer = CountingObserver()
+        handler = self.make_handler(Profiler(sample_rate=1, latency_threshold=0.01, stream=stream), observer)
+        with mock.patch.object(Responder, "_upload_response_data") as upload:
+            handler(self.event, None)
+
+        self.assertEqual(len(upload.mock_calls), 1)
+        profile = json.loads(stream.getvalue())["Profile"]
+        self.assertEqual(profile["RequestId"], "2")
+        self.assertEqual(profile["LogicalResourceId"], "3")
+        self.assertGreaterEqual(profile["DurationMs"], 50)
+        self.assertIn("slow_function", profile["Stats"])
+        # The upload is profiled too.
+        self.assertIn("respond", profile["Stats"])
+        self.assertIn(("ProfilesKept", 1), observer.counts)
+
+    def test_discards_fast_invocation(self):
+        stream = StringIO.StringIO()
+        observer = CountingObserver()
+        handler = self.make_handler(Profiler(sample_rate=1, latency_threshold=10, stream=stream), observer)
+        with mock.patch.object(Responder, "_upload_response_data"):
+            handler(self.event, None)
+
+        self.assertEqual(stream.getvalue(), "")
+        self.assertNotIn("ProfilesKept", [name for name, _ in observer.counts])
+
+    def test_memory_threshold(self):
+        profiler = Profiler(latency_threshold=10, memory_threshold=1024)
+        self.assertFalse(profiler.should_keep(1, 100))
+        self.assertFalse(profiler.should_keep(1, None))
+        self.assertTrue(profiler.should_keep(1, 2048))
+        self.assertTrue(profiler.should_keep(11, 100))
+        self.assertTrue(Profiler().should_keep(0, 0))
+
+    def test_sample_rate(self):
+        profiler = Profiler(sample_rate=0.25)
+        with mock.patch("random.random", return_value=0.3):
+            self.assertIsNone(profiler.start(self.event))
+        with mock.patch("random.random", return_value=0.2):
+            capture = profiler.start(self.event)
+        self.assertIsNotNone(capture)
+        capture.profiler.latency_threshold = 10
+        self.assertFalse(capture.finish())
+
+    def test_unsampled_invocation(self):
+        stream = StringIO.StringIO()
+        profiler = Profiler(sample_rate=0, stream=stream)
+        handler = self.make_handler(profiler)
+        with mock.patch.object(Responder, "_upload_response_data"), \
+                mock.patch("cProfile.Profile") as profile:
+            handler(self.event, None)
+
+        self.assertEqual(profile.mock_calls, [])
+        self.assertEqual(stream.getvalue(), "")
+
+    def test_saves_pstats_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        stream = StringIO.StringIO()
+        handler = self.make_handler(Profiler(sample_rate=1, stream=stream, directory=os.path.join(directory, "profiles")))
+        with mock.patch.object(Responder, "_upload_response_data"):
+            handler(self.event, None)
+
+        path = json.loads(stream.getvalue())["Profile"]["Path"]
+        self.assertEqual(path, os.path.join(directory, "profiles", "2.pstats"))
+        output = StringIO.StringIO()
+        pstats.Stats(path, stream=output).print_stats()
+        self.assertIn("slow_function", output.getvalue())
+
+    def test_profiler_failing_to_start(self):
+        profiler = Profiler(sample_rate=1)
+        handler = self.make_handler(profiler)
+        with mock.patch.object(Profiler, "start", side_effect=RuntimeError("No tracemalloc")), \
+                mock.patch.object(Responder, "_upload_response_data") as upload:
+            handler(self.event, None)
+
+        (_, (url, data), _), = upload.mock_calls
+        self.assertEqual(json.loads(data)["Status"], "SUCCESS")
@@ -0,0 +1,229 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler
+from custom_resource.ratelimit import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, MemoryBackend, RateLimitTimeout,
+    SQLiteBackend, ThrottledError, TokenBucket, is_throttling_error
+)
+from custom_resource.retry import RetryPolicy
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super(ClientError, self).__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+class Context(object):
+    def __init__(self, remaining_millis):
+        self.remaining_millis = remaining_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis
+
+class Handler(BaseHandler):
+    THROTTLE_RETRY_POLICY = RetryPolicy(max_attempts=4, deadline_margin=0)
+
+    def create(self, event, context):
+        pass
+
+    def update(self, event, context):
+        pass
+
+    def delete(self, event, context):
+        pass
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket("test", rate=100, burst=5, backend=MemoryBackend())
+        for _ in range(5):
+            self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.01, delta=0.005)
+
+        started = time.time()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreater(time.time() - started, 0.03)
+
+    def test_deadline(self):
+        bucket = TokenBucket("test", rate=1, backend=MemoryBackend())
+        bucket.acquire()
+        with self.assertRaisesRegexp(RateLimitTimeout, "Rate limit 'test' exceeded"):
+            bucket.acquire(deadline=time.time() + 0.1)
+
+    def test_concurrent_callers_share_tokens(self):
+        bucket = TokenBucket("test", rate=50, burst=1, backend=MemoryBackend())
+        threads = [threading.Thread(target=bucket.acquire) for _ in range(10)]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreater(time.time() - started, 0.15)
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.1, backend=MemoryBackend())
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertGreater(breaker.try_acquire(), 0)
+
+        with self.assertRaisesRegexp(CircuitOpenError, "Circuit 'test' is open"):
+            breaker.acquire(deadline=time.time() + 0.01)
+
+    def test_half_open_trial(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05, backend=MemoryBackend())
+        breaker.record_failure()
+        breaker.acquire()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # Only one trial call at a time.
+        self.assertGreater(breaker.try_acquire(), 0)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        breaker.acquire()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_abandoned_trial_expires(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, backend=MemoryBackend())
+        with mock.patch("time.time", return_value=1000):
+            breaker.record_failure()
+        with mock.patch("time.time", return_value=1010):
+            self.assertTrue(breaker.acquire())
+        # The trial caller never records an outcome.
+        with mock.patch("time.time", return_value=1015):
+            self.assertEqual(breaker.try_acquire(), 5)
+        with mock.patch("time.time", return_value=1020):
+            self.assertTrue(breaker.acquire())
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+    def test_released_trial(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, backend=MemoryBackend())
+        with mock.patch("time.time", return_value=1000):
+            breaker.record_failure()
+            breaker.release()
+            self.assertEqual(breaker.state, OPEN)
+        with mock.patch("time.time", return_value=1010):
+            self.assertTrue(breaker.acquire())
+            breaker.release()
+            self.assertEqual(breaker.state, OPEN)
+            self.assertTrue(breaker.acquire())
+            breaker.record_success()
+        self.assertFalse(breaker.acquire())
+
+class SQLiteBackendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "ratelimit.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_shared_between_instances(self):
+        first = CircuitBreaker("test", failure_threshold=1, backend=SQLiteBackend(self.path))
+        second = CircuitBreaker("test", failure_threshold=1, backend=SQLiteBackend(self.path))
+        first.record_failure()
+        self.assertEqual(second.state, OPEN)
+
+        bucket = TokenBucket("test", rate=1, backend=SQLiteBackend(self.path))
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(TokenBucket("test", rate=1, backend=SQLiteBackend(self.path)).try_acquire(), 0)
+
+class GuardedCallTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sleep_mock = mock.patch.object(RetryPolicy, "sleep")
+        self.sleep = self.sleep_mock.start()
+
+    def tearDown(self):
+        self.sleep_mock.stop()
+
+    def test_is_throttling_error(self):
+        self.assertTrue(is_throttling_error(ThrottledError()))
+        self.assertTrue(is_throttling_error(ClientError("ThrottlingException")))
+        self.assertFalse(is_throttling_error(ClientError("AccessDenied")))
+        self.assertFalse(is_throttling_error(ValueError()))
+
+    def test_retries_throttling(self):
+        function = mock.Mock(side_effect=[ClientError("Throttling"), ThrottledError(), "result"])
+        self.assertEqual(Handler().guarded_call(Context(60000), function, 1, key="value"), "result")
+        self.assertEqual(function.call_count, 3)
+        function.assert_called_with(1, key="value")
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_other_errors_not_retried(self):
+        function = mock.Mock(side_effect=ValueError("Bad"))
+        with self.assertRaisesRegexp(ValueError, "Bad"):
+            Handler().guarded_call(None, function)
+        self.assertEqual(function.call_count, 1)
+
+    def test_gives_up_after_max_attempts(self):
+        function = mock.Mock(side_effect=ThrottledError("Slow down"))
+        with self.assertRaisesRegexp(ThrottledError, "Slow down"):
+            Handler().guarded_call(None, function)
+        self.assertEqual(function.call_count, 4)
+
+    def test_gives_up_before_deadline(self):
+        function = mock.Mock(side_effect=ThrottledError("Slow down"))
+        with mock.patch("random.uniform", return_value=10):
+            with self.assertRaises(ThrottledError):
+                Handler().guarded_call(Context(5000), function)
+        self.assertEqual(function.call_count, 1)
+
+    def test_circuit_breaker_and_rate_limiter(self):
+        backend = MemoryBackend()
+        handler = Handler()
+        handler.CIRCUIT_BREAKER = CircuitBreaker("api", failure_threshold=2, reset_timeout=0.05, backend=backend)
+        handler.RATE_LIMITER = TokenBucket("api", rate=1000, backend=backend)
+
+        function = mock.Mock(side_effect=[ThrottledError(), ThrottledError(), "result"])
+        started = time.time()
+        self.assertEqual(handler.guarded_call(None, function), "result")
+        # The third call waited for the circuit to half-open.
+        self.assertGreater(time.time() - started, 0.04)
+        self.assertEqual(handler.CIRCUIT_BREAKER.state, CLOSED)
+
+    def test_open_circuit_until_deadline(self):
+        handler = Handler()
+        handler.CIRCUIT_BREAKER = CircuitBreaker("api", failure_threshold=1, reset_timeout=60, backend=MemoryBackend())
+        handler.CIRCUIT_BREAKER.record_failure()
+
+        function = mock.Mock()
+        with self.assertRaises(CircuitOpenError):
+            handler.guarded_call(Context(1000), function)
+        function.assert_not_called()
+
+    def test_rate_limit_timeout_leaves_trial(self):
+        backend = MemoryBackend()
+        handler = Handler()
+        handler.CIRCUIT_BREAKER = CircuitBreaker("api", failure_threshold=1, reset_timeout=0, backend=backend)
+        handler.CIRCUIT_BREAKER.record_failure()
+        handler.RATE_LIMITER = TokenBucket("api", rate=0.001, burst=1, backend=backend)
+        handler.RATE_LIMITER.acquire()
+
+        function = mock.Mock()
+        with self.assertRaises(RateLimitTimeout):
+            handler.guarded_call(Context(1000), function)
+        function.assert_not_called()
+        self.assertEqual(handler.CIRCUIT_BREAKER.state, OPEN)
+
+    def test_interrupted_trial_released(self):
+        handler = Handler()
+        handler.CIRCUIT_BREAKER = CircuitBreaker("api", failure_threshold=1, reset_timeout=60, backend=MemoryBackend())
+        with mock.patch("time.time", return_value=1000):
+            handler.CIRCUIT_BREAKER.record_failure()
+
+        with mock.patch("time.time", return_value=1060):
+            with self.assertRaises(KeyboardInterrupt):
+                handler.guarded_call(None, mock.Mock(side_effect=KeyboardInterrupt))
+            self.assertEqual(handler.CIRCUIT_BREAKER.state, OPEN)
+            self.assertEqual(handler.CIRCUIT_BREAKER.try_acquire(), 0)
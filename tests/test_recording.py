@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Defer, Responder
+from custom_resource.recording import JSONLinesRecorder, read_recordings, redact_event, redact_response
+
+class TestCase(unittest.TestCase):
+    def test_redact_event(self):
+        event = {
+            "RequestType": "Update",
+            "ResponseURL": "https://secret",
+            "ResourceProperties": {"ServiceToken": "arn", "Password": "hunter2", "Nested": {"List": ["ab", 1]}},
+            "OldResourceProperties": {"Password": "old"}
+        }
+        self.assertEqual(redact_event(event, keep_properties=["ServiceToken"]), {
+            "RequestType": "Update",
+            "ResourceProperties": {"ServiceToken": "arn", "Password": "*******", "Nested": {"List": ["**", 1]}},
+            "OldResourceProperties": {"Password": "***"}
+        })
+        self.assertIn("ResponseURL", event)
+
+    def test_records_requests(self):
+        stream = StringIO.StringIO()
+        class Handler(BaseHandler):
+            RECORDER = JSONLinesRecorder(stream=stream, keep_properties=["Name"], keep_data=["Name"])
+
+            def create(self, event, context):
+                return "PhysicalResourceId", {"Name": event["ResourceProperties"]["Name"], "Password": "secret"}
+
+            def update(self, event, context):
+                return Defer()
+
+            def delete(self, event, context):
+                pass
+
+        event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response",
+            "ResourceProperties": {"Name": "thing", "Secret": "value"}
+        }
+        with mock.patch.object(Responder, "_upload_response_data"):
+            Handler()(event, None)
+            Handler()(dict(event, RequestType="Update", PhysicalResourceId="PhysicalResourceId"), None)
+
+        created, updated = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(created["event"]["ResourceProperties"], {"Name": "thing", "Secret": "*****"})
+        self.assertNotIn("ResponseURL", created["event"])
+        self.assertEqual(created["response"], {
+            "Status": "SUCCESS",
+            "PhysicalResourceId": "PhysicalResourceId",
+            "Data": {"Name": "thing", "Password": "******"}
+        })
+        self.assertEqual(created["redaction"], {"keep_data": ["Name"], "keep_reason": False})
+        self.assertEqual(
+            sorted(created["timings_ms"]),
+            ["Coercion", "Dispatch", "Request", "Serialization", "Upload"]
+        )
+        self.assertEqual(created["counts"]["UploadAttempts"], 0)
+        self.assertIsNone(updated["response"])
+
+    def test_redact_response(self):
+        response = {"Status": "FAILED", "PhysicalResourceId": "1", "Reason": "Bad key abc", "Data": {"Id": "x", "Key": "abc"}}
+        self.assertEqual(redact_response(response, keep_data=["Id"]), {
+            "Status": "FAILED",
+            "PhysicalResourceId": "1",
+            "Reason": "***********",
+            "Data": {"Id": "x", "Key": "***"}
+        })
+        self.assertEqual(redact_response(response, keep_reason=True)["Reason"], "Bad key abc")
+        self.assertIsNone(redact_response(None))
+
+    def test_read_recordings(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "recordings.jsonl")
+            with open(path, "w") as f:
+                f.write("START RequestId: 1\n")
+                f.write(json.dumps({"event": {}, "timings_ms": {}, "response": None}) + "\n")
+                f.write("{not json\n")
+                f.write(json.dumps({"_aws": {}}) + "\n")
+            self.assertEqual(read_recordings(path), [{"event": {}, "timings_ms": {}, "response": None}])
+        finally:
+            shutil.rmtree(directory)
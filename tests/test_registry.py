@@ -0,0 +1,117 @@
+import threading
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder
+from custom_resource.instrumentation import InMemoryCollector
+from custom_resource.registry import Registry, Resource
+
+class ConnectionError(Exception):
+    pass
+
+class TestCase(unittest.TestCase):
+    def test_created_on_first_use(self):
+        factory = mock.Mock(side_effect=lambda: object())
+        registry = Registry({"Client": factory})
+        factory.assert_not_called()
+
+        client = registry["Client"]
+        self.assertIs(registry.get("Client"), client)
+        factory.assert_called_once_with()
+        self.assertIn("Client", registry)
+        self.assertNotIn("Other", registry)
+        with self.assertRaises(KeyError):
+            registry.get("Other")
+
+    def test_created_once_by_concurrent_callers(self):
+        def factory():
+            time.sleep(0.05)
+            return object()
+        factory = mock.Mock(side_effect=factory)
+        registry = Registry({"Client": factory})
+
+        threads = [threading.Thread(target=registry.get, args=("Client",)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(factory.call_count, 1)
+
+    def test_invalidate(self):
+        registry = Registry({"Client": object})
+        client = registry["Client"]
+        registry.invalidate("Client")
+        self.assertIsNot(registry["Client"], client)
+
+    def test_health_check(self):
+        health_check = mock.Mock(return_value=True)
+        registry = Registry({"Client": Resource(object, health_check=health_check, health_check_interval=0)})
+        client = registry["Client"]
+        health_check.assert_not_called()
+
+        self.assertIs(registry["Client"], client)
+        health_check.assert_called_once_with(client)
+
+        health_check.return_value = False
+        self.assertIsNot(registry["Client"], client)
+
+        client = registry["Client"]
+        health_check.side_effect = ConnectionError()
+        self.assertIsNot(registry["Client"], client)
+
+    def test_health_check_interval(self):
+        health_check = mock.Mock(return_value=True)
+        registry = Registry({"Client": Resource(object, health_check=health_check, health_check_interval=60)})
+        registry["Client"]
+        registry["Client"]
+        health_check.assert_not_called()
+
+    def test_using_invalidates_on_failure(self):
+        registry = Registry({"Client": Resource(object, invalidate_on=(ConnectionError,))})
+
+        with registry.using("Client") as client:
+            pass
+        self.assertIs(registry["Client"], client)
+
+        with self.assertRaises(ValueError):
+            with registry.using("Client"):
+                raise ValueError()
+        self.assertIs(registry["Client"], client)
+
+        with self.assertRaises(ConnectionError):
+            with registry.using("Client"):
+                raise ConnectionError()
+        self.assertIsNot(registry["Client"], client)
+
+    def test_init_timings_reported(self):
+        collector = InMemoryCollector()
+        class Handler(BaseHandler):
+            OBSERVERS = [collector]
+            RESOURCES = {"Client": object}
+
+            def create(self, event, context):
+                self.resources["Client"]
+                return "PhysicalResourceId"
+
+            def update(self, event, context):
+                pass
+
+            def delete(self, event, context):
+                pass
+
+        handler = Handler()
+        event = {
+            "RequestType": "Create",
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        with mock.patch.object(Responder, "_upload_response_data"):
+            handler(event, None)
+            handler(event, None)
+
+        self.assertEqual(len(collector.timings["InitClient"]), 1)
+        self.assertEqual(len(collector.timings["Request"]), 2)
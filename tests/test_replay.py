@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler
+from custom_resource.replay import compare_responses, main, replay, summarize
+
+class Handler(BaseHandler):
+    def create(self, event, context):
+        return event["LogicalResourceId"], {"Name": event["ResourceProperties"]["Name"]}
+
+    def update(self, event, context):
+        return event["PhysicalResourceId"]
+
+    def delete(self, event, context):
+        raise RuntimeError("Can't delete")
+
+handler = Handler()
+
+def recording(request_type, response, request_ms=100.0):
+    event = {
+        "RequestType": request_type,
+        "StackId": "1",
+        "RequestId": request_type,
+        "LogicalResourceId": "Resource",
+        "ResourceProperties": {"Name": "thing"}
+    }
+    if request_type != "Create":
+        event["PhysicalResourceId"] = "Resource"
+    return {"event": event, "response": response, "timings_ms": {"Request": request_ms}, "counts": {}}
+
+RECORDINGS = [
+    recording("Create", {"Status": "SUCCESS", "PhysicalResourceId": "Resource", "Data": {"Name": "thing"}}),
+    recording("Update", {"Status": "SUCCESS", "PhysicalResourceId": "Resource", "Data": {"Name": "thing"}}),
+    recording("Delete", {"Status": "SUCCESS", "PhysicalResourceId": "Resource", "Data": {}})
+]
+
+class TestCase(unittest.TestCase):
+    def test_compare_responses(self):
+        success = {"Status": "SUCCESS", "PhysicalResourceId": "1", "Data": {"A": "1", "B": "2"}}
+        self.assertEqual(compare_responses(success, dict(success)), [])
+        self.assertEqual(compare_responses(None, None), [])
+        self.assertEqual(compare_responses(success, None), ["Response: recorded SUCCESS, replayed no response"])
+        self.assertEqual(
+            compare_responses(success, dict(success, PhysicalResourceId="2", Data={"A": "1", "C": "3"})),
+            ["PhysicalResourceId: recorded '1', replayed '2'", "Data.B differs", "Data.C differs"]
+        )
+
+    def test_replay(self):
+        results = replay(handler, RECORDINGS, workers=3)
+        self.assertEqual([result["request_id"] for result in results], ["Create", "Update", "Delete"])
+
+        create, update, delete = results
+        self.assertEqual(create["differences"], [])
+        self.assertEqual(create["recorded_ms"], 100.0)
+        self.assertIsNotNone(create["replayed_ms"])
+        self.assertEqual(update["differences"], ["Data.Name differs"])
+        self.assertEqual(delete["differences"][0], "Status: recorded 'SUCCESS', replayed u'FAILED'")
+        self.assertIn("Can't delete", delete["error"])
+
+        summary = summarize(results)
+        self.assertEqual(summary["requests"], 3)
+        self.assertEqual(summary["differing"], 2)
+        self.assertFalse(summary["latency_regressed"])
+
+    def test_replay_redacts_like_recording(self):
+        recorded = dict(
+            recording("Create", {"Status": "SUCCESS", "PhysicalResourceId": "Resource", "Data": {"Name": "*****"}}),
+            redaction={"keep_data": [], "keep_reason": False}
+        )
+        result, = replay(handler, [recorded])
+        self.assertEqual(result["replayed"]["Data"], {"Name": "*****"})
+        self.assertEqual(result["differences"], [])
+
+    def test_latency_regression(self):
+        results = [{"recorded_ms": 10.0, "replayed_ms": 13.0, "differences": []}]
+        self.assertTrue(summarize(results, threshold=0.2)["latency_regressed"])
+        self.assertFalse(summarize(results, threshold=0.5)["latency_regressed"])
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "recordings.jsonl")
+            with open(path, "w") as f:
+                f.write(json.dumps(RECORDINGS[0]) + "\n")
+            output_path = os.path.join(directory, "report.json")
+            with mock.patch("sys.stdout", new_callable=StringIO.StringIO) as stdout:
+                self.assertEqual(main(["tests.test_replay.handler", path, "--threshold", "1000", "--output", output_path]), 0)
+            with open(output_path) as f:
+                self.assertEqual(json.load(f)["summary"]["requests"], 1)
+            self.assertIn("1 requests replayed, 0 with different responses", stdout.getvalue())
+            self.assertIn("recorded latency: p50 100.00ms", stdout.getvalue())
+        finally:
+            shutil.rmtree(directory)
@@ -3,7 +3,7 @@ import unittest
 
 import mock
 
-from custom_resource import Responder
+from custom_resource import MAX_RESPONSE_BYTES, OVERSIZE_OFFLOAD, Failed, Responder
 
 class TestCase(unittest.TestCase):
     def setUp(self):
@@ -11,7 +11,7 @@ class TestCase(unittest.TestCase):
         self.upload_response_data_mock.start()
 
     def tearDown(self):
-        self.upload_response_data_mock.start()
+        self.upload_response_data_mock.stop()
 
     def test_success(self):
         event = {
@@ -166,3 +166,68 @@ class TestCase(unittest.TestCase):
             "Reason": "Something happened"
         })
         self.assertEqual(kwargs, {})
+
+    def test_oversized_response_fails(self):
+        event = {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        responder = Responder(event)
+        responder.success(physical_resource_id="123", data={"Key": "x" * 5000})
+
+        (_, (url, data), kwargs), = responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(data)["Status"], "FAILED")
+        self.assertRegexpMatches(json.loads(data)["Reason"], r"^Response is \d+ bytes, over CloudFormation's 4096 byte limit$")
+        self.assertIsInstance(responder.response, Failed)
+
+    def test_response_is_compact(self):
+        event = {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        responder = Responder(event)
+        responder.success(physical_resource_id="123", data={"a": "1"})
+
+        (_, (url, data), kwargs), = responder._upload_response_data.mock_calls
+        self.assertEqual(
+            data,
+            '{"Status":"SUCCESS","PhysicalResourceId":"123","Data":{"a":"1"},"StackId":"1","RequestId":"2","LogicalResourceId":"3"}'
+        )
+
+    def test_oversized_response_offloaded(self):
+        event = {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        data = {"Key{}".format(index): "x" * 100 for index in range(100)}
+        blob_store = mock.Mock()
+        blob_store.put.return_value = "s3://bucket/3/2.json"
+        responder = Responder(event, oversize_strategy=OVERSIZE_OFFLOAD, blob_store=blob_store)
+        responder.success(physical_resource_id="123", data=data)
+
+        (_, (url, body), kwargs), = responder._upload_response_data.mock_calls
+        self.assertEqual(json.loads(body)["Data"], {"DataPointer": "s3://bucket/3/2.json"})
+        (key, stored), _ = blob_store.put.call_args
+        self.assertEqual(key, "3/2.json")
+        self.assertEqual(json.loads(stored), data)
+        self.assertEqual(responder.response.as_dict()["Data"], {"DataPointer": "s3://bucket/3/2.json"})
+
+    def test_long_failure_reason_truncated(self):
+        event = {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        responder = Responder(event)
+        responder.failed(physical_resource_id="123", reason="\n" * 5000)
+
+        (_, (url, data), kwargs), = responder._upload_response_data.mock_calls
+        self.assertLessEqual(len(data), MAX_RESPONSE_BYTES)
+        self.assertTrue(json.loads(data)["Reason"].endswith("\n..."))
@@ -0,0 +1,131 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder
+from custom_resource.instrumentation import InMemoryCollector
+from custom_resource.resultcache import FileResultCache, MemoryResultCache, SQLiteResultCache, result_cache_key
+
+RESPONSE = {"Status": "SUCCESS", "PhysicalResourceId": "ami-123", "Data": {}}
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_result_cache_key(self):
+        event = {"ResourceType": "Custom::Ami", "ResourceProperties": {"ServiceToken": "a", "Name": "x", "Owner": "y"}}
+        key = result_cache_key(event)
+        self.assertEqual(key, result_cache_key({
+            "ResourceType": "Custom::Ami",
+            "ResourceProperties": {"Owner": "y", "Name": "x", "ServiceToken": "b"}
+        }))
+        self.assertNotEqual(key, result_cache_key(dict(event, ResourceType="Custom::Other")))
+        self.assertNotEqual(key, result_cache_key(dict(event, ResourceProperties={"Name": "x"})))
+
+    def test_memory_cache_expiry_and_eviction(self):
+        cache = MemoryResultCache(ttl=0.05, max_size=2)
+        cache.set("a", RESPONSE)
+        self.assertEqual(cache.get("a"), RESPONSE)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("a"))
+
+        cache = MemoryResultCache(max_size=2)
+        cache.set("a", RESPONSE)
+        cache.set("b", RESPONSE)
+        cache.set("c", RESPONSE)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), RESPONSE)
+
+    def test_persistent_backends(self):
+        for backend in [
+            FileResultCache(os.path.join(self.directory, "results")),
+            SQLiteResultCache(os.path.join(self.directory, "results.db"))
+        ]:
+            self.assertIsNone(backend.get("a"))
+            backend.set("a", RESPONSE)
+            self.assertEqual(backend.get("a"), RESPONSE)
+
+            # A new container finds results in the backend.
+            cache = MemoryResultCache(backend=backend)
+            self.assertEqual(cache.get("a"), RESPONSE)
+            cache.set("b", RESPONSE)
+            self.assertEqual(backend.get("b"), RESPONSE)
+
+            backend.ttl = -1
+            backend.set("c", RESPONSE)
+            self.assertIsNone(backend.get("c"))
+
+    def test_handler_returns_cached_success(self):
+        collector = InMemoryCollector()
+        lookups = []
+        class Handler(BaseHandler):
+            RESULT_CACHE = MemoryResultCache()
+            OBSERVERS = [collector]
+
+            def create(self, event, context):
+                lookups.append(event)
+                if event["ResourceProperties"]["Name"] == "missing":
+                    raise ValueError("Not found")
+                return "ami-" + event["ResourceProperties"]["Name"]
+
+            def update(self, event, context):
+                return self.create(event, context)
+
+            def delete(self, event, context):
+                lookups.append(event)
+                return event["PhysicalResourceId"]
+
+        handler = Handler()
+        def invoke(request_type, name):
+            event = {
+                "RequestType": request_type,
+                "StackId": "1",
+                "RequestId": "2",
+                "LogicalResourceId": "3",
+                "ResponseURL": "http://response",
+                "ResourceProperties": {"ServiceToken": "arn", "Name": name}
+            }
+            if request_type != "Create":
+                event["PhysicalResourceId"] = "ami-old"
+            with mock.patch.object(Responder, "_upload_response_data") as upload_response_data:
+                try:
+                    handler(event, None)
+                except ValueError:
+                    pass
+            (_, (url, data), kwargs), = upload_response_data.mock_calls
+            return json.loads(data)
+
+        self.assertEqual(invoke("Create", "a"), {
+            "Status": "SUCCESS", "StackId": "1", "RequestId": "2", "LogicalResourceId": "3",
+            "PhysicalResourceId": "ami-a", "Data": {}
+        })
+        # Cached Data is re-sent with the resource's own physical ID.
+        self.assertEqual(invoke("Update", "a")["PhysicalResourceId"], "ami-old")
+        self.assertEqual(len(lookups), 1)
+
+        invoke("Delete", "a")
+        self.assertEqual(len(lookups), 2)
+
+        # Another resource gets a physical ID of its own.
+        created = invoke("Create", "a")
+        self.assertEqual(created["Status"], "SUCCESS")
+        self.assertRegexpMatches(created["PhysicalResourceId"], "^3-[0-9a-f]{12}$")
+        self.assertEqual(len(lookups), 2)
+
+        self.assertEqual(invoke("Create", "missing")["Status"], "FAILED")
+        self.assertEqual(invoke("Create", "missing")["Status"], "FAILED")
+        self.assertEqual(len(lookups), 4)
+        self.assertEqual(collector.counts["ResultCacheHits"], [0, 1, 1, 0, 0])
+
+    def test_memory_cache_ttl_applies_to_backend(self):
+        backend = SQLiteResultCache(os.path.join(self.directory, "results.db"), ttl=3600)
+        MemoryResultCache(ttl=-1, backend=backend).set("a", RESPONSE)
+        self.assertIsNone(backend.get("a"))
@@ -0,0 +1,119 @@
+import socket
+import time
+import unittest
+
+import mock
+
+from custom_resource import Responder, ResponseUploadError
+from custom_resource.retry import RetryPolicy
+from custom_resource.transport import RequestsTransport, TransportError, UrllibTransport
+
+class ScriptedTransport(object):
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def put(self, url, data, timeout=None):
+        self.calls.append((url, data))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class Context(object):
+    def __init__(self, remaining_millis):
+        self.remaining_millis = remaining_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.sleep_mock = mock.patch.object(RetryPolicy, "sleep")
+        self.sleep = self.sleep_mock.start()
+
+    def tearDown(self):
+        self.sleep_mock.stop()
+
+    def test_retries_server_errors_throttling_and_connection_errors(self):
+        transport = ScriptedTransport(500, 429, TransportError("Connection reset"), 200)
+        responder = self.responder(transport)
+        responder.success("123")
+
+        self.assertEqual(len(transport.calls), 4)
+        self.assertEqual(
+            [(attempt.number, attempt.status_code) for attempt in responder.upload_attempts],
+            [(1, 500), (2, 429), (3, None), (4, 200)]
+        )
+        self.assertIsInstance(responder.upload_attempts[2].error, TransportError)
+        self.assertEqual(self.sleep.call_count, 3)
+
+    def test_client_errors_not_retried(self):
+        transport = ScriptedTransport(403)
+        responder = self.responder(transport)
+
+        with self.assertRaisesRegexp(ResponseUploadError, "Expected HTTP 200, but received 403 from http://response"):
+            responder.success("123")
+        self.assertEqual(len(responder.upload_attempts), 1)
+        self.sleep.assert_not_called()
+
+    def test_max_attempts(self):
+        transport = ScriptedTransport(503, 503, 503)
+        responder = self.responder(transport, retry_policy=RetryPolicy(max_attempts=3))
+
+        with self.assertRaisesRegexp(ResponseUploadError, "received 503"):
+            responder.success("123")
+        self.assertEqual(len(responder.upload_attempts), 3)
+
+    def test_stops_before_deadline(self):
+        transport = ScriptedTransport(TransportError("Timed out"), 200)
+        policy = RetryPolicy(base_delay=10, max_delay=10, deadline_margin=1)
+        responder = self.responder(transport, retry_policy=policy, context=Context(remaining_millis=1500))
+
+        with mock.patch("random.uniform", return_value=1.0):
+            with self.assertRaisesRegexp(ResponseUploadError, "Couldn't upload response to http://response: Timed out"):
+                responder.success("123")
+        self.assertEqual(len(responder.upload_attempts), 1)
+
+    def test_attempts_end_before_deadline(self):
+        # Accepts connections, but never responds.
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        self.addCleanup(listener.close)
+        url = "http://127.0.0.1:{}/".format(listener.getsockname()[1])
+
+        for transport in [RequestsTransport(), UrllibTransport()]:
+            policy = RetryPolicy(deadline_margin=0.5)
+            responder = Responder(
+                {"StackId": "1", "RequestId": "2", "LogicalResourceId": "3", "ResponseURL": url},
+                Context(remaining_millis=700), transport=transport, retry_policy=policy
+            )
+            started = time.time()
+            with self.assertRaises(ResponseUploadError):
+                responder.success("123")
+            # Well within the 10 second read timeout, and the 0.7 seconds left.
+            self.assertLess(time.time() - started, 0.7)
+
+    def test_no_attempt_without_time_left(self):
+        transport = ScriptedTransport(200)
+        responder = self.responder(transport, context=Context(remaining_millis=400))
+        with self.assertRaisesRegexp(ResponseUploadError, "No time left"):
+            responder.success("123")
+        self.assertEqual(transport.calls, [])
+
+    def test_delay_is_jittered_and_capped(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=3)
+        for number, cap in [(1, 0.5), (2, 1), (3, 2), (4, 3), (10, 3)]:
+            with mock.patch("random.uniform", return_value=cap) as uniform:
+                self.assertEqual(policy.get_delay(number), cap)
+            uniform.assert_called_once_with(0, cap)
+
+    def responder(self, transport, retry_policy=None, context=None):
+        event = {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3",
+            "ResponseURL": "http://response"
+        }
+        return Responder(event, context, transport=transport, retry_policy=retry_policy)
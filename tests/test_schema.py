@@ -0,0 +1,73 @@
+import unittest
+
+import jsonschema
+
+from custom_resource.schema import SchemaValidator, compile_schema
+
+class TestCase(unittest.TestCase):
+    def test_invalid_schema(self):
+        with self.assertRaises(jsonschema.SchemaError):
+            SchemaValidator({"type": 123})
+
+    def test_compiled_matches_jsonschema(self):
+        schema = {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["Name", "Port"],
+            "properties": {
+                "ServiceToken": {"type": "string"},
+                "Name": {"type": "string", "minLength": 1, "maxLength": 8, "pattern": "^[a-z]+$"},
+                "Port": {"type": ["integer", "string"], "minimum": 1, "maximum": 65535},
+                "Tags": {"type": "array", "items": {"type": "string"}, "maxItems": 2},
+                "Mode": {"enum": ["fast", "slow", True]},
+                "Ratio": {"type": "number", "minimum": 0, "exclusiveMinimum": True},
+                "Extra": {"anyOf": [{"type": "null"}, {"type": "object", "maxProperties": 1}]},
+                "Other": {"not": {"type": "boolean"}}
+            }
+        }
+        instances = [
+            {"Name": "abc", "Port": 80},
+            {"Name": "abc", "Port": "80", "ServiceToken": "arn"},
+            {"Name": "abc"},
+            {"Name": "", "Port": 80},
+            {"Name": "abcdefghi", "Port": 80},
+            {"Name": "ABC", "Port": 80},
+            {"Name": "abc", "Port": 0},
+            {"Name": "abc", "Port": True},
+            {"Name": "abc", "Port": 1.5},
+            {"Name": "abc", "Port": 80, "Tags": ["a", "b"]},
+            {"Name": "abc", "Port": 80, "Tags": ["a", "b", "c"]},
+            {"Name": "abc", "Port": 80, "Tags": ["a", 1]},
+            {"Name": "abc", "Port": 80, "Mode": "fast"},
+            {"Name": "abc", "Port": 80, "Mode": True},
+            {"Name": "abc", "Port": 80, "Mode": 1},
+            {"Name": "abc", "Port": 80, "Ratio": 0},
+            {"Name": "abc", "Port": 80, "Ratio": 0.1},
+            {"Name": "abc", "Port": 80, "Extra": None},
+            {"Name": "abc", "Port": 80, "Extra": {"a": 1, "b": 2}},
+            {"Name": "abc", "Port": 80, "Other": False},
+            {"Name": "abc", "Port": 80, "Unknown": "x"},
+            []
+        ]
+
+        is_valid = compile_schema(schema)
+        reference = jsonschema.Draft4Validator(schema)
+        for instance in instances:
+            self.assertEqual(is_valid(instance), reference.is_valid(instance), instance)
+
+    def test_unsupported_keyword_falls_back(self):
+        schema = {"properties": {"A": {"$ref": "#/definitions/a"}}, "definitions": {"a": {"type": "string"}}}
+        self.assertIsNone(compile_schema(schema))
+
+        validator = SchemaValidator(schema, compiled=True)
+        self.assertFalse(validator.compiled)
+        validator.validate({"A": "x"})
+        with self.assertRaises(jsonschema.ValidationError):
+            validator.validate({"A": 1})
+
+    def test_compiled_validator_raises_detailed_error(self):
+        validator = SchemaValidator({"required": ["A"]}, compiled=True)
+        self.assertTrue(validator.compiled)
+        validator.validate({"A": "x"})
+        with self.assertRaisesRegexp(jsonschema.ValidationError, "'A' is a required property"):
+            validator.validate({})
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder
+
+def sns_event(*requests):
+    return {
+        "Records": [
+            {
+                "EventSource": "aws:sns",
+                "Sns": {
+                    "MessageId": "message-{}".format(index),
+                    "Message": request if isinstance(request, basestring) else json.dumps(request)
+                }
+            }
+            for index, request in enumerate(requests)
+        ]
+    }
+
+def request(request_id):
+    return {
+        "RequestType": "Create",
+        "StackId": "1",
+        "RequestId": request_id,
+        "LogicalResourceId": "Resource" + request_id,
+        "ResponseURL": "http://response/" + request_id,
+        "ResourceProperties": {"Delay": "0.2"}
+    }
+
+class Handler(BaseHandler):
+    def create(self, event, context):
+        if event["RequestId"] == "broken":
+            raise Exception("Couldn't create")
+        time.sleep(float(event["ResourceProperties"]["Delay"]))
+        return event["LogicalResourceId"]
+
+    update = None
+    delete = None
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.uploads = {}
+        def upload(responder, url, data):
+            with self.lock:
+                self.uploads[url] = json.loads(data)
+        self.upload_response_data_mock = mock.patch.object(Responder, "_upload_response_data", upload)
+        self.upload_response_data_mock.start()
+
+    def tearDown(self):
+        self.upload_response_data_mock.stop()
+
+    def test_records_handled_concurrently(self):
+        started = time.time()
+        Handler()(sns_event(request("1"), request("2"), request("3")), None)
+        self.assertLess(time.time() - started, 0.5)
+
+        self.assertEqual(sorted(self.uploads), ["http://response/1", "http://response/2", "http://response/3"])
+        for url, response in self.uploads.iteritems():
+            self.assertEqual(response["Status"], "SUCCESS")
+            self.assertEqual(response["PhysicalResourceId"], "Resource" + url[-1])
+
+    def test_failure_isolated(self):
+        with mock.patch("custom_resource.logger") as logger:
+            Handler()(sns_event(request("1"), request("broken"), "not json", request("2")), None)
+
+        self.assertEqual(self.uploads["http://response/1"]["Status"], "SUCCESS")
+        self.assertEqual(self.uploads["http://response/2"]["Status"], "SUCCESS")
+        self.assertEqual(self.uploads["http://response/broken"]["Status"], "FAILED")
+        self.assertEqual(self.uploads["http://response/broken"]["Reason"], "Couldn't create")
+        self.assertEqual(logger.exception.call_count, 1)
+        self.assertEqual(logger.error.call_count, 1)
+
+    def test_worker_limit(self):
+        handler = Handler()
+        handler.SNS_MAX_WORKERS = 1
+
+        started = time.time()
+        handler(sns_event(request("1"), request("2")), None)
+        self.assertGreaterEqual(time.time() - started, 0.4)
+        self.assertEqual(len(self.uploads), 2)
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder, ResponseUploadError
+from custom_resource.testing import LocalQueue
+
+def request(request_id, delay=0):
+    return {
+        "RequestType": "Create",
+        "StackId": "1",
+        "RequestId": request_id,
+        "LogicalResourceId": "Resource" + request_id,
+        "ResponseURL": "http://response/" + request_id,
+        "ResourceProperties": {"Delay": str(delay)}
+    }
+
+class Handler(BaseHandler):
+    def create(self, event, context):
+        if event["RequestId"] == "broken":
+            raise Exception("Couldn't create")
+        time.sleep(float(event["ResourceProperties"]["Delay"]))
+        return event["LogicalResourceId"]
+
+    update = None
+    delete = None
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.uploads = []
+        self.unreachable = set()
+        def upload(responder, url, data):
+            if url in self.unreachable:
+                raise ResponseUploadError("Expected HTTP 200, but received 503 from " + url)
+            with self.lock:
+                self.uploads.append((url, json.loads(data)))
+        self.upload_response_data_mock = mock.patch.object(Responder, "_upload_response_data", upload)
+        self.upload_response_data_mock.start()
+
+    def tearDown(self):
+        self.upload_response_data_mock.stop()
+
+    def test_batch_processed_concurrently(self):
+        queue = LocalQueue()
+        for request_id in "123":
+            queue.send(request(request_id, delay=0.2))
+
+        started = time.time()
+        self.assertEqual(queue.drain(Handler()), 1)
+        self.assertLess(time.time() - started, 0.5)
+
+        self.assertEqual(
+            sorted((url, response["Status"]) for url, response in self.uploads),
+            [("http://response/1", "SUCCESS"), ("http://response/2", "SUCCESS"), ("http://response/3", "SUCCESS")]
+        )
+
+    def test_only_undelivered_responses_redelivered(self):
+        queue = LocalQueue(max_receive_count=2)
+        queue.send(request("1"))
+        broken_id = queue.send(request("broken"))
+        unreachable_id = queue.send(request("unreachable"))
+        malformed_id = queue.send("not json")
+        self.unreachable.add("http://response/unreachable")
+
+        handler = Handler()
+        event = queue.receive()
+        with mock.patch("custom_resource.logger"):
+            result = handler(event, None)
+
+        self.assertEqual(
+            sorted(failure["itemIdentifier"] for failure in result["batchItemFailures"]),
+            sorted([unreachable_id, malformed_id])
+        )
+        self.assertNotIn(broken_id, [failure["itemIdentifier"] for failure in result["batchItemFailures"]])
+        self.assertIn(("http://response/broken", "FAILED"), [(url, response["Status"]) for url, response in self.uploads])
+
+        queue.acknowledge(event, result)
+        self.unreachable.clear()
+        with mock.patch("custom_resource.logger"):
+            queue.drain(handler)
+
+        self.assertEqual(queue.dead_letters, [{"messageId": malformed_id, "body": "not json"}])
+        self.assertIn(("http://response/unreachable", "SUCCESS"), [(url, response["Status"]) for url, response in self.uploads])
+
+    def test_sns_notifications_in_queue(self):
+        queue = LocalQueue()
+        queue.send({"Type": "Notification", "Message": json.dumps(request("1"))})
+        queue.drain(Handler())
+
+        (url, response), = self.uploads
+        self.assertEqual(url, "http://response/1")
+        self.assertEqual(response["Status"], "SUCCESS")
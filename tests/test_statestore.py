@@ -0,0 +1,199 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from custom_resource import BaseHandler, Responder, Success
+from custom_resource.statestore import (
+    STATE_KEY, MemoryStateStore, SQLiteStateStore, StateRecord, StoredState, WriteBehindStateStore
+)
+
+KEY = ("stack", "Resource", "vol-1")
+
+class SlowStore(MemoryStateStore):
+    def __init__(self):
+        super(SlowStore, self).__init__()
+        self.release = threading.Event()
+
+    def put(self, key, data, state):
+        self.release.wait()
+        super(SlowStore, self).put(key, data, state)
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stores(self):
+        for store in [MemoryStateStore(), SQLiteStateStore(os.path.join(self.directory, "state.db"))]:
+            self.assertIsNone(store.get(KEY))
+            store.put(KEY, {"Arn": "arn"}, {"VolumeId": "vol-1"})
+            record = store.get(KEY)
+            self.assertEqual((record.data, record.state), ({"Arn": "arn"}, {"VolumeId": "vol-1"}))
+            store.delete(KEY)
+            self.assertIsNone(store.get(KEY))
+
+    def test_stored_state_loads_lazily(self):
+        store = mock.Mock(wraps=MemoryStateStore())
+        store.put(KEY, {"Arn": "arn"}, None)
+        stored = StoredState(store, KEY)
+        store.get.assert_not_called()
+
+        self.assertTrue(stored)
+        self.assertEqual(stored.data, {"Arn": "arn"})
+        self.assertIsNone(stored.state)
+        store.get.assert_called_once_with(KEY)
+
+        self.assertFalse(StoredState(MemoryStateStore(), KEY))
+
+    def test_write_behind(self):
+        backing = SlowStore()
+        store = WriteBehindStateStore(backing)
+        store.put(KEY, {"Arn": "arn"}, None)
+
+        # Pending writes are visible, but not yet written.
+        self.assertEqual(store.get(KEY).data, {"Arn": "arn"})
+        self.assertIsNone(backing.get(KEY))
+        store.flush(timeout=0.01)
+
+        backing.release.set()
+        store.flush()
+        self.assertEqual(backing.get(KEY).data, {"Arn": "arn"})
+
+        store.delete(KEY)
+        self.assertIsNone(store.get(KEY))
+        store.flush()
+        self.assertIsNone(backing.get(KEY))
+
+    def test_write_behind_errors_raised_on_flush(self):
+        backing = mock.Mock()
+        backing.put.side_effect = IOError("Disk full")
+        store = WriteBehindStateStore(backing)
+        store.put(KEY, {}, None)
+        with self.assertRaisesRegexp(IOError, "Disk full"):
+            store.flush()
+        store.flush()
+
+    def test_handler_stores_and_passes_state(self):
+        received = []
+        class Handler(BaseHandler):
+            STATE_STORE = WriteBehindStateStore(MemoryStateStore())
+            SKIP_UNCHANGED_UPDATES = True
+
+            def create(self, event, context):
+                return Success("vol-1", {"Arn": "arn"}, state={"VolumeId": "vol-1"})
+
+            def update(self, event, context):
+                received.append(event[STATE_KEY].state)
+                return Success("vol-1", {"Arn": "arn2"}, state={"VolumeId": "vol-1", "Size": 2})
+
+            def delete(self, event, context):
+                received.append(event[STATE_KEY].state)
+                return "vol-1"
+
+        def invoke(request_type, **properties):
+            event = {
+                "RequestType": request_type,
+                "StackId": "stack",
+                "RequestId": "request",
+                "LogicalResourceId": "Resource",
+                "ResponseURL": "http://response",
+                "ResourceProperties": properties
+            }
+            if request_type != "Create":
+                event["PhysicalResourceId"] = "vol-1"
+                event["OldResourceProperties"] = {"Size": "1"}
+            # A new container each time, so state comes from the store.
+            with mock.patch.object(Responder, "_upload_response_data"):
+                Handler()(event, None)
+
+        invoke("Create", Size="1")
+        self.assertEqual(Handler.STATE_STORE.get(KEY).data, {"Arn": "arn"})
+
+        invoke("Update", Size="2")
+        self.assertEqual(received, [{"VolumeId": "vol-1"}])
+        self.assertEqual(Handler.STATE_STORE.get(KEY).state, {"VolumeId": "vol-1", "Size": 2})
+
+        # Unchanged updates use Data from the store.
+        event = {"StackId": "stack", "LogicalResourceId": "Resource", "PhysicalResourceId": "vol-1"}
+        self.assertEqual(Handler().get_previous_data(event), {"Arn": "arn2"})
+
+        invoke("Delete")
+        self.assertEqual(received[-1], {"VolumeId": "vol-1", "Size": 2})
+        self.assertIsNone(Handler.STATE_STORE.get(KEY))
+
+    def test_update_without_state_keeps_state(self):
+        deleted = []
+        class Handler(BaseHandler):
+            STATE_STORE = MemoryStateStore()
+
+            def create(self, event, context):
+                return Success("vol-1", {"Arn": "arn"}, state={"VolumeId": "vol-1"})
+
+            def update(self, event, context):
+                return event["PhysicalResourceId"], {"Arn": "arn2"}
+
+            def delete(self, event, context):
+                deleted.append(event[STATE_KEY].state["VolumeId"])
+                return event["PhysicalResourceId"]
+
+        handler = Handler()
+        for request_type in "Create", "Update", "Delete":
+            event = {
+                "RequestType": request_type,
+                "StackId": "stack",
+                "RequestId": request_type,
+                "LogicalResourceId": "Resource",
+                "ResponseURL": "http://response",
+                "ResourceProperties": {}
+            }
+            if request_type != "Create":
+                event["PhysicalResourceId"] = "vol-1"
+            with mock.patch.object(Responder, "_upload_response_data") as upload_response_data:
+                handler(event, None)
+            (_, (url, data), kwargs), = upload_response_data.mock_calls
+            self.assertEqual(json.loads(data)["Status"], "SUCCESS", data)
+            if request_type == "Update":
+                self.assertEqual(Handler.STATE_STORE.get(KEY), StateRecord({"Arn": "arn2"}, {"VolumeId": "vol-1"}, mock.ANY))
+
+        self.assertEqual(deleted, ["vol-1"])
+
+    def test_state_stored_before_response_uploaded(self):
+        calls = []
+        class RecordingStore(MemoryStateStore):
+            def put(self, key, data, state):
+                calls.append("put")
+                super(RecordingStore, self).put(key, data, state)
+
+        for store in [RecordingStore(), WriteBehindStateStore(RecordingStore())]:
+            class Handler(BaseHandler):
+                STATE_STORE = store
+                TRANSPORT = mock.Mock()
+
+                def create(self, event, context):
+                    return Success("vol-1", {"Arn": "arn"}, state={"VolumeId": "vol-1"})
+
+                def update(self, event, context):
+                    pass
+
+                def delete(self, event, context):
+                    pass
+
+            del calls[:]
+            Handler.TRANSPORT.put.side_effect = lambda url, data: calls.append("PUT") or 200
+            Handler()({
+                "RequestType": "Create",
+                "StackId": "stack",
+                "RequestId": "request",
+                "LogicalResourceId": "Resource",
+                "ResponseURL": "http://response",
+                "ResourceProperties": {}
+            }, None)
+            self.assertEqual(calls, ["put", "PUT"])
+            self.assertEqual(store.get(KEY).state, {"VolumeId": "vol-1"})
@@ -0,0 +1,43 @@
+import time
+import unittest
+
+from custom_resource.testing import ResponseServer, summarize_latencies
+from custom_resource.transport import UrllibTransport
+
+class TestCase(unittest.TestCase):
+    def test_error_and_throttle_injection(self):
+        transport = UrllibTransport()
+        with ResponseServer(error_rate=1) as server:
+            self.assertEqual(transport.put(server.url, "body"), 500)
+        with ResponseServer(throttle_rate=1) as server:
+            self.assertEqual(transport.put(server.url, "body"), 429)
+        self.assertEqual(server.bodies, [])
+        self.assertEqual(server.statuses, {429: 1})
+
+    def test_error_rate_is_reproducible(self):
+        statuses = []
+        for _ in range(2):
+            transport = UrllibTransport()
+            with ResponseServer(error_rate=0.3, throttle_rate=0.3, seed=1) as server:
+                for index in range(20):
+                    transport.put(server.url, "body")
+            statuses.append(server.statuses)
+
+        self.assertEqual(statuses[0], statuses[1])
+        self.assertEqual(sorted(statuses[0]), [200, 429, 500])
+
+    def test_latency(self):
+        transport = UrllibTransport()
+        with ResponseServer(latency=0.1) as server:
+            started = time.time()
+            transport.put(server.url, "body")
+        self.assertGreaterEqual(time.time() - started, 0.1)
+
+    def test_summarize_latencies(self):
+        summary = summarize_latencies([0.001 * index for index in range(1, 101)])
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["mean_ms"], 50.5)
+        self.assertAlmostEqual(summary["p50_ms"], 51)
+        self.assertAlmostEqual(summary["p99_ms"], 99)
+        self.assertAlmostEqual(summary["max_ms"], 100)
+        self.assertEqual(summarize_latencies([]), {"count": 0})
@@ -0,0 +1,121 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import unittest
+
+import mock
+
+import custom_resource.transport
+from custom_resource import Responder
+from custom_resource.testing import ResponseServer
+from custom_resource.transport import (
+    RequestsTransport, TransportError, UrllibTransport, get_default_transport
+)
+
+class TestCase(unittest.TestCase):
+    def test_connections_reused(self):
+        transport = RequestsTransport()
+        with ResponseServer() as server:
+            for index in range(3):
+                self.assertEqual(transport.put(server.url, "body {}".format(index)), 200)
+
+        self.assertEqual(server.bodies, ["body 0", "body 1", "body 2"])
+        self.assertEqual(server.connections, 1)
+
+    def test_warm_requests_skip_connection_setup(self):
+        transport = RequestsTransport()
+        with ResponseServer(connect_latency=0.2) as server:
+            timings = []
+            for index in range(3):
+                started = time.time()
+                transport.put(server.url, "body")
+                timings.append(time.time() - started)
+
+        self.assertGreaterEqual(timings[0], 0.2)
+        self.assertLess(max(timings[1:]), 0.2)
+
+    def test_read_timeout(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        try:
+            url = "http://127.0.0.1:{}/".format(listener.getsockname()[1])
+            transport = RequestsTransport(read_timeout=0.1)
+            started = time.time()
+            with self.assertRaises(TransportError):
+                transport.put(url, "body")
+            self.assertLess(time.time() - started, 2)
+        finally:
+            listener.close()
+
+    def test_connection_error(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:{}/".format(listener.getsockname()[1])
+        listener.close()
+
+        with self.assertRaises(TransportError):
+            RequestsTransport().put(url, "body")
+
+    def test_responder_uses_shared_transport(self):
+        event = {
+            "StackId": "1",
+            "RequestId": "2",
+            "LogicalResourceId": "3"
+        }
+        self.assertIs(Responder(event).transport, get_default_transport())
+
+        transport = RequestsTransport()
+        with ResponseServer() as server:
+            event["ResponseURL"] = server.url
+            Responder(event, transport=transport).success("123")
+            Responder(event, transport=transport).failed("123", reason="Broken")
+
+        self.assertEqual([json.loads(body)["Status"] for body in server.bodies], ["SUCCESS", "FAILED"])
+        self.assertEqual(server.connections, 1)
+
+    def test_urllib_transport(self):
+        transport = UrllibTransport()
+        with ResponseServer() as server:
+            for index in range(3):
+                self.assertEqual(transport.put(server.url + "?signature=abc", "body {}".format(index)), 200)
+
+        self.assertEqual(server.bodies, ["body 0", "body 1", "body 2"])
+        self.assertEqual(server.connections, 1)
+
+    def test_urllib_transport_reconnects_after_idle_connection_closed(self):
+        transport = UrllibTransport()
+        with ResponseServer() as server:
+            transport.put(server.url, "first")
+        with ResponseServer(port=int(server.url.split(":")[2].split("/")[0])) as server:
+            self.assertEqual(transport.put(server.url, "second"), 200)
+        self.assertEqual(server.bodies, ["second"])
+
+    def test_urllib_transport_read_timeout(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        try:
+            url = "http://127.0.0.1:{}/".format(listener.getsockname()[1])
+            with self.assertRaises(TransportError):
+                UrllibTransport(read_timeout=0.1).put(url, "body")
+        finally:
+            listener.close()
+
+    def test_default_transport_from_environment(self):
+        with mock.patch.object(custom_resource.transport, "_default_transport", None):
+            with mock.patch.dict(os.environ, {"CUSTOM_RESOURCE_TRANSPORT": "urllib"}):
+                self.assertIsInstance(get_default_transport(), UrllibTransport)
+
+        with mock.patch.object(custom_resource.transport, "_default_transport", None):
+            with mock.patch.dict(os.environ, {"CUSTOM_RESOURCE_TRANSPORT": "carrier-pigeon"}):
+                with self.assertRaisesRegexp(ValueError, "CUSTOM_RESOURCE_TRANSPORT must be one of requests, urllib"):
+                    get_default_transport()
+
+    def test_dependencies_imported_lazily(self):
+        code = "import sys, custom_resource; print(sorted(name for name in ('jsonschema', 'requests', 'sqlite3', 'uuid') if name in sys.modules))"
+        output = subprocess.check_output([sys.executable, "-c", code], env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertEqual(output.strip(), "[]")